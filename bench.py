@@ -0,0 +1,246 @@
+"""Scripted performance benchmarks, run under the SDL dummy video driver.
+
+    python bench.py                  # run every scenario, compare with bench_baseline.json
+    python bench.py --save-baseline  # run and store the results as this machine's baseline
+    python bench.py --only boss_swings --frames 2000
+
+Each scenario steps the simulation one tick per frame and draws the frame
+into an off-screen display, timing the update and the render separately.
+Results are per-frame percentiles in milliseconds plus frames per second.
+The run exits with status 1 if any scenario's median or 95th percentile
+frame time is more than --tolerance above its baseline. Timings are only
+comparable on one machine, so the baseline is not checked in: record it
+locally with --save-baseline before comparing. A scenario with no baseline
+makes the run exit with status 2, unless --no-baseline says to only report.
+
+    python bench.py --threaded       # serial loop against --threaded-sim, no baseline
+    python bench.py --sprites        # blits/s of sprite images as painted and as shared
+
+--threaded walks the 100-bandit level once ticking and drawing in turn and once
+with an unpaced SimThread ticking while this thread draws, and reports both
+rates with the thread overlap and frame latency.
+"""
+import os
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
+import argparse, json, sys, time
+
+import numpy as np
+import pygame
+
+import main as game
+from main import (WIDTH, HEIGHT, FPS, RNG, CUTSCENES, Player, Enemy, Boss, Duel, World,
+                  ScriptedKeys, CutsceneArt, RewindBuffer, SimThread, game_state, draw_world,
+                  draw_duel, explore_ticks, sprite_blit_stats)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+DEFAULT_FRAMES = 600
+WARMUP_FRAMES = 30    # not timed: caches fill and chunks stream in
+TOLERANCE = 0.25      # allowed slowdown over the baseline, as a fraction
+MIN_REGRESSION = 0.05  # ms; smaller differences are noise whatever the ratio
+SEED = 67
+UNBREAKABLE = 10**6   # health that outlasts any benchmark
+
+def timed(update, render, frames):
+    """Run `frames` untimed warmup frames and then `frames` timed ones.
+    Returns (update_ms, render_ms) arrays."""
+    for frame in range(WARMUP_FRAMES):
+        update(frame)
+        render(frame)
+    times = np.zeros((frames, 2))
+    clock = time.perf_counter
+    for frame in range(frames):
+        t0 = clock()
+        update(WARMUP_FRAMES + frame)
+        t1 = clock()
+        render(WARMUP_FRAMES + frame)
+        times[frame] = (t1 - t0, clock() - t1)
+    return times[:, 0] * 1000.0, times[:, 1] * 1000.0
+
+def arena(player_class, enemy_kind):
+    """A Duel where neither side can die."""
+    game_state.level_width = WIDTH
+    player = Player(WIDTH // 4, HEIGHT - 200, player_class)
+    enemy = enemy_kind(WIDTH - 300, HEIGHT - 88)
+    player.health = player.max_health = enemy.health = enemy.max_health = UNBREAKABLE
+    return Duel(player, enemy)
+
+def run_duel(duel, keys, frames, before_tick=None):
+    def update(frame):
+        if before_tick is not None:
+            before_tick(duel)
+        duel.step(keys)
+    return timed(update, lambda frame: draw_duel(duel, 1.0), frames)
+
+# ---------- scenarios ----------
+def explore_100_bandits(frames):
+    """Walk right across a level with 100 bandits, swinging; engagements are ignored."""
+    world = World('Werrior', num_bandits=100, seed=SEED)
+    world.player.health = UNBREAKABLE
+    walk = ScriptedKeys((pygame.K_d,))
+    walk_swing = ScriptedKeys((pygame.K_d, pygame.K_z))
+    def update(frame):
+        world.step(walk_swing if frame % 2 else walk)
+    return timed(update, lambda frame: draw_world(world, 1.0), frames)
+
+def mage_bolt_spam(frames):
+    """A Mage casting every tick it can against a bandit."""
+    def no_cooldown(duel):
+        duel.player.att_cd = 0
+    return run_duel(arena('Mage', Enemy), ScriptedKeys((pygame.K_z,)), frames, no_cooldown)
+
+def particle_storm(frames):
+    """A bandit taking four hits per tick, each spraying damage particles."""
+    def hits(duel):
+        for _ in range(4):
+            duel.enemy.take_damage(0, duel.particles)
+    return run_duel(arena('Werrior', Enemy), ScriptedKeys(), frames, hits)
+
+def boss_swings(frames):
+    """A Warrior and the Bandit King trading sword swings nonstop."""
+    return run_duel(arena('Werrior', Boss), ScriptedKeys((pygame.K_z,)), frames)
+
+def cutscene_screen(name):
+    def run(frames):
+        title, lines, duration, color_scheme = CUTSCENES[name]
+        art = CutsceneArt(title, [line.format(player_class='Werrior') for line in lines],
+                          color_scheme or ((255, 255, 100), (100, 200, 255), (200, 100, 255)), duration)
+        # sweep the whole cutscene, fades included, however many frames are asked for
+        step = art.total_time / (WARMUP_FRAMES + frames)
+        return timed(lambda frame: None, lambda frame: art.draw(game.SCREEN, frame * step), frames)
+    run.__doc__ = f"The '{name}' cutscene from fade in to fade out."
+    return run
+
+SCENARIOS = {
+    'explore_100_bandits': explore_100_bandits,
+    'mage_bolt_spam': mage_bolt_spam,
+    'particle_storm': particle_storm,
+    'boss_swings': boss_swings,
+    **{f'cutscene_{name}': cutscene_screen(name) for name in CUTSCENES},
+}
+
+def threaded_walk(frames):
+    """Walk and swing through 100 bandits for `frames` ticks serially, then threaded."""
+    keys = ScriptedKeys((pygame.K_d, pygame.K_z))
+
+    def new_world():
+        RNG.seed(SEED)
+        world = World('Werrior', num_bandits=100, seed=SEED)
+        world.player.health = UNBREAKABLE
+        return world
+
+    world, rewind = new_world(), RewindBuffer()
+    start = time.perf_counter()
+    for _ in range(frames):
+        explore_ticks(world, rewind, keys, 1)
+        draw_world(world, 1.0)
+    serial = frames / (time.perf_counter() - start)
+
+    # engagements are walked through, as in explore_100_bandits
+    sim = SimThread(new_world(), RewindBuffer(), pace=False, halt=False)
+    sim.keys = keys
+    drawn = 0
+    start = time.perf_counter()
+    sim.start()
+    while sim.ticks < frames:
+        t = sim.stats.now()
+        frame = sim.draw()
+        sim.stats.rendered(frame, t)
+        drawn += 1
+    elapsed = time.perf_counter() - start
+    sim.stop()
+    print(f"explore_100_bandits, {frames} ticks")
+    print(f"  serial:   {serial:8.0f} ticks/s, one tick and one draw per frame")
+    print(f"  threaded: {sim.ticks / elapsed:8.0f} ticks/s simulated, {drawn / elapsed:.0f} frames/s drawn")
+    print(sim.report())
+
+def summarize(update_ms, render_ms):
+    frame_ms = update_ms + render_ms
+    result = {'fps': round(1000.0 / frame_ms.mean(), 1)}
+    for label, ms in (('update', update_ms), ('render', render_ms), ('frame', frame_ms)):
+        for p in (50, 95, 99):
+            result[f'{label}_p{p}'] = round(float(np.percentile(ms, p)), 4)
+    return result
+
+def regressions(name, result, baseline, tolerance):
+    """Lines describing how `result` is slower than `baseline`, if it is."""
+    found = []
+    for key in ('frame_p50', 'frame_p95'):
+        old, new = baseline.get(key), result[key]
+        if old is not None and new > old * (1 + tolerance) and new - old > MIN_REGRESSION:
+            found.append(f"{name}: {key} {old:.3f} -> {new:.3f} ms (+{(new / old - 1) * 100:.0f}%)")
+    return found
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="67 Water RPG performance benchmarks")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES, help="timed frames per scenario")
+    parser.add_argument("--only", nargs='+', choices=sorted(SCENARIOS), metavar="SCENARIO",
+                        help=f"run only these: {', '.join(SCENARIOS)}")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline results file")
+    parser.add_argument("--save-baseline", dest="save", action="store_true",
+                        help="store this run as this machine's baseline")
+    parser.add_argument("--no-baseline", dest="check", action="store_false",
+                        help="only report timings; don't fail when there is no baseline to compare with")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed slowdown over the baseline before failing (0.25 = 25%%)")
+    parser.add_argument("--threaded", action="store_true",
+                        help="compare the serial loop with the threaded simulation instead")
+    parser.add_argument("--sprites", action="store_true",
+                        help="report sprite blit throughput, painted against converted and shared, instead")
+    args = parser.parse_args(argv)
+
+    game.open_window()
+    if args.threaded:
+        threaded_walk(args.frames)
+        return 0
+    if args.sprites:
+        print(f"{'sprite':12} {'painted':>12} {'shared':>12}   blits/s")
+        for name, (painted, shared) in sprite_blit_stats().items():
+            print(f"{name:12} {painted:12.0f} {shared:12.0f}   x{shared / painted:.2f}")
+        return 0
+    try:
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    except FileNotFoundError:
+        baselines = {}
+
+    results = {}
+    failed = []
+    missing = []
+    print(f"{'scenario':24} {'update p50/p95/p99 ms':>24} {'render p50/p95/p99 ms':>24} {'fps':>8}")
+    for name in args.only or SCENARIOS:
+        RNG.seed(SEED)
+        result = summarize(*SCENARIOS[name](args.frames))
+        results[name] = result
+        row = [f"{name:24}"]
+        for label in ('update', 'render'):
+            row.append(f"{result[f'{label}_p50']:8.3f}{result[f'{label}_p95']:8.3f}{result[f'{label}_p99']:8.3f}")
+        row.append(f"{result['fps']:8.0f}")
+        print(' '.join(row))
+        if name in baselines:
+            failed += regressions(name, result, baselines[name], args.tolerance)
+        else:
+            missing.append(name)
+
+    if args.save:
+        baselines.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"baseline saved to {args.baseline}")
+        return 0
+    if failed:
+        print("regressions against the baseline:")
+        for line in failed:
+            print("  " + line)
+        return 1
+    if missing and args.check:
+        # a gate with nothing to compare against must not pass silently
+        print(f"no baseline for {', '.join(missing)} in {args.baseline}; "
+              "run with --save-baseline to record one, or --no-baseline to skip the check")
+        return 2
+    print("no regressions" if not missing else "not compared: no baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+"""pytest setup: run pygame headlessly and import main from the repository root."""
+import os
+import sys
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,213 @@
+"""Batched, headless duel environments for training and evaluating bots.
+
+    python duelenv.py --envs 256 --steps 2000               # one process
+    python duelenv.py --envs 256 --steps 2000 --workers 4   # shards over 4 processes
+
+DuelEnvs steps N independent Duels (a player against one Enemy or the Boss on
+the arena floor) together, Gym vector-env style:
+
+    envs = DuelEnvs(64, player_class='Mage', enemy='Boss', seed=1)
+    obs = envs.reset()
+    obs, rewards, terminated, truncated, infos = envs.step(actions)
+
+An action is a key mask over INPUT_KEYS (bit 0 = A ... bit 4 = Z), so there are
+NUM_ACTIONS discrete actions. Observations are float32 rows of OBS_FIELDS.
+Finished duels reset themselves at once; the last observation of the old
+episode is in infos['final_obs'].
+"""
+import argparse, multiprocessing, os, time
+
+import numpy as np
+
+from main import (WIDTH, HEIGHT, TICK_RATE, RNG, INPUT_KEYS, Player, Enemy, Boss, Duel,
+                  ScriptedKeys, held_keys, game_state, step_duel)
+
+NUM_ACTIONS = 1 << len(INPUT_KEYS)
+ACTION_KEYS = [ScriptedKeys(held_keys(mask)) for mask in range(NUM_ACTIONS)]
+MAX_EPISODE_STEPS = TICK_RATE * 60  # truncate duels after a minute of game time
+WIN_REWARD = 1.0
+ENEMY_KINDS = {'Enemy': Enemy, 'Boss': Boss}
+
+OBS_FIELDS = ('player_x', 'player_y', 'player_vel_x', 'player_vel_y', 'player_health',
+              'player_facing', 'att_cd', 'dash_cd', 'invuln',
+              'enemy_x', 'enemy_y', 'enemy_health', 'enemy_facing', 'enemy_cool',
+              'dx', 'incoming')
+OBS_SIZE = len(OBS_FIELDS)
+
+def new_duel(player_class, enemy):
+    """A fresh Duel with the player and enemy where World.start_duel puts them."""
+    player = Player(WIDTH // 4, HEIGHT - 200, player_class)
+    return Duel(player, ENEMY_KINDS[enemy](WIDTH - 300, HEIGHT - 88))
+
+def observe(duel, out):
+    """Write the duel's observation row into `out`."""
+    player, enemy = duel.player, duel.enemy
+    incoming = sum(1 for sw in duel.swings if sw.owner is not player)
+    out[:] = (player.rect.centerx / WIDTH, player.rect.bottom / HEIGHT,
+              player.vel_x / player.speed, player.vel_y / player.jump,
+              player.health / player.max_health, player.facing,
+              player.att_cd / 25, player.dash_cd / 60, player.invuln / 14,
+              enemy.rect.centerx / WIDTH, enemy.rect.bottom / HEIGHT,
+              enemy.health / enemy.max_health, enemy.facing, enemy.cool / 40,
+              (enemy.rect.centerx - player.rect.centerx) / WIDTH, incoming)
+
+class DuelBatch:
+    """N duels stepped in this process."""
+    def __init__(self, num_envs, player_class='Werrior', enemy='Enemy', seed=None):
+        self.num_envs = num_envs
+        self.player_class = player_class
+        self.enemy = enemy
+        self.seed = seed
+        self.duels = [None] * num_envs
+        self.steps = np.zeros(num_envs, dtype=np.int32)
+        self.obs = np.zeros((num_envs, OBS_SIZE), dtype=np.float32)
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed = seed
+        RNG.seed(self.seed)
+        # duels are confined to the screen-wide arena
+        game_state.level_width = WIDTH
+        for i in range(self.num_envs):
+            self.reset_env(i)
+        return self.obs.copy()
+
+    def reset_env(self, i):
+        self.duels[i] = new_duel(self.player_class, self.enemy)
+        self.steps[i] = 0
+        observe(self.duels[i], self.obs[i])
+
+    def step(self, actions):
+        """Advance every duel one tick. Returns (obs, rewards, terminated, truncated, infos)."""
+        n = self.num_envs
+        rewards = np.zeros(n, dtype=np.float32)
+        terminated = np.zeros(n, dtype=bool)
+        truncated = np.zeros(n, dtype=bool)
+        final_obs = {}
+        obs = self.obs
+        for i, duel in enumerate(self.duels):
+            player, enemy = duel.player, duel.enemy
+            player_health, enemy_health = player.health, enemy.health
+            result = step_duel(player, duel.enemies, duel.plats, duel.swings, duel.particles,
+                               ACTION_KEYS[actions[i]], duel.grid)
+            # damage dealt minus damage taken, each as a fraction of full health
+            reward = ((enemy_health - enemy.health) / enemy.max_health
+                      - (player_health - max(player.health, 0)) / player.max_health)
+            self.steps[i] += 1
+            observe(duel, obs[i])
+            if result is not None:
+                reward += WIN_REWARD if result else -WIN_REWARD
+                terminated[i] = True
+            elif self.steps[i] >= MAX_EPISODE_STEPS:
+                truncated[i] = True
+            rewards[i] = reward
+            if terminated[i] or truncated[i]:
+                final_obs[i] = obs[i].copy()
+                self.reset_env(i)
+        return obs.copy(), rewards, terminated, truncated, {'final_obs': final_obs}
+
+    def close(self):
+        pass
+
+def _worker(conn, num_envs, player_class, enemy, seed):
+    batch = DuelBatch(num_envs, player_class, enemy, seed)
+    while True:
+        cmd, arg = conn.recv()
+        if cmd == 'step':
+            conn.send(batch.step(arg))
+        elif cmd == 'reset':
+            conn.send(batch.reset(arg))
+        else:
+            conn.close()
+            return
+
+class DuelEnvs:
+    """N duels, stepped in this process or split across `workers` processes.
+
+    Every process seeds the shared random streams once per reset(), so a run
+    is reproducible for a given seed, batch size and number of workers.
+    """
+    def __init__(self, num_envs, player_class='Werrior', enemy='Enemy', seed=None, workers=0):
+        self.num_envs = num_envs
+        self.workers = min(workers, num_envs)
+        if not self.workers:
+            self.batch = DuelBatch(num_envs, player_class, enemy, seed)
+            return
+        # contiguous shards, as even as possible
+        bounds = np.linspace(0, num_envs, self.workers + 1).astype(int)
+        self.shards = list(zip(bounds[:-1], bounds[1:]))
+        self.conns = []
+        self.procs = []
+        for w, (lo, hi) in enumerate(self.shards):
+            conn, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=_worker, daemon=True,
+                                           args=(child, hi - lo, player_class, enemy, self.worker_seed(seed, w)))
+            proc.start()
+            child.close()
+            self.conns.append(conn)
+            self.procs.append(proc)
+
+    @staticmethod
+    def worker_seed(seed, w):
+        return None if seed is None else seed + w
+
+    def reset(self, seed=None):
+        if not self.workers:
+            return self.batch.reset(seed)
+        for w, conn in enumerate(self.conns):
+            conn.send(('reset', self.worker_seed(seed, w)))
+        return np.concatenate([conn.recv() for conn in self.conns])
+
+    def step(self, actions):
+        """Step with one action per duel. Returns (obs, rewards, terminated, truncated, infos)."""
+        if not self.workers:
+            return self.batch.step(actions)
+        for conn, (lo, hi) in zip(self.conns, self.shards):
+            conn.send(('step', actions[lo:hi]))
+        results = [conn.recv() for conn in self.conns]
+        obs, rewards, terminated, truncated = (np.concatenate([r[k] for r in results]) for k in range(4))
+        final_obs = {lo + i: o for (lo, _), r in zip(self.shards, results) for i, o in r[4]['final_obs'].items()}
+        return obs, rewards, terminated, truncated, {'final_obs': final_obs}
+
+    def close(self):
+        if not self.workers:
+            return
+        for conn in self.conns:
+            conn.send(('close', None))
+            conn.close()
+        for proc in self.procs:
+            proc.join()
+
+def benchmark(num_envs, steps, workers=0, player_class='Werrior', enemy='Enemy', seed=0):
+    """Step random actions and report aggregate env steps per second."""
+    envs = DuelEnvs(num_envs, player_class, enemy, seed, workers)
+    envs.reset()
+    rng = np.random.default_rng(seed)
+    # hold each random action for a few ticks, like a bot acting at a lower rate
+    actions = rng.integers(NUM_ACTIONS, size=num_envs)
+    episodes = wins = 0
+    start = time.perf_counter()
+    for t in range(steps):
+        if t % 8 == 0:
+            actions = rng.integers(NUM_ACTIONS, size=num_envs)
+        _, rewards, terminated, truncated, _ = envs.step(actions)
+        episodes += int(terminated.sum() + truncated.sum())
+        wins += int((terminated & (rewards > 0)).sum())
+    elapsed = time.perf_counter() - start
+    envs.close()
+    total = num_envs * steps
+    cores = workers or 1
+    print(f"{num_envs} envs x {steps} steps in {elapsed:.2f}s: {total / elapsed:.0f} steps/s, "
+          f"{total / elapsed / cores:.0f} steps/s per core ({cores} of {os.cpu_count()} cores); "
+          f"{episodes} episodes finished, {wins} won by the random policy")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="67 Water RPG batched duel environments")
+    parser.add_argument("--envs", type=int, default=256, help="duels stepped together")
+    parser.add_argument("--steps", type=int, default=2000, help="ticks to step every duel")
+    parser.add_argument("--workers", type=int, default=0, help="processes to shard the duels over (0 = this one)")
+    parser.add_argument("--class", dest="player_class", default="Werrior")
+    parser.add_argument("--enemy", choices=sorted(ENEMY_KINDS), default="Enemy")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    benchmark(args.envs, args.steps, args.workers, args.player_class, args.enemy, args.seed)
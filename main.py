@@ -1,27 +1,143 @@
-import pygame, sys, random, math
-from typing import List
-pygame.init()
+import sys, os, random, math, struct, time, threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+_IMPORT_START = time.perf_counter()  # startup timing starts before the heavy imports
+import pygame
+import numpy as np
+
+# ---------- startup timing ----------
+# Nothing is initialized at import: the display comes up in open_window(),
+# fonts on the first font() call, and backgrounds, terrain tiles, sprites
+# and the HUD when they are first drawn. STARTUP records how long each of
+# those took on the way to the first gameplay frame (--startup-report).
+class StartupTimer:
+    """Wall time per startup step, and the moments milestones were reached.
+
+    Steps nest, and time spent in an inner step is billed to it rather than
+    to the step around it, so the totals add up to the elapsed time.
+    """
+    def __init__(self, start):
+        self.start = start
+        self.since = start  # last time billed
+        self.stack = []
+        self.totals = {}
+        self.milestones = []  # (name, seconds since start, totals at that point)
+
+    def lap(self, name):
+        """Bill the time since the last billing point to `name`."""
+        now = time.perf_counter()
+        self.totals[name] = self.totals.get(name, 0.0) + now - self.since
+        self.since = now
+
+    @contextmanager
+    def step(self, name):
+        self.lap(self.stack[-1] if self.stack else 'other')
+        self.stack.append(name)
+        try:
+            yield
+        finally:
+            self.lap(self.stack.pop())
+
+    def milestone(self, name):
+        """Note that `name` was reached now. Returns False (and records nothing) if it already was."""
+        if any(m[0] == name for m in self.milestones):
+            return False
+        self.lap(self.stack[-1] if self.stack else 'other')
+        self.milestones.append((name, self.since - self.start, dict(self.totals)))
+        return True
+
+    def report(self):
+        names = list(self.totals)
+        lines = ["startup: " + ", ".join(f"{m} at {t * 1000:.1f} ms" for m, t, _ in self.milestones)]
+        lines.append(f"  {'step':28}" + "".join(f"{'to ' + m:>24}" for m, _, _ in self.milestones))
+        for name in names:
+            cells = "".join(f"{totals[name] * 1000:21.1f} ms" if name in totals else " " * 24
+                            for _, _, totals in self.milestones)
+            lines.append(f"  {name:28}{cells}")
+        return "\n".join(lines)
+
+STARTUP = StartupTimer(_IMPORT_START)
+STARTUP.lap('import pygame, numpy')
 
 # ---------- window ----------
 WIDTH, HEIGHT = 1280, 720
-SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("67 Water RPG – Quest for the Princess")
+SCREEN = None  # window is opened by open_window(); headless runs never create one
 CLOCK = pygame.time.Clock()
-FPS = 120
-
-# Debug mode - press D to toggle
+FPS = 120  # render frame cap
+# Simulation runs in fixed ticks; all gameplay constants (gravity, dash and
+# potion timers, swing length) are tuned per tick at this rate.
+TICK_RATE = 120
+MAX_FRAME_TIME = 0.25  # seconds of catch-up allowed after a slow frame
+
+def open_window(caption="67 Water RPG – Quest for the Princess"):
+    """Bring up the video subsystem and the game window; returns SCREEN."""
+    global SCREEN
+    with STARTUP.step('display'):
+        pygame.display.init()
+        SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption(caption)
+    return SCREEN
+
+# Debug mode - press F3 to toggle (game_state.debug_mode)
 DEBUG_MODE = False
 
 # game state
 class GameState:
     def __init__(self):
         self.camera_x = 0.0
+        self.camera_prev_x = 0.0  # camera at the previous tick, for interpolation
         self.screen_shake = 0
         self.screen_shake_intensity = 0
         self.debug_mode = False
+        self.level_width = WIDTH * 4  # set by World; entities clamp to it
 
 game_state = GameState()
 
+class FixedTimestep:
+    """Turns variable render frame times into a whole number of fixed simulation ticks."""
+    def __init__(self, tick_rate=TICK_RATE):
+        self.dt = 1.0 / tick_rate
+        self.accumulator = 0.0
+
+    def advance(self, frame_time):
+        """Add frame_time seconds and return how many ticks to simulate now."""
+        self.accumulator += min(frame_time, MAX_FRAME_TIME)
+        ticks = int(self.accumulator / self.dt)
+        self.accumulator -= ticks * self.dt
+        return ticks
+
+    def alpha(self):
+        """Fraction of a tick elapsed since the last simulated tick (0..1)."""
+        return self.accumulator / self.dt
+
+    def reset(self):
+        self.accumulator = 0.0
+
+# ---------- random streams ----------
+# One generator per subsystem, so e.g. extra particles or a longer cutscene
+# never shift the AI's dice rolls, and a run is reproducible from its seed.
+RNG_STREAMS = ('spawn', 'ai', 'loot', 'fx', 'screen')  # fx: simulated particles, screen: render-only effects
+
+SEED_LIMIT = 2**64  # seeds are stored as unsigned 64-bit integers in input logs
+
+class RandomStreams:
+    """Independent seeded random.Random streams, one attribute per RNG_STREAMS name."""
+    def __init__(self, seed=None):
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        """Reseed every stream from one master seed (a fresh random one if None)."""
+        if seed is None:
+            seed = random.randrange(2**32)
+        elif not 0 <= seed < SEED_LIMIT:
+            # caught here rather than when the session's input log is saved
+            raise ValueError(f"seed must be in 0..{SEED_LIMIT - 1}, got {seed}")
+        self.master = seed
+        for name in RNG_STREAMS:
+            setattr(self, name, random.Random(f"{seed}:{name}"))
+
+RNG = RandomStreams()
+
 # character scale (bigger characters)
 CHAR_SCALE = 1.6
 
@@ -37,70 +153,717 @@ GRAY = (100,100,100)
 YELLOW = (250,230,120)
 CYAN = (100,200,255)
 
-FONT = pygame.font.Font(None,28)
-BIG = pygame.font.Font(None,60)
+# ---------- text ----------
+FONT_SIZE = 28
+BIG_SIZE = 60
+TEXT_CACHE_SIZE = 256  # rendered strings kept; HUD, shop and story text fit easily
+
+_fonts = {}
+
+def font(size):
+    """The default font at `size`, loaded once and shared."""
+    f = _fonts.get(size)
+    if f is None:
+        with STARTUP.step('fonts'):
+            if not pygame.font.get_init():
+                pygame.font.init()
+            f = _fonts[size] = pygame.font.Font(None, size)
+    return f
+
+class TextCache:
+    """LRU of rendered text surfaces keyed by (text, size, color).
+
+    Returned surfaces are shared between callers; copy one before changing
+    its alpha or drawing on it.
+    """
+    def __init__(self, capacity=TEXT_CACHE_SIZE):
+        self.capacity = capacity
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.surfaces)
+
+    def render(self, text, size=FONT_SIZE, color=WHITE):
+        key = (text, size, tuple(color))
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = self.surfaces[key] = font(size).render(text, True, color)
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = self.misses = 0
+
+    def stats(self):
+        looked_up = self.hits + self.misses
+        rate = self.hits / looked_up if looked_up else 0.0
+        return f"text cache: {len(self)}/{self.capacity} surfaces, {self.hits} hits, {self.misses} misses ({rate:.0%})"
+
+TEXT = TextCache()
+
+def render_text(text, size=FONT_SIZE, color=WHITE):
+    return TEXT.render(text, size, color)
+
+# ---------- toasts ----------
+TOAST_SECONDS = 1.5  # default time on screen
+TOAST_FADE = 0.4     # seconds of fade-out at the end of a toast
+TOAST_MAX = 4        # older toasts are dropped beyond this many
+TOAST_SPACING = 8
+
+class Toasts:
+    """Short messages drawn over the frame by whatever loop is running.
+
+    show() only queues the message; each frame's draw() stacks the live
+    toasts down from the middle of the screen, fades them out at the end of
+    their lifetime and drops expired ones. Nothing ever waits on a toast.
+    """
+    def __init__(self):
+        self.items = []  # [expiry time, surface]
+
+    def __len__(self):
+        return len(self.items)
+
+    def show(self, text, color=WHITE, seconds=TOAST_SECONDS, size=FONT_SIZE):
+        # copied: the alpha is changed while it fades
+        surf = render_text(text, size, color).copy()
+        self.items.append([time.perf_counter() + seconds, surf])
+        del self.items[:-TOAST_MAX]
+
+    def clear(self):
+        self.items.clear()
+
+    def draw(self, s):
+        now = time.perf_counter()
+        self.items = [item for item in self.items if item[0] > now]
+        y = HEIGHT//2
+        for expires, surf in self.items:
+            surf.set_alpha(min(255, int(255 * (expires - now) / TOAST_FADE)))
+            s.blit(surf, (WIDTH//2 - surf.get_width()//2, y))
+            y += surf.get_height() + TOAST_SPACING
+
+TOASTS = Toasts()
 
 # ---------- helpers ----------
 def draw_text_center(text,y,size=32,color=WHITE):
-    f = pygame.font.Font(None,size)
-    surf = f.render(text,True,color)
+    surf = render_text(text,size,color)
     SCREEN.blit(surf,(WIDTH//2 - surf.get_width()//2,y))
 
+def snapshot_positions(sprites):
+    """Remember where each sprite was before a tick so rendering can interpolate."""
+    for sp in sprites:
+        sp.prev_pos = sp.rect.topleft
+
+def lerp_rect(sprite, alpha):
+    """Copy of sprite.rect placed between its previous and current tick position."""
+    rect = sprite.rect.copy()
+    prev = getattr(sprite, 'prev_pos', None)
+    if prev is not None:
+        rect.x = round(prev[0] + (rect.x - prev[0]) * alpha)
+        rect.y = round(prev[1] + (rect.y - prev[1]) * alpha)
+    return rect
+
 def apply_screen_shake():
     """Apply slight random offset for screen shake effect."""
     if game_state.screen_shake > 0:
-        offset_x = random.randint(-game_state.screen_shake_intensity, game_state.screen_shake_intensity)
-        offset_y = random.randint(-game_state.screen_shake_intensity, game_state.screen_shake_intensity)
+        offset_x = RNG.screen.randint(-game_state.screen_shake_intensity, game_state.screen_shake_intensity)
+        offset_y = RNG.screen.randint(-game_state.screen_shake_intensity, game_state.screen_shake_intensity)
         game_state.screen_shake -= 1
         return offset_x, offset_y
     return 0, 0
 
-class Particle(pygame.sprite.Sprite):
-    """Simple particle effect with gravity and fade."""
+class Particle:
+    """One particle to spawn: particles.add(Particle(x, y, vx, vy, color, lifetime))."""
+    __slots__ = ('x', 'y', 'vx', 'vy', 'color', 'lifetime')
+
     def __init__(self, x, y, vx, vy, color, lifetime=20):
-        super().__init__()
         self.x = float(x)
         self.y = float(y)
         self.vx = vx
         self.vy = vy
-        self.lifetime = lifetime
-        self.max_lifetime = lifetime
         self.color = color
-        self.image = pygame.Surface((4, 4), pygame.SRCALPHA)
-        pygame.draw.circle(self.image, color, (2, 2), 2)
-        self.rect = self.image.get_rect(center=(x, y))
+        self.lifetime = lifetime
 
-    def update(self):
-        self.x += self.vx
-        self.y += self.vy
-        self.vy += 0.15  # gravity
-        self.lifetime -= 1
-        if self.lifetime <= 0:
-            self.kill()
+PARTICLE_GRAVITY = 0.15
+PARTICLE_FADE_LEVELS = 16  # pre-faded glyphs per color
+PARTICLE_RADIUS = 2
+
+# color -> index into the glyph table; glyphs are rendered lazily on first draw
+_particle_colors = {}
+_particle_glyphs = []
+
+def particle_color_index(color):
+    idx = _particle_colors.get(color)
+    if idx is None:
+        idx = len(_particle_colors)
+        _particle_colors[color] = idx
+    return idx
+
+def particle_glyphs():
+    """Glyph list indexed by color_index * PARTICLE_FADE_LEVELS + fade level."""
+    if len(_particle_glyphs) < len(_particle_colors) * PARTICLE_FADE_LEVELS:
+        size = PARTICLE_RADIUS * 2
+        for color in list(_particle_colors)[len(_particle_glyphs) // PARTICLE_FADE_LEVELS:]:
+            for level in range(PARTICLE_FADE_LEVELS):
+                alpha = int(255 * (level + 1) / PARTICLE_FADE_LEVELS)
+                glyph = pygame.Surface((size, size), pygame.SRCALPHA)
+                pygame.draw.circle(glyph, tuple(color[:3]) + (alpha,), (PARTICLE_RADIUS, PARTICLE_RADIUS), PARTICLE_RADIUS)
+                _particle_glyphs.append(glyph)
+    return _particle_glyphs
+
+class ParticleSystem:
+    """Particles with gravity and fade, stored as parallel NumPy arrays.
+
+    Live particles occupy indices [0, count); dead ones are compacted away
+    after each update. Drawing blits pre-faded glyphs in one batch.
+    """
+    def __init__(self, capacity=1024):
+        self.count = 0
+        self.pos = np.zeros((capacity, 2), np.float32)
+        self.vel = np.zeros((capacity, 2), np.float32)
+        self.life = np.zeros(capacity, np.int32)
+        self.max_life = np.ones(capacity, np.int32)
+        self.color = np.zeros(capacity, np.int32)
+
+    def __len__(self):
+        return self.count
+
+    def _arrays(self):
+        return (self.pos, self.vel, self.life, self.max_life, self.color)
+
+    def _reserve(self, extra):
+        needed = self.count + extra
+        capacity = len(self.life)
+        if needed <= capacity:
             return
-        # fade out
-        alpha = int(255 * (self.lifetime / self.max_lifetime))
-        self.image.fill((0, 0, 0, 0))
-        pygame.draw.circle(self.image, self.color + (alpha,), (2, 2), 2)
-        self.rect.center = (int(self.x), int(self.y))
+        capacity = max(needed, capacity * 2)
+        self.pos, self.vel, self.life, self.max_life, self.color = [
+            np.concatenate([arr, np.zeros((capacity - len(arr),) + arr.shape[1:], arr.dtype)])
+            for arr in self._arrays()]
+
+    def add(self, *parts):
+        self._reserve(len(parts))
+        for p in parts:
+            i = self.count
+            self.pos[i] = (p.x, p.y)
+            self.vel[i] = (p.vx, p.vy)
+            self.life[i] = p.lifetime
+            self.max_life[i] = max(1, p.lifetime)
+            self.color[i] = particle_color_index(p.color)
+            self.count = i + 1
+
+    def save(self):
+        """Copy of the live particles, for rolling back."""
+        n = self.count
+        return n, tuple(arr[:n].copy() for arr in self._arrays())
+
+    def load(self, state):
+        n, arrays = state
+        self.count = 0
+        self._reserve(n)
+        for arr, saved in zip(self._arrays(), arrays):
+            arr[:n] = saved
+        self.count = n
+
+    def emit(self, x, y, vx, vy, color, lifetime=20):
+        """Spawn len(vx) particles at (x, y) with per-particle velocities in one call."""
+        n = len(vx)
+        self._reserve(n)
+        i, j = self.count, self.count + n
+        self.pos[i:j] = (x, y)
+        self.vel[i:j, 0] = vx
+        self.vel[i:j, 1] = vy
+        self.life[i:j] = lifetime
+        self.max_life[i:j] = max(1, lifetime)
+        self.color[i:j] = particle_color_index(color)
+        self.count = j
+
+    def empty(self):
+        self.count = 0
 
-    def draw(self, s):
-        """Draw particle to screen."""
-        s.blit(self.image, self.rect)
+    def update(self):
+        n = self.count
+        if not n:
+            return
+        self.pos[:n] += self.vel[:n]
+        self.vel[:n, 1] += PARTICLE_GRAVITY
+        life = self.life[:n]
+        life -= 1
+        alive = life > 0
+        if not alive.all():
+            keep = np.flatnonzero(alive)
+            for arr in self._arrays():
+                arr[:len(keep)] = arr[keep]
+            self.count = len(keep)
+
+    def draw(self, s, offset=(0, 0)):
+        """Blit every live particle, shifted by offset (e.g. shake minus camera)."""
+        n = self.count
+        if not n:
+            return
+        xs = self.pos[:n, 0].astype(np.int32) + (offset[0] - PARTICLE_RADIUS)
+        ys = self.pos[:n, 1].astype(np.int32) + (offset[1] - PARTICLE_RADIUS)
+        size = PARTICLE_RADIUS * 2
+        width, height = s.get_size()
+        visible = (xs > -size) & (xs < width) & (ys > -size) & (ys < height)
+        life = self.life[:n][visible]
+        levels = np.minimum(life * PARTICLE_FADE_LEVELS // self.max_life[:n][visible], PARTICLE_FADE_LEVELS - 1)
+        glyph_ids = self.color[:n][visible] * PARTICLE_FADE_LEVELS + levels
+        glyphs = particle_glyphs()
+        s.blits(zip(map(glyphs.__getitem__, glyph_ids.tolist()),
+                    zip(xs[visible].tolist(), ys[visible].tolist())), False)
+
+# ---------- spatial index ----------
+SPATIAL_CELL = 256  # grid cell size in pixels
+
+class SpatialHash:
+    """Uniform grid mapping world rects to objects for broadphase queries.
+
+    move() only touches buckets when an object crosses a cell boundary, so
+    entities can be re-indexed every tick cheaply. query() returns candidates
+    in insertion order, matching the order of the groups they came from.
+    """
+    def __init__(self, cell_size=SPATIAL_CELL):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.spans = {}  # obj -> (x0, y0, x1, y1) range of cells it occupies
+        self.order = {}  # obj -> insertion counter
+        self._next = 0
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __contains__(self, obj):
+        return obj in self.spans
+
+    def _span(self, rect):
+        c = self.cell_size
+        x, y, w, h = rect
+        return (x // c, y // c, (x + w - 1) // c if w else x // c, (y + h - 1) // c if h else y // c)
+
+    def _link(self, obj, span):
+        x0, y0, x1, y1 = span
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells.setdefault((cx, cy), set()).add(obj)
+
+    def _unlink(self, obj, span):
+        x0, y0, x1, y1 = span
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket is not None:
+                    bucket.discard(obj)
+                    if not bucket:
+                        del self.cells[(cx, cy)]
+
+    def insert(self, obj, rect):
+        if obj in self.spans:
+            self.move(obj, rect)
+            return
+        span = self._span(rect)
+        self.spans[obj] = span
+        self.order[obj] = self._next
+        self._next += 1
+        self._link(obj, span)
+
+    def move(self, obj, rect):
+        old = self.spans.get(obj)
+        if old is None:
+            self.insert(obj, rect)
+            return
+        span = self._span(rect)
+        if span != old:
+            self._unlink(obj, old)
+            self._link(obj, span)
+            self.spans[obj] = span
+
+    def remove(self, obj):
+        span = self.spans.pop(obj, None)
+        if span is not None:
+            self._unlink(obj, span)
+            del self.order[obj]
+
+    def query(self, rect):
+        """Objects whose cells overlap rect (a superset of those whose rects overlap it)."""
+        x0, y0, x1, y1 = self._span(rect)
+        if x0 == x1 and y0 == y1:
+            # common case: a small rect inside one cell
+            bucket = self.cells.get((x0, y0))
+            if not bucket:
+                return []
+            if len(bucket) == 1:
+                return list(bucket)
+            return sorted(bucket, key=self.order.__getitem__)
+        found = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        if len(found) > 1:
+            return sorted(found, key=self.order.__getitem__)
+        return list(found)
+
+# below this many platforms a linear scan is cheaper than a grid lookup
+PLATFORM_GRID_MIN = 8
+
+class PlatformGrid:
+    """Platform list with a spatial index; iterates like the plain `plats` list."""
+    def __init__(self, plats=()):
+        self.plats = []
+        self.grid = SpatialHash()
+        for p in plats:
+            self.append(p)
+
+    def __iter__(self):
+        return iter(self.plats)
+
+    def __len__(self):
+        return len(self.plats)
+
+    def append(self, p):
+        self.plats.append(p)
+        self.grid.insert(p, p.rect)
+
+    def remove(self, p):
+        self.plats.remove(p)
+        self.grid.remove(p)
+
+    def near(self, rect):
+        if len(self.plats) < PLATFORM_GRID_MIN:
+            return self.plats
+        return self.grid.query(rect)
+
+def platforms_near(plats, rect):
+    """Platforms that may touch rect: an indexed lookup for PlatformGrid, everything for a plain list."""
+    near = getattr(plats, 'near', None)
+    return near(rect) if near else plats
+
+# ---------- level streaming ----------
+CHUNK_WIDTH = WIDTH  # one screen per chunk
+CHUNK_ACTIVE_MARGIN = 1  # chunks simulated beyond the camera view and the player
+
+class EnemySpawn:
+    """A streamed-out enemy: the state it had when it was parked, to rebuild it
+    as it was when its chunk comes back. None means "as the kind starts out".
+
+    Only the AI's last tick is not kept: a parked enemy is not simulated, so
+    on waking it has no missed ticks to catch up on.
+    """
+    __slots__ = ('kind', 'x', 'y', 'health', 'tag', 'dir', 'cool', 'vel_y', 'knockback_x',
+                 'max_health', 'facing', 'hit_flash_timer', 'ai_phase')
+
+    def __init__(self, kind, x, y, health=None, tag=None, dir=1, cool=0, vel_y=0.0, knockback_x=0.0,
+                 max_health=None, facing=1, hit_flash_timer=0, ai_phase=None):
+        self.kind = kind
+        self.x = x
+        self.y = y
+        self.health = health
+        self.tag = tag
+        self.dir = dir
+        self.cool = cool
+        self.vel_y = vel_y
+        self.knockback_x = knockback_x
+        self.max_health = max_health
+        self.facing = facing
+        self.hit_flash_timer = hit_flash_timer
+        self.ai_phase = ai_phase
+
+class Chunk:
+    """A loaded CHUNK_WIDTH slice of the level and the resources it owns."""
+    def __init__(self, index):
+        self.index = index
+        self.platforms = []  # their baked terrain tiles are released along with them
+        self.props = []      # (kind, rect), handed back to the ChunkManager on unload
+
+class ChunkManager:
+    """Streams level chunks in and out around the camera and the player.
+
+    Chunks within CHUNK_ACTIVE_MARGIN of the view are active: their enemies
+    exist as sprites and run AI. Terrain is loaded one chunk further out so an
+    enemy at the edge of the active range never walks off the loaded ground;
+    once it leaves the active range it is parked as an EnemySpawn.
+    """
+    def __init__(self, world, level_width):
+        self.world = world
+        self.level_width = level_width
+        self.count = (level_width + CHUNK_WIDTH - 1) // CHUNK_WIDTH
+        self.dormant = {}  # chunk index -> [EnemySpawn]
+        self.props = {}    # chunk index -> [(kind, rect)] of chunks that are not loaded
+        self.loaded = {}   # chunk index -> Chunk
+        self.active = None
+
+    def chunk_of(self, x):
+        return max(0, min(self.count - 1, int(x) // CHUNK_WIDTH))
+
+    def add_spawn(self, kind, x, y, tag=None):
+        self.dormant.setdefault(self.chunk_of(x), []).append(EnemySpawn(kind, x, y, tag=tag))
+
+    def add_prop(self, kind, rect):
+        i = self.chunk_of(rect.left)
+        chunk = self.loaded.get(i)
+        (chunk.props if chunk is not None else self.props.setdefault(i, [])).append((kind, rect))
+
+    def loaded_props(self):
+        for i in sorted(self.loaded):
+            yield from self.loaded[i].props
+
+    def load(self, i):
+        chunk = Chunk(i)
+        x = i * CHUNK_WIDTH
+        # overlap the next segment by a pixel so on_ground() has no gap at the seam
+        width = min(CHUNK_WIDTH + 1, self.level_width - x)
+        ground = Platform(x, HEIGHT-40, width, 40)
+        chunk.platforms.append(ground)
+        self.world.plats.append(ground)
+        chunk.props = self.props.pop(i, [])
+        self.loaded[i] = chunk
+
+    def unload(self, i):
+        chunk = self.loaded.pop(i)
+        for p in chunk.platforms:
+            self.world.plats.remove(p)
+        if chunk.props:
+            self.props[i] = chunk.props
+
+    def park(self, enemy, i):
+        world = self.world
+        world.map_enemies.remove(enemy)
+        world.enemy_grid.remove(enemy)
+        self.dormant.setdefault(i, []).append(EnemySpawn(
+            type(enemy), enemy.rect.x, enemy.rect.y, enemy.health, getattr(enemy, 'tag', None), enemy.dir,
+            enemy.cool, enemy.vel_y, enemy.knockback_x, enemy.max_health, enemy.facing,
+            enemy.hit_flash_timer, enemy.ai_phase))
+
+    def wake(self, spawn):
+        enemy = spawn.kind(spawn.x, spawn.y)
+        if spawn.health is not None:
+            enemy.health = spawn.health
+        if spawn.tag is not None:
+            enemy.tag = spawn.tag
+        if spawn.max_health is not None:
+            enemy.max_health = spawn.max_health
+        if spawn.ai_phase is not None:
+            enemy.ai_phase = spawn.ai_phase
+        enemy.dir, enemy.facing = spawn.dir, spawn.facing
+        enemy.cool, enemy.vel_y, enemy.knockback_x = spawn.cool, spawn.vel_y, spawn.knockback_x
+        enemy.hit_flash_timer = spawn.hit_flash_timer
+        self.world.map_enemies.add(enemy)
+        self.world.enemy_grid.insert(enemy, enemy.rect)
+
+    def update(self, camera_x, focus):
+        """Load/unload chunks for the view at camera_x plus the focus rect (the player)."""
+        lo = max(0, self.chunk_of(min(camera_x, focus.left)) - CHUNK_ACTIVE_MARGIN)
+        hi = min(self.count - 1, self.chunk_of(max(camera_x + WIDTH, focus.right)) + CHUNK_ACTIVE_MARGIN)
+        if self.active != (lo, hi):
+            t_lo, t_hi = max(0, lo - 1), min(self.count - 1, hi + 1)
+            for i in [i for i in self.loaded if not t_lo <= i <= t_hi]:
+                self.unload(i)
+            for i in range(t_lo, t_hi + 1):
+                if i not in self.loaded:
+                    self.load(i)
+        # park enemies that wandered out of the active range
+        for enemy in [e for e in self.world.map_enemies if not lo <= self.chunk_of(e.rect.centerx) <= hi]:
+            self.park(enemy, self.chunk_of(enemy.rect.centerx))
+        if self.active != (lo, hi):
+            for i in range(lo, hi + 1):
+                for spawn in self.dormant.pop(i, ()):
+                    self.wake(spawn)
+            self.active = (lo, hi)
 
 # ---------- basic sprites ----------
+TERRAIN_TILE_W = 256  # width of baked terrain tiles
+GRASS_H = 5  # grass tufts poke this far above ground platforms
+
 class Platform(pygame.sprite.Sprite):
     def __init__(self,x,y,w,h):
         super().__init__()
         self.image = pygame.Surface((w,h))
         self.image.fill(GROUND)
         self.rect = self.image.get_rect(topleft=(x,y))
+        self.tiles = None  # baked on first draw, see terrain_tiles()
+
+    def terrain_tiles(self):
+        """[(x offset, surface, top padding)] tiles of this platform with its grass baked in."""
+        if self.tiles is None:
+            with STARTUP.step('terrain'):
+                self.tiles = self.bake_tiles()
+        return self.tiles
+
+    def bake_tiles(self):
+        # Add grass/detail on top of ground platforms
+        grass = self.rect.top >= HEIGHT - 100  # Ground level
+        pad = GRASS_H if grass else 0
+        # tufts sit on a world-aligned 30px grid so chunk seams don't show
+        tufts = range((-self.rect.left) % 30, self.rect.width, 30) if grass else ()
+        tiles = []
+        for tx in range(0, self.rect.width, TERRAIN_TILE_W):
+            w = min(TERRAIN_TILE_W, self.rect.width - tx)
+            # the last tuft may hang past the platform's right edge
+            overhang = 15 if grass and tx + w == self.rect.width else 0
+            tile = pygame.Surface((w + overhang, self.rect.height + pad), pygame.SRCALPHA)
+            tile.blit(self.image, (0, pad), pygame.Rect(tx, 0, w, self.rect.height))
+            for x in tufts:
+                if tx - 15 < x < tx + w:
+                    pygame.draw.polygon(tile, (40, 120, 40), [(x - tx, pad), (x - tx + 8, 0), (x - tx + 15, pad)])
+            if pygame.display.get_surface() is not None:
+                tile = tile.convert_alpha()
+            tiles.append((tx, tile, pad))
+        return tiles
+
+# ---------- sword swing frames ----------
+SWING_LIFE = 22  # frames per swing
+# Every swing of a given facing looks identical at a given timer value, so the
+# rotated blade and its motion-blur trail are composited once and shared.
+_swing_bases = {}
+_swing_frames = {}
+_swing_frames_scale = None
+
+def swing_base(facing):
+    """Unrotated sword with its handle/pivot at the surface center."""
+    base = _swing_bases.get(facing)
+    if base is not None:
+        return base
+    if facing != 1:
+        # mirrored for left
+        base = pygame.transform.flip(swing_base(1), True, False)
+        _swing_bases[facing] = base
+        return base
+
+    # New rigid sword style: handle/pivot is at the surface center
+    blade_length = int(70 * CHAR_SCALE)
+    blade_w = max(2, int(4 * CHAR_SCALE))
+    handle_len = int(12 * CHAR_SCALE)
+    size_w = blade_length + handle_len + int(40 * CHAR_SCALE)
+    size_h = int(24 * CHAR_SCALE)
+
+    base = pygame.Surface((size_w, size_h), pygame.SRCALPHA)
+    cx = size_w // 2
+    cy = size_h // 2
+    # handle centered at pivot
+    pygame.draw.rect(base, (60,30,10), (cx - handle_len//2, cy - int(handle_len*0.2), handle_len, int(handle_len*0.4)))
+    pygame.draw.circle(base, (180,140,60), (cx - handle_len//2 - int(4*CHAR_SCALE), cy), int(3*CHAR_SCALE))
+    # blade extends to the right from pivot
+    blade_rect = pygame.Rect(cx, cy - blade_w//2, blade_length, blade_w)
+    pygame.draw.rect(base, (220,220,230), blade_rect)
+    tip = [(cx + blade_length, cy - blade_w//2), (cx + blade_length + int(10*CHAR_SCALE), cy), (cx + blade_length, cy + blade_w//2)]
+    pygame.draw.polygon(base, (220,220,230), tip)
+    pygame.draw.line(base, WHITE, (cx, cy - blade_w//2 + 1), (cx + blade_length, cy - blade_w//2 + 1), max(1, int(1*CHAR_SCALE)))
+    _swing_bases[facing] = base
+    return base
+
+def render_swing_frame(facing, timer):
+    life = SWING_LIFE
+    prog = max(0.0, min(1.0, (life - timer) / life))
+    # Smooth easing: cubic ease-in-out for natural deceleration/acceleration feel
+    if prog < 0.5:
+        ease = 2 * prog * prog
+    else:
+        ease = -1 + (4 - 2 * prog) * prog
+
+    # angle sweep for top-down overhead swing (downward arc)
+    if facing == 1:
+        start_ang, end_ang = -160, 10  # swing from top-left to bottom-right
+    else:
+        start_ang, end_ang = 160, -10  # swing from top-right to bottom-left
+    angle = start_ang + (end_ang - start_ang) * ease
+
+    rot = pygame.transform.rotate(swing_base(facing), angle)
+
+    # draw translucent trails of the rotated blade for motion blur
+    img = pygame.Surface(rot.get_size(), pygame.SRCALPHA)
+    for i in range(3):
+        t = (i + 1) / 4.0
+        alpha = int(120 * (1 - t) * (1 - ease))
+        trail = rot.copy()
+        trail.fill((255,255,255,alpha), special_flags=pygame.BLEND_RGBA_MULT)
+        offset_x = int(-t * 6 * facing)
+        img.blit(trail, (offset_x + 2 * i, 0))
+    # main blade on top
+    img.blit(rot, (0,0))
+    return img
+
+def swing_frame(facing, timer):
+    """Composited swing image for this facing and timer value, built on first use."""
+    global _swing_frames_scale
+    if _swing_frames_scale != CHAR_SCALE:
+        # CHAR_SCALE changed: rebuild the sword and every frame at the new size
+        _swing_bases.clear()
+        _swing_frames.clear()
+        _swing_frames_scale = CHAR_SCALE
+    key = (facing, timer)
+    img = _swing_frames.get(key)
+    if img is None:
+        img = render_swing_frame(facing, timer)
+        _swing_frames[key] = img
+    return img
+
+# ---------- sprite assets ----------
+# Enemy, Boss and MagicBolt images are the same for every instance, so each is
+# painted once (per CHAR_SCALE) by its registered painter and shared. When a
+# display is up the shared image is converted to its pixel format, so blitting
+# it needs no per-pixel conversion, and run-length encoded like the HUD: the
+# transparent margins and opaque runs are then skipped or copied wholesale
+# instead of blended pixel by pixel. Shared images are never drawn on.
+SPRITE_PAINTERS = {}
+_sprite_images = {}
+_sprite_converted = set()  # names whose shared image is in the display format
+_sprite_images_scale = None
+
+def register_sprite(name, paint):
+    """Register `paint() -> Surface` as the painter of sprite image `name`."""
+    SPRITE_PAINTERS[name] = paint
+    return paint
+
+def sprite_image(name):
+    """The shared image of sprite `name`, painted and converted on first use."""
+    global _sprite_images_scale
+    if _sprite_images_scale != CHAR_SCALE:
+        # CHAR_SCALE changed: every image is the wrong size
+        _sprite_images.clear()
+        _sprite_converted.clear()
+        _sprite_images_scale = CHAR_SCALE
+    img = _sprite_images.get(name)
+    if img is None:
+        img = _sprite_images[name] = SPRITE_PAINTERS[name]()
+    if name not in _sprite_converted and pygame.display.get_surface() is not None:
+        # painted headless, or just now: sprites made from here on share the converted copy
+        img = _sprite_images[name] = img.convert_alpha()
+        img.set_alpha(255, pygame.RLEACCEL)
+        _sprite_converted.add(name)
+    return img
+
+def sprite_blit_stats(repeat=2000, rounds=5):
+    """Blits per second of each sprite image as painted and as shared, onto the
+    display: {name: (painted, shared)}, the best of `rounds`. Needs open_window()."""
+    screen = pygame.display.get_surface()
+    stats = {}
+    for name, paint in SPRITE_PAINTERS.items():
+        rates = []
+        for img in (paint(), sprite_image(name)):
+            best = float('inf')
+            for _ in range(rounds):
+                start = time.perf_counter()
+                for i in range(repeat):
+                    screen.blit(img, (i % 64 * 8, i // 64 % 32 * 8))
+                best = min(best, time.perf_counter() - start)
+            rates.append(repeat / best)
+        stats[name] = tuple(rates)
+    return stats
 
 class SwordSwing(pygame.sprite.Sprite):
     def __init__(self, owner):
         super().__init__()
         # swing duration and active frames (slower, overhead swing)
-        self.timer = 22
+        self.timer = SWING_LIFE
         self.active_start = 7
         self.active_end = 16
 
@@ -108,31 +871,8 @@ class SwordSwing(pygame.sprite.Sprite):
         self.owner = owner
         self.did_hit = set()
 
-        # New rigid sword style: handle/pivot is at the surface center
-        blade_length = int(70 * CHAR_SCALE)
-        blade_w = max(2, int(4 * CHAR_SCALE))
-        handle_len = int(12 * CHAR_SCALE)
-        size_w = blade_length + handle_len + int(40 * CHAR_SCALE)
-        size_h = int(24 * CHAR_SCALE)
-
-        self.base_right = pygame.Surface((size_w, size_h), pygame.SRCALPHA)
-        cx = size_w // 2
-        cy = size_h // 2
-        # handle centered at pivot
-        pygame.draw.rect(self.base_right, (60,30,10), (cx - handle_len//2, cy - int(handle_len*0.2), handle_len, int(handle_len*0.4)))
-        pygame.draw.circle(self.base_right, (180,140,60), (cx - handle_len//2 - int(4*CHAR_SCALE), cy), int(3*CHAR_SCALE))
-        # blade extends to the right from pivot
-        blade_rect = pygame.Rect(cx, cy - blade_w//2, blade_length, blade_w)
-        pygame.draw.rect(self.base_right, (220,220,230), blade_rect)
-        tip = [(cx + blade_length, cy - blade_w//2), (cx + blade_length + int(10*CHAR_SCALE), cy), (cx + blade_length, cy + blade_w//2)]
-        pygame.draw.polygon(self.base_right, (220,220,230), tip)
-        pygame.draw.line(self.base_right, WHITE, (cx, cy - blade_w//2 + 1), (cx + blade_length, cy - blade_w//2 + 1), max(1, int(1*CHAR_SCALE)))
-
-        # mirrored for left
-        self.base_left = pygame.transform.flip(self.base_right, True, False)
-
-        # image will be replaced with rotated surface each frame
-        self.image = self.base_right.copy()
+        # image is swapped for a shared pre-composited frame each update
+        self.image = swing_frame(self.facing, self.timer)
         self.rect = self.image.get_rect()
 
     def update(self):
@@ -141,48 +881,25 @@ class SwordSwing(pygame.sprite.Sprite):
             self.kill()
             return
 
-        life = 22
-        prog = max(0.0, min(1.0, (life - self.timer) / life))
-        # Smooth easing: cubic ease-in-out for natural deceleration/acceleration feel
-        if prog < 0.5:
-            ease = 2 * prog * prog
-        else:
-            ease = -1 + (4 - 2 * prog) * prog
-
-        # angle sweep for top-down overhead swing (downward arc)
-        if self.facing == 1:
-            start_ang, end_ang = -160, 10  # swing from top-left to bottom-right
-        else:
-            start_ang, end_ang = 160, -10  # swing from top-right to bottom-left
-        angle = start_ang + (end_ang - start_ang) * ease
-
-        base = self.base_right if self.facing == 1 else self.base_left
-        rot = pygame.transform.rotate(base, angle)
-
-        # draw translucent trails of the rotated blade for motion blur
-        img = pygame.Surface(rot.get_size(), pygame.SRCALPHA)
-        for i in range(3):
-            t = (i + 1) / 4.0
-            alpha = int(120 * (1 - t) * (1 - ease))
-            trail = rot.copy()
-            trail.fill((255,255,255,alpha), special_flags=pygame.BLEND_RGBA_MULT)
-            offset_x = int(-t * 6 * self.facing)
-            img.blit(trail, (offset_x + 2 * i, 0))
-        # main blade on top
-        img.blit(rot, (0,0))
-
         # position pivot (image center) floating out in front of player, not at body
         hand_x = self.owner.rect.centerx + self.facing * (self.owner.rect.width // 2 + int(20 * CHAR_SCALE))
         hand_y = self.owner.rect.centery  # center height
-        self.image = img
+        self.image = swing_frame(self.facing, self.timer)
         self.rect = self.image.get_rect(center=(hand_x, hand_y))
 
     def damage_active(self):
-        life = 22
+        life = SWING_LIFE
         elapsed = life - self.timer
         return self.active_start <= elapsed <= self.active_end
 
 
+def paint_bolt():
+    surf = pygame.Surface((int(12*CHAR_SCALE), int(8*CHAR_SCALE)), pygame.SRCALPHA)
+    pygame.draw.ellipse(surf, (150,180,255), (0,0,surf.get_width(), surf.get_height()))
+    return surf
+
+register_sprite('bolt', paint_bolt)
+
 class MagicBolt(pygame.sprite.Sprite):
     """Simple projectile used by Mage class."""
     def __init__(self, owner):
@@ -190,8 +907,7 @@ class MagicBolt(pygame.sprite.Sprite):
         self.owner = owner
         # Nerfed projectile speed for balance (was 18)
         self.speed = 14 * owner.facing
-        self.image = pygame.Surface((int(12*CHAR_SCALE), int(8*CHAR_SCALE)), pygame.SRCALPHA)
-        pygame.draw.ellipse(self.image, (150,180,255), (0,0,self.image.get_width(), self.image.get_height()))
+        self.image = sprite_image('bolt')
         self.rect = self.image.get_rect(center=(owner.rect.centerx + owner.facing* (owner.rect.width//2 + 10), owner.rect.centery))
         # Shorter lifetime so mages can't spam long-range shots across whole map
         self.life = 30
@@ -204,6 +920,78 @@ class MagicBolt(pygame.sprite.Sprite):
         if self.life <= 0:
             self.kill()
 
+# ---------- items ----------
+class ItemType:
+    """An item definition: shop price, menu look and the effect of using it.
+
+    `heal` restores HP at once; `attack` (bonus damage) and `knockback`
+    (multiplier) last `duration` ticks.
+    """
+    def __init__(self, name, cost, color, blurb, heal=0, attack=0, knockback=1.0, duration=0):
+        self.name = name
+        self.key = name.lower()
+        self.cost = cost
+        self.color = color
+        self.blurb = blurb
+        self.heal = heal
+        self.attack = attack
+        self.knockback = knockback
+        self.duration = duration
+
+    def apply(self, player):
+        if self.heal:
+            player.health = min(player.max_health, player.health + self.heal)
+        if self.attack:
+            player.attack_bonus = player.base_attack_bonus + self.attack
+            player.strength_timer = self.duration
+        if self.knockback != 1.0:
+            player.knockback_boost = self.knockback
+            player.knockback_timer = self.duration
+
+# registry of item types by key; insertion order is shop, HUD and use order
+ITEMS = {}
+
+def register_item(item):
+    ITEMS[item.key] = item
+    return item
+
+register_item(ItemType('Health', 20, GREEN, "Restore 60 HP", heal=60))
+register_item(ItemType('Strength', 60, YELLOW, "+25 Damage 1s", attack=25, duration=120))  # ~1 second at 120 ticks/s
+register_item(ItemType('Knockback', 50, CYAN, "1.8x Knockback", knockback=1.8, duration=120))
+
+class Inventory:
+    """Item stacks keyed by item key, so counts and lookups are O(1)."""
+    def __init__(self):
+        self.stacks = {}
+        self.total = 0
+
+    def __len__(self):
+        return self.total
+
+    def __contains__(self, item):
+        return self.stacks.get(item.lower(), 0) > 0
+
+    def count(self, item):
+        return self.stacks.get(item.lower(), 0)
+
+    def add(self, item, n=1):
+        key = item.lower()
+        self.stacks[key] = self.stacks.get(key, 0) + n
+        self.total += n
+
+    def remove(self, item, n=1):
+        """Take `n` of an item. Returns False, leaving the stack alone, if there are fewer."""
+        key = item.lower()
+        have = self.stacks.get(key, 0)
+        if have < n:
+            return False
+        if have == n:
+            del self.stacks[key]
+        else:
+            self.stacks[key] = have - n
+        self.total -= n
+        return True
+
 # ---------- entities ----------
 class Player(pygame.sprite.Sprite):
     def __init__(self, x, y, class_name='Werrior'):
@@ -222,8 +1010,8 @@ class Player(pygame.sprite.Sprite):
         self.max_health = 120
         self.health = self.max_health
         self.water = 50
-        # inventory: simple list of item names
-        self.inventory: List[str] = []
+        # inventory: stacks of item names
+        self.inventory = Inventory()
         self.facing = 1
         self.att_cd = 0
         # dash state: cooldown, active timer, velocity, invulnerability frames
@@ -277,26 +1065,25 @@ class Player(pygame.sprite.Sprite):
             self.dash_strength = 22
             self.dash_invuln = 12
 
-    def add_item(self, item: str):
-        self.inventory.append(item)
+    def add_item(self, item: str, n: int = 1):
+        self.inventory.add(item, n)
 
     def has_item(self, item: str) -> bool:
         return item in self.inventory
 
     def use_potion(self, potion_type: str = "Health") -> bool:
         """Consume a Potion. Returns True if used."""
-        for i, it in enumerate(self.inventory):
-            if it.lower() == potion_type.lower():
-                if potion_type.lower() == 'health':
-                    self.health = min(self.max_health, self.health + 60)
-                elif potion_type.lower() == 'strength':
-                    self.attack_bonus = self.base_attack_bonus + 25
-                    self.strength_timer = 120  # ~1 second at 120 FPS
-                elif potion_type.lower() == 'knockback':
-                    self.knockback_boost = 1.8
-                    self.knockback_timer = 120
-                del self.inventory[i]
-                return True
+        item = ITEMS.get(potion_type.lower())
+        if item is None or not self.inventory.remove(item.key):
+            return False
+        item.apply(self)
+        return True
+
+    def use_any_potion(self) -> bool:
+        """Consume the first potion held, in registry order. Returns True if used."""
+        for key in ITEMS:
+            if self.inventory.count(key):
+                return self.use_potion(key)
         return False
 
     def update(self, keys, plats, swings, particles):
@@ -332,8 +1119,8 @@ class Player(pygame.sprite.Sprite):
             self.land_time = 5  # brief land recovery
             # landing particles
             for _ in range(3):
-                vx = random.uniform(-1, 1)
-                vy = random.uniform(-1, 0.5)
+                vx = RNG.fx.uniform(-1, 1)
+                vy = RNG.fx.uniform(-1, 0.5)
                 particles.add(Particle(self.rect.centerx, self.rect.bottom, vx, vy, BLUE, 15))
         self.on_ground_last = on_ground
 
@@ -366,7 +1153,7 @@ class Player(pygame.sprite.Sprite):
         if self.dash_timer > 0:
             self.rect.x += int(self.dash_vel)
             # clamp so dash can't push you outside the level
-            self.rect.x = max(0, min(self.rect.x, LEVEL_WIDTH - self.rect.width))
+            self.rect.x = max(0, min(self.rect.x, game_state.level_width - self.rect.width))
             # light friction
             self.dash_vel *= 0.92
             self.dash_timer -= 1
@@ -386,7 +1173,7 @@ class Player(pygame.sprite.Sprite):
         # gravity
         self.vel_y += 0.6
         self.rect.y += self.vel_y
-        for p in plats:
+        for p in platforms_near(plats, self.rect):
             if self.rect.colliderect(p.rect) and self.vel_y >= 0:
                 self.rect.bottom = p.rect.top
                 self.vel_y = 0
@@ -416,8 +1203,8 @@ class Player(pygame.sprite.Sprite):
                 hand_x = self.rect.centerx + self.facing * (self.rect.width // 2)
                 hand_y = self.rect.centery - int(6 * self.scale)
                 for _ in range(6):
-                    vx = random.uniform(-1.5, 1.5) + self.facing * 0.5
-                    vy = random.uniform(-1, -0.2)
+                    vx = RNG.fx.uniform(-1.5, 1.5) + self.facing * 0.5
+                    vy = RNG.fx.uniform(-1, -0.2)
                     particles.add(Particle(hand_x, hand_y, vx, vy, CYAN, lifetime=12))
                 # spawn the projectile
                 bolt = MagicBolt(self)
@@ -435,7 +1222,8 @@ class Player(pygame.sprite.Sprite):
         # and the player's horizontal center is above that platform.
         # Use a small tolerance to allow for minor positional differences (e.g., 6 pixels).
         tol = 6
-        for p in plats:
+        probe = pygame.Rect(self.rect.centerx, self.rect.bottom - tol, 1, 2 * tol + 1)
+        for p in platforms_near(plats, probe):
             top = p.rect.top
             if (top - tol) <= self.rect.bottom <= (top + tol) and (p.rect.left < self.rect.centerx < p.rect.right):
                 return True
@@ -444,15 +1232,25 @@ class Player(pygame.sprite.Sprite):
     def draw(self, s):
         self.draw_at_pos(s, self.rect)
         
-    def draw_at_pos(self, s, rect):
-        # Render character to a temporary surface
-        x, y = rect.topleft
-        bob = 0
-        if self.walk_phase:
-            bob = int(math.sin(self.walk_phase / 5.0) * 2 * self.scale)
-        
-        surf_w = rect.width
-        surf_h = rect.height
+    # pre-rendered poses shared by all players, keyed by (class, bob, facing, size)
+    _pose_cache = {}
+    _pose_cache_scale = None
+
+    def pose_surface(self, bob, size):
+        """Return the cached character image for this bob offset, rendering it on first use."""
+        if Player._pose_cache_scale != CHAR_SCALE:
+            # CHAR_SCALE changed: every cached pose is the wrong size
+            Player._pose_cache.clear()
+            Player._pose_cache_scale = CHAR_SCALE
+        key = (self.class_name, bob, self.facing, size)
+        surf = Player._pose_cache.get(key)
+        if surf is None:
+            surf = self.render_pose(bob, size)
+            Player._pose_cache[key] = surf
+        return surf
+
+    def render_pose(self, bob, size):
+        surf_w, surf_h = size
         char_surf = pygame.Surface((surf_w, surf_h), pygame.SRCALPHA)
         
         # Character drawing with proper centering
@@ -507,6 +1305,17 @@ class Player(pygame.sprite.Sprite):
         
         pygame.draw.rect(char_surf, leg_color, (leg_left_x, leg_y, leg_w, leg_h))
         pygame.draw.rect(char_surf, leg_color, (leg_right_x, leg_y, leg_w, leg_h))
+        return char_surf
+
+    def draw_at_pos(self, s, rect):
+        x, y = rect.topleft
+        bob = 0
+        if self.walk_phase:
+            bob = int(math.sin(self.walk_phase / 5.0) * 2 * self.scale)
+        
+        surf_w = rect.width
+        surf_h = rect.height
+        char_surf = self.pose_surface(bob, rect.size)
         
         # Health bar drawn on main surface (not rotated)
         pygame.draw.rect(s, GRAY, (rect.x, rect.y - 8, 40, 5))
@@ -556,38 +1365,64 @@ class Player(pygame.sprite.Sprite):
             # normal draw
             s.blit(char_surf, (x, y))
 
+# ---------- AI level of detail ----------
+AI_FULL = 'full'
+AI_REDUCED = 'reduced'
+AI_SLEEPING = 'sleeping'
+AI_FULL_MARGIN = 160           # px beyond the view where enemies still think every tick
+AI_REDUCED_MARGIN = WIDTH // 2  # px beyond the view where they think every few ticks
+AI_REDUCED_INTERVAL = 4        # ticks between AI updates in the reduced tier
+AI_WAKE_DISTANCE = 300         # enemies this close to the player always run at full rate
+
+def ai_tier(enemy, player, camera_x):
+    cx = enemy.rect.centerx
+    if abs(player.rect.centerx - cx) < AI_WAKE_DISTANCE:
+        return AI_FULL
+    off_view = max(0, camera_x - cx, cx - (camera_x + WIDTH))
+    if off_view <= AI_FULL_MARGIN:
+        return AI_FULL
+    if off_view <= AI_REDUCED_MARGIN:
+        return AI_REDUCED
+    return AI_SLEEPING
+
+def paint_bandit():
+    """The bandit, a CHAR_SCALE-sized 32x48 figure."""
+    # scale enemy size with CHAR_SCALE
+    ew = int(32 * CHAR_SCALE)
+    eh = int(48 * CHAR_SCALE)
+    surf = pygame.Surface((ew, eh), pygame.SRCALPHA)
+    
+    # Draw bandit: red body, black mask/bandana, menacing look
+    # Body (red shirt)
+    pygame.draw.rect(surf, (200, 40, 40), (int(4*CHAR_SCALE), int(16*CHAR_SCALE), int(24*CHAR_SCALE), int(20*CHAR_SCALE)))
+    
+    # Head (tan/skin color)
+    pygame.draw.ellipse(surf, (180, 150, 120), (int(6*CHAR_SCALE), int(2*CHAR_SCALE), int(20*CHAR_SCALE), int(14*CHAR_SCALE)))
+    
+    # Black bandit mask covering eyes
+    pygame.draw.rect(surf, BLACK, (int(8*CHAR_SCALE), int(4*CHAR_SCALE), int(16*CHAR_SCALE), int(6*CHAR_SCALE)))
+    
+    # Eyes (white with menacing pupils)
+    pygame.draw.circle(surf, WHITE, (int(12*CHAR_SCALE), int(7*CHAR_SCALE)), int(2*CHAR_SCALE))
+    pygame.draw.circle(surf, WHITE, (int(20*CHAR_SCALE), int(7*CHAR_SCALE)), int(2*CHAR_SCALE))
+    pygame.draw.circle(surf, BLACK, (int(12*CHAR_SCALE), int(7*CHAR_SCALE)), int(1*CHAR_SCALE))
+    pygame.draw.circle(surf, BLACK, (int(20*CHAR_SCALE), int(7*CHAR_SCALE)), int(1*CHAR_SCALE))
+    
+    # Arms (tan)
+    pygame.draw.rect(surf, (180, 150, 120), (int(2*CHAR_SCALE), int(16*CHAR_SCALE), int(5*CHAR_SCALE), int(14*CHAR_SCALE)))
+    pygame.draw.rect(surf, (180, 150, 120), (int(25*CHAR_SCALE), int(16*CHAR_SCALE), int(5*CHAR_SCALE), int(14*CHAR_SCALE)))
+    
+    # Legs (black pants)
+    pygame.draw.rect(surf, BLACK, (int(8*CHAR_SCALE), int(36*CHAR_SCALE), int(8*CHAR_SCALE), int(12*CHAR_SCALE)))
+    pygame.draw.rect(surf, BLACK, (int(16*CHAR_SCALE), int(36*CHAR_SCALE), int(8*CHAR_SCALE), int(12*CHAR_SCALE)))
+    return surf
+
+register_sprite('bandit', paint_bandit)
+
 class Enemy(pygame.sprite.Sprite):
     def __init__(self,x,y):
         super().__init__()
-        # scale enemy size with CHAR_SCALE
-        ew = int(32 * CHAR_SCALE)
-        eh = int(48 * CHAR_SCALE)
-        self.image = pygame.Surface((ew, eh), pygame.SRCALPHA)
-        
-        # Draw bandit: red body, black mask/bandana, menacing look
-        # Body (red shirt)
-        pygame.draw.rect(self.image, (200, 40, 40), (int(4*CHAR_SCALE), int(16*CHAR_SCALE), int(24*CHAR_SCALE), int(20*CHAR_SCALE)))
-        
-        # Head (tan/skin color)
-        pygame.draw.ellipse(self.image, (180, 150, 120), (int(6*CHAR_SCALE), int(2*CHAR_SCALE), int(20*CHAR_SCALE), int(14*CHAR_SCALE)))
-        
-        # Black bandit mask covering eyes
-        pygame.draw.rect(self.image, BLACK, (int(8*CHAR_SCALE), int(4*CHAR_SCALE), int(16*CHAR_SCALE), int(6*CHAR_SCALE)))
-        
-        # Eyes (white with menacing pupils)
-        pygame.draw.circle(self.image, WHITE, (int(12*CHAR_SCALE), int(7*CHAR_SCALE)), int(2*CHAR_SCALE))
-        pygame.draw.circle(self.image, WHITE, (int(20*CHAR_SCALE), int(7*CHAR_SCALE)), int(2*CHAR_SCALE))
-        pygame.draw.circle(self.image, BLACK, (int(12*CHAR_SCALE), int(7*CHAR_SCALE)), int(1*CHAR_SCALE))
-        pygame.draw.circle(self.image, BLACK, (int(20*CHAR_SCALE), int(7*CHAR_SCALE)), int(1*CHAR_SCALE))
-        
-        # Arms (tan)
-        pygame.draw.rect(self.image, (180, 150, 120), (int(2*CHAR_SCALE), int(16*CHAR_SCALE), int(5*CHAR_SCALE), int(14*CHAR_SCALE)))
-        pygame.draw.rect(self.image, (180, 150, 120), (int(25*CHAR_SCALE), int(16*CHAR_SCALE), int(5*CHAR_SCALE), int(14*CHAR_SCALE)))
-        
-        # Legs (black pants)
-        pygame.draw.rect(self.image, BLACK, (int(8*CHAR_SCALE), int(36*CHAR_SCALE), int(8*CHAR_SCALE), int(12*CHAR_SCALE)))
-        pygame.draw.rect(self.image, BLACK, (int(16*CHAR_SCALE), int(36*CHAR_SCALE), int(8*CHAR_SCALE), int(12*CHAR_SCALE)))
-        
+        self.image = sprite_image('bandit')
         self.rect = self.image.get_rect(topleft=(x,y))
         self.health=60; self.max_health=60
         self.speed=2; self.dir=1; self.cool=0
@@ -595,6 +1430,9 @@ class Enemy(pygame.sprite.Sprite):
         self.vel_y = 0.0
         self.knockback_x = 0.0
         self.hit_flash_timer = 0  # Flash when hit by sword
+        # AI level-of-detail bookkeeping (see World.step)
+        self.ai_phase = x % AI_REDUCED_INTERVAL
+        self.ai_last_tick = None
         
     def ai(self,player,plats,swings,particles):
         # knockback friction
@@ -609,18 +1447,40 @@ class Enemy(pygame.sprite.Sprite):
         else:
             self.rect.x += self.speed*self.dir
             # clamp to level bounds so bandits cannot run off the map
-            self.rect.x = max(0, min(self.rect.x, LEVEL_WIDTH - self.rect.width))
+            self.rect.x = max(0, min(self.rect.x, game_state.level_width - self.rect.width))
             self.facing = self.dir
-            if random.random()<0.01: self.dir*=-1
+            if RNG.ai.random()<0.01: self.dir*=-1
         self.vel_y += 0.6
         self.rect.y += self.vel_y
-        for p in plats:
+        for p in platforms_near(plats, self.rect):
             if self.rect.colliderect(p.rect) and self.vel_y>=0:
                 self.rect.bottom=p.rect.top
                 self.vel_y=0
         if self.cool>0:self.cool-=1
         if self.hit_flash_timer > 0:
             self.hit_flash_timer -= 1
+
+    def catch_up(self, player, plats, ticks):
+        """Run `ticks` skipped AI ticks in one go while the player is too far away to be attacked."""
+        # knockback friction: closed form of applying *0.90 once per tick
+        decay = 0.90 ** ticks
+        self.rect.x += self.knockback_x * 0.90 * (1 - decay) / 0.10
+        self.knockback_x *= decay
+        self.rect.x += self.speed*self.dir*ticks
+        self.rect.x = max(0, min(self.rect.x, game_state.level_width - self.rect.width))
+        self.facing = self.dir
+        if RNG.ai.random() < 1 - 0.99**ticks: self.dir*=-1
+        self.fall(plats, ticks)
+        self.cool = max(0, self.cool - ticks)
+        self.hit_flash_timer = max(0, self.hit_flash_timer - ticks)
+
+    def fall(self, plats, ticks=1):
+        self.vel_y += 0.6 * ticks
+        self.rect.y += self.vel_y
+        for p in platforms_near(plats, self.rect):
+            if self.rect.colliderect(p.rect) and self.vel_y>=0:
+                self.rect.bottom=p.rect.top
+                self.vel_y=0
     
     def take_damage(self, dmg, particles):
         """Handle damage and spawn damage particles."""
@@ -629,8 +1489,8 @@ class Enemy(pygame.sprite.Sprite):
             self.health = 0
         # damage particles
         for _ in range(5):
-            vx = random.uniform(-2, 2)
-            vy = random.uniform(-3, -1)
+            vx = RNG.fx.uniform(-2, 2)
+            vy = RNG.fx.uniform(-3, -1)
             particles.add(Particle(self.rect.centerx, self.rect.centery, vx, vy, RED, 20))
         game_state.screen_shake = 2
         game_state.screen_shake_intensity = 1
@@ -644,717 +1504,1730 @@ class Enemy(pygame.sprite.Sprite):
         pygame.draw.rect(s, GRAY, (rect.x, rect.y-8, 40, 5))
         pygame.draw.rect(s, RED, (rect.x, rect.y-8, 40*(self.health/self.max_health), 5))
 
+def paint_bandit_king():
+    """The Bandit King, twice the bandit's size with a crown."""
+    bw = int(64 * CHAR_SCALE)
+    bh = int(80 * CHAR_SCALE)
+    surf = pygame.Surface((bw, bh), pygame.SRCALPHA)
+    
+    # Draw Bandit King: larger, more menacing
+    # Body (dark red armor-like)
+    pygame.draw.rect(surf, (120, 20, 20), (int(8*CHAR_SCALE), int(20*CHAR_SCALE), int(48*CHAR_SCALE), int(30*CHAR_SCALE)))
+    
+    # Head (larger)
+    pygame.draw.ellipse(surf, (180, 150, 120), (int(10*CHAR_SCALE), int(2*CHAR_SCALE), int(44*CHAR_SCALE), int(20*CHAR_SCALE)))
+    
+    # Large menacing mask
+    pygame.draw.rect(surf, BLACK, (int(12*CHAR_SCALE), int(4*CHAR_SCALE), int(40*CHAR_SCALE), int(10*CHAR_SCALE)))
+    
+    # Eyes (larger, glowing yellow pupils)
+    pygame.draw.circle(surf, WHITE, (int(20*CHAR_SCALE), int(10*CHAR_SCALE)), int(3*CHAR_SCALE))
+    pygame.draw.circle(surf, WHITE, (int(40*CHAR_SCALE), int(10*CHAR_SCALE)), int(3*CHAR_SCALE))
+    pygame.draw.circle(surf, YELLOW, (int(20*CHAR_SCALE), int(10*CHAR_SCALE)), int(2*CHAR_SCALE))
+    pygame.draw.circle(surf, YELLOW, (int(40*CHAR_SCALE), int(10*CHAR_SCALE)), int(2*CHAR_SCALE))
+    
+    # Crown/spikes on top
+    for i in range(3):
+        pygame.draw.polygon(surf, YELLOW, [(int((18+i*10)*CHAR_SCALE), int(0)), (int((20+i*10)*CHAR_SCALE), int(-3*CHAR_SCALE)), (int((22+i*10)*CHAR_SCALE), int(0))])
+    
+    # Arms (large)
+    pygame.draw.rect(surf, (180, 150, 120), (int(4*CHAR_SCALE), int(20*CHAR_SCALE), int(6*CHAR_SCALE), int(20*CHAR_SCALE)))
+    pygame.draw.rect(surf, (180, 150, 120), (int(54*CHAR_SCALE), int(20*CHAR_SCALE), int(6*CHAR_SCALE), int(20*CHAR_SCALE)))
+    
+    # Legs
+    pygame.draw.rect(surf, BLACK, (int(16*CHAR_SCALE), int(50*CHAR_SCALE), int(12*CHAR_SCALE), int(20*CHAR_SCALE)))
+    pygame.draw.rect(surf, BLACK, (int(36*CHAR_SCALE), int(50*CHAR_SCALE), int(12*CHAR_SCALE), int(20*CHAR_SCALE)))
+    return surf
+
+register_sprite('bandit king', paint_bandit_king)
+
 class Boss(Enemy):
     def __init__(self,x,y):
         super().__init__(x,y)
-        bw = int(64 * CHAR_SCALE)
-        bh = int(80 * CHAR_SCALE)
-        self.image = pygame.Surface((bw, bh), pygame.SRCALPHA)
-        
-        # Draw Bandit King: larger, more menacing
-        # Body (dark red armor-like)
-        pygame.draw.rect(self.image, (120, 20, 20), (int(8*CHAR_SCALE), int(20*CHAR_SCALE), int(48*CHAR_SCALE), int(30*CHAR_SCALE)))
-        
-        # Head (larger)
-        pygame.draw.ellipse(self.image, (180, 150, 120), (int(10*CHAR_SCALE), int(2*CHAR_SCALE), int(44*CHAR_SCALE), int(20*CHAR_SCALE)))
-        
-        # Large menacing mask
-        pygame.draw.rect(self.image, BLACK, (int(12*CHAR_SCALE), int(4*CHAR_SCALE), int(40*CHAR_SCALE), int(10*CHAR_SCALE)))
-        
-        # Eyes (larger, glowing yellow pupils)
-        pygame.draw.circle(self.image, WHITE, (int(20*CHAR_SCALE), int(10*CHAR_SCALE)), int(3*CHAR_SCALE))
-        pygame.draw.circle(self.image, WHITE, (int(40*CHAR_SCALE), int(10*CHAR_SCALE)), int(3*CHAR_SCALE))
-        pygame.draw.circle(self.image, YELLOW, (int(20*CHAR_SCALE), int(10*CHAR_SCALE)), int(2*CHAR_SCALE))
-        pygame.draw.circle(self.image, YELLOW, (int(40*CHAR_SCALE), int(10*CHAR_SCALE)), int(2*CHAR_SCALE))
-        
-        # Crown/spikes on top
-        for i in range(3):
-            pygame.draw.polygon(self.image, YELLOW, [(int((18+i*10)*CHAR_SCALE), int(0)), (int((20+i*10)*CHAR_SCALE), int(-3*CHAR_SCALE)), (int((22+i*10)*CHAR_SCALE), int(0))])
-        
-        # Arms (large)
-        pygame.draw.rect(self.image, (180, 150, 120), (int(4*CHAR_SCALE), int(20*CHAR_SCALE), int(6*CHAR_SCALE), int(20*CHAR_SCALE)))
-        pygame.draw.rect(self.image, (180, 150, 120), (int(54*CHAR_SCALE), int(20*CHAR_SCALE), int(6*CHAR_SCALE), int(20*CHAR_SCALE)))
-        
-        # Legs
-        pygame.draw.rect(self.image, BLACK, (int(16*CHAR_SCALE), int(50*CHAR_SCALE), int(12*CHAR_SCALE), int(20*CHAR_SCALE)))
-        pygame.draw.rect(self.image, BLACK, (int(36*CHAR_SCALE), int(50*CHAR_SCALE), int(12*CHAR_SCALE), int(20*CHAR_SCALE)))
-        
+        self.image = sprite_image('bandit king')
         self.rect = self.image.get_rect(topleft=(x,y))
         self.health=300; self.max_health=300; self.speed=3
     def ai(self,player,plats,swings,particles):
         self.knockback_x *= 0.90
         self.rect.x += self.knockback_x
 
-        if random.random()<0.02:
+        if RNG.ai.random()<0.02:
             self.dir = 1 if player.rect.centerx>self.rect.centerx else -1
         self.rect.x += self.speed*self.dir
         # clamp boss to level bounds as well
-        self.rect.x = max(0, min(self.rect.x, LEVEL_WIDTH - self.rect.width))
+        self.rect.x = max(0, min(self.rect.x, game_state.level_width - self.rect.width))
         self.facing = self.dir
         if abs(player.rect.centerx-self.rect.centerx)<150 and self.cool==0:
             swing=SwordSwing(self); swings.add(swing); self.cool=25
             self.facing = 1 if player.rect.centerx > self.rect.centerx else -1
         self.vel_y=getattr(self,"vel_y",0)+0.6
         self.rect.y+=self.vel_y
-        for p in plats:
+        for p in platforms_near(plats, self.rect):
             if self.rect.colliderect(p.rect) and self.vel_y>=0:
                 self.rect.bottom=p.rect.top
                 self.vel_y=0
         if self.cool>0:self.cool-=1
 
+    def catch_up(self, player, plats, ticks):
+        decay = 0.90 ** ticks
+        self.rect.x += self.knockback_x * 0.90 * (1 - decay) / 0.10
+        self.knockback_x *= decay
+        if RNG.ai.random() < 1 - 0.98**ticks:
+            self.dir = 1 if player.rect.centerx>self.rect.centerx else -1
+        self.rect.x += self.speed*self.dir*ticks
+        self.rect.x = max(0, min(self.rect.x, game_state.level_width - self.rect.width))
+        self.facing = self.dir
+        self.fall(plats, ticks)
+        self.cool = max(0, self.cool - ticks)
+
+# ---------- modal screens ----------
+# events after which a static screen is repainted
+REDRAW_EVENTS = (pygame.KEYDOWN, pygame.WINDOWEXPOSED)
+
+class ModalScreen:
+    """A full-screen menu or message that owns the display until it closes.
+
+    Subclasses implement draw(s) and handle(event); handle returns a result
+    (anything but None) to close the screen, and run() returns it. A static
+    screen is painted once and then sleeps in pygame.event.wait, repainting
+    only after a key press; an animated one (animated = True) repaints every
+    frame at FPS and may also close from update(). Toasts still up from
+    the screen underneath are dropped when a screen opens.
+    """
+    animated = False
+
+    def draw(self, s):
+        raise NotImplementedError
+
+    def handle(self, event):
+        return None
+
+    def update(self):
+        return None
+
+    def shown(self):
+        """Called once the screen is first on the display."""
+
+    def run(self):
+        TOASTS.clear()
+        self.draw(SCREEN)
+        pygame.display.flip()
+        self.shown()
+        while True:
+            if self.animated:
+                CLOCK.tick(FPS)
+                events = pygame.event.get()
+            else:
+                events = [pygame.event.wait()] + pygame.event.get()
+            for e in events:
+                if e.type == pygame.QUIT:
+                    pygame.quit(); sys.exit()
+                result = self.handle(e)
+                if result is not None:
+                    return self.close(result)
+            if self.animated:
+                result = self.update()
+                if result is not None:
+                    return self.close(result)
+            if self.animated or any(e.type in REDRAW_EVENTS for e in events):
+                self.draw(SCREEN)
+                pygame.display.flip()
+
+    def close(self, result):
+        # time spent here was not game time; keep the caller's next frame from simulating it
+        CLOCK.tick()
+        return result
+
+class StoryScreen(ModalScreen):
+    """Lines of story text, closed with ENTER."""
+    def __init__(self, lines):
+        self.lines = lines
+
+    def draw(self, s):
+        s.fill(BLACK)
+        for i,l in enumerate(self.lines):
+            draw_text_center(l,200+i*40)
+        draw_text_center("Press ENTER",HEIGHT-80,24,GRAY)
+
+    def handle(self, e):
+        if e.type==pygame.KEYDOWN and e.key==pygame.K_RETURN:
+            return True
+
 # ---------- story helpers ----------
 def story(lines):
-    SCREEN.fill(BLACK)
-    for i,l in enumerate(lines):
-        draw_text_center(l,200+i*40)
-    draw_text_center("Press ENTER",HEIGHT-80,24,GRAY)
-    pygame.display.flip()
-    wait=True
-    while wait:
-        for e in pygame.event.get():
-            if e.type==pygame.QUIT: pygame.quit();sys.exit()
-            if e.type==pygame.KEYDOWN and e.key==pygame.K_RETURN: wait=False
-
-def cutscene(title, lines, duration=None, color_scheme=None):
-    """Display an animated cinematic cutscene with dramatic effects."""
-    import time
-    start_time = time.time()
-    fade_in_time = 0.7
-    display_time = duration if duration else 4.0
-    fade_out_time = 0.7
-    total_time = fade_in_time + display_time + fade_out_time
-    
-    # Color scheme: (primary, accent1, accent2)
-    if color_scheme is None:
-        color_scheme = ((255, 255, 100), (100, 200, 255), (200, 100, 255))  # Gold/Cyan/Purple
-    
-    # Generate particle effects
-    particles = []
-    for _ in range(30):
-        particles.append({
-            'x': random.uniform(0, WIDTH),
-            'y': random.uniform(-50, HEIGHT + 50),
-            'vx': random.uniform(-1, 1),
-            'vy': random.uniform(0.5, 2),
-            'life': random.uniform(0.5, 3),
-            'color': random.choice(color_scheme)
-        })
-    
-    while True:
-        elapsed = time.time() - start_time
-        if elapsed > total_time:
-            break
-        
-        # Calculate alpha based on fade phases
-        if elapsed < fade_in_time:
-            alpha = int(255 * (elapsed / fade_in_time))
-        elif elapsed < fade_in_time + display_time:
-            alpha = 255
-        else:
-            remaining = total_time - elapsed
-            alpha = int(255 * (remaining / fade_out_time))
-        
-        # BACKGROUND: Gradient from dark to atmospheric
+    StoryScreen(lines).run()
+
+class CutsceneArt:
+    """Everything static in a cutscene, composed once.
+
+    The gradient backdrop, the glow-stacked title, each story line with its
+    glow and the skip prompt are rendered up front; a frame only sets alphas,
+    picks offsets and blits.
+    """
+    def __init__(self, title, lines, color_scheme, display_time=4.0):
+        self.color_scheme = color_scheme
+        self.fade_in_time = 0.7
+        self.fade_out_time = 0.7
+        self.display_time = display_time
+        self.total_time = self.fade_in_time + display_time + self.fade_out_time
+        # backdrop: gradient bands from dark to atmospheric; the screen is
+        # never cleared, so only the band rows are blitted and trails remain
+        self.background = pygame.Surface((WIDTH, HEIGHT))
+        self.background.fill(LAYER_COLORKEY)
         for y in range(0, HEIGHT, 20):
             ratio = y / HEIGHT
-            r = int(10 + ratio * 30)
-            g = int(10 + ratio * 40)
-            b = int(20 + ratio * 50)
-            color = (r, g, b)
-            pygame.draw.line(SCREEN, color, (0, y), (WIDTH, y))
-        
+            color = (int(10 + ratio * 30), int(10 + ratio * 40), int(20 + ratio * 50))
+            pygame.draw.line(self.background, color, (0, y), (WIDTH, y))
+        self.background.set_colorkey(LAYER_COLORKEY, pygame.RLEACCEL)
+        self.scan_line = pygame.Surface((WIDTH, 1))
+        self.scan_line.fill((50, 100, 150))
+        self.overlay = pygame.Surface((WIDTH, HEIGHT))
+        # title: six stacked glow layers under the bright text
+        title_surf = render_text(title, BIG_SIZE, color_scheme[0]).copy()
+        self.title = pygame.Surface(title_surf.get_size(), pygame.SRCALPHA)
+        self.title.blit(title_surf, (0, 0))
+        self.title_glow = pygame.Surface(title_surf.get_size(), pygame.SRCALPHA)
+        for glow_layer in range(6, 0, -1):
+            title_surf.set_alpha(int(40 * (1 - glow_layer / 6)))
+            self.title_glow.blit(title_surf, (0, 0))
+        # story lines: three offset glows behind white text
+        self.lines = []
+        for line in lines:
+            glow_text = render_text(line, FONT_SIZE, color_scheme[1]).copy()
+            glow_text.set_alpha(int(255 * 0.2))
+            text = render_text(line, FONT_SIZE, WHITE)
+            surf = pygame.Surface((text.get_width() + 3, text.get_height() + 3), pygame.SRCALPHA)
+            for glow_offset in range(3, 0, -1):
+                surf.blit(glow_text, (glow_offset, glow_offset))
+            surf.blit(text, (0, 0))
+            self.lines.append((surf, WIDTH//2 - text.get_width()//2))
+        self.skip = render_text("Press SPACE or ENTER to continue", FONT_SIZE, (150, 200, 255)).copy()
+        # drifting background particles
+        self.particles = []
+        for _ in range(30):
+            self.particles.append({
+                'x': RNG.screen.uniform(0, WIDTH),
+                'y': RNG.screen.uniform(-50, HEIGHT + 50),
+                'vx': RNG.screen.uniform(-1, 1),
+                'vy': RNG.screen.uniform(0.5, 2),
+                'life': RNG.screen.uniform(0.5, 3),
+                'color': RNG.screen.choice(color_scheme)
+            })
+
+    def alpha(self, elapsed):
+        """Overall opacity `elapsed` seconds in: fade in, hold, fade out."""
+        if elapsed < self.fade_in_time:
+            return int(255 * (elapsed / self.fade_in_time))
+        if elapsed < self.fade_in_time + self.display_time:
+            return 255
+        remaining = self.total_time - elapsed
+        return max(0, int(255 * (remaining / self.fade_out_time)))
+
+    def draw(self, s, elapsed):
+        """One frame, `elapsed` seconds into the cutscene."""
+        alpha = self.alpha(elapsed)
+        self.draw_background(s)
+        self.draw_particles(s, elapsed, alpha)
+        self.draw_overlay(s, elapsed, alpha)
+        self.draw_text(s, elapsed, alpha)
+
+    def draw_background(self, s):
+        s.blit(self.background, (0, 0))
+
+    def draw_particles(self, s, elapsed, alpha):
         # Animated background pattern - dancing particles
-        for i, p in enumerate(particles):
+        for i, p in enumerate(self.particles):
             p['y'] += p['vy']
             p['x'] += p['vx'] + math.sin(elapsed * 2 + i) * 0.5
             p['life'] -= 1.0 / FPS
-            
+
             if p['life'] < 0:
                 p['y'] = -50
-                p['life'] = random.uniform(2, 3)
-                p['x'] = random.uniform(0, WIDTH)
-            
+                p['life'] = RNG.screen.uniform(2, 3)
+                p['x'] = RNG.screen.uniform(0, WIDTH)
+
             particle_alpha = int(150 * min(1, p['life']) * (alpha / 255.0))
             if particle_alpha > 0:
-                pygame.draw.circle(SCREEN, p['color'], (int(p['x']), int(p['y'])), 2)
-        
-        # Vertical scanning lines for cinematic effect
-        for y in range(0, HEIGHT, 8):
-            line_alpha = int(30 * (alpha / 255.0))
-            scan_offset = int(math.sin(elapsed * 3 + y / 50) * 5)
-            pygame.draw.line(SCREEN, (50, 100, 150), (0, y + scan_offset), (WIDTH, y + scan_offset), 1)
-        
-        # Dynamic glow background
-        glow_surf = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        # Pulsing multi-color glow
-        glow_r = int(color_scheme[0][0] * 0.4 + math.sin(elapsed * 1.5) * 30)
-        glow_g = int(color_scheme[1][1] * 0.4 + math.sin(elapsed * 1.2) * 20)
-        glow_b = int(color_scheme[2][2] * 0.4 + math.sin(elapsed * 1.8) * 30)
-        glow_surf.fill((glow_r, glow_g, glow_b, int(20 * (alpha / 255.0))))
-        SCREEN.blit(glow_surf, (0, 0))
-        
-        # Vignette effect (dark edges)
-        vignette = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        vignette.fill((0, 0, 0, int(80 * (alpha / 255.0))))
-        SCREEN.blit(vignette, (0, 0))
-        
-        # TITLE: Large, glowing, dramatic
-        title_bob = math.sin(elapsed * 1.5) * 8
-        title_y = int(140 + title_bob)
-        
-        # Multi-layer glow with expanding rings
-        for glow_layer in range(6, 0, -1):
-            glow_alpha = int(40 * (1 - glow_layer / 6) * (alpha / 255.0))
-            glow_size_offset = glow_layer * 2
-            
-            glow_title = BIG.render(title, True, color_scheme[0])
-            glow_title_alpha = pygame.Surface((glow_title.get_width() + glow_size_offset*2, glow_title.get_height() + glow_size_offset*2), pygame.SRCALPHA)
-            glow_title_alpha.fill((0, 0, 0, 0))
-            glow_title_alpha.blit(glow_title, (glow_size_offset, glow_size_offset))
-            glow_title_alpha.set_alpha(glow_alpha)
-            glow_rect = glow_title_alpha.get_rect(center=(WIDTH//2, title_y))
-            SCREEN.blit(glow_title_alpha, glow_rect)
-        
-        # Main title with bright color
-        title_surf = BIG.render(title, True, color_scheme[0])
-        title_alpha_surf = pygame.Surface(title_surf.get_size(), pygame.SRCALPHA)
-        title_alpha_surf.blit(title_surf, (0, 0))
-        title_alpha_surf.set_alpha(min(255, alpha + 30))
-        SCREEN.blit(title_alpha_surf, (WIDTH//2 - title_surf.get_width()//2, title_y))
-        
-        # Underline effect
-        underline_width = int(title_surf.get_width() * (0.3 + 0.3 * math.sin(elapsed * 2)))
-        underline_alpha = int(200 * (alpha / 255.0))
-        pygame.draw.line(SCREEN, color_scheme[1], 
+                pygame.draw.circle(s, p['color'], (int(p['x']), int(p['y'])), 2)
+
+    def draw_overlay(self, s, elapsed, alpha):
+        """Scan lines, then the pulsing glow and the vignette in one overlay blit."""
+        s.blits([(self.scan_line, (0, y + int(math.sin(elapsed * 3 + y / 50) * 5)))
+                 for y in range(0, HEIGHT, 8)], False)
+        cs = self.color_scheme
+        glow = (max(0, int(cs[0][0] * 0.4 + math.sin(elapsed * 1.5) * 30)),
+                max(0, int(cs[1][1] * 0.4 + math.sin(elapsed * 1.2) * 20)),
+                max(0, int(cs[2][2] * 0.4 + math.sin(elapsed * 1.8) * 30)))
+        # glow at a1 then black at a2 is one blend: dst*(1-A) + color*A
+        glow_a = int(20 * (alpha / 255.0)) / 255.0
+        keep = 1 - int(80 * (alpha / 255.0)) / 255.0
+        cover = 1 - (1 - glow_a) * keep
+        if cover <= 0:
+            return
+        self.overlay.fill(tuple(min(255, int(c * glow_a * keep / cover)) for c in glow))
+        self.overlay.set_alpha(int(255 * cover))
+        s.blit(self.overlay, (0, 0))
+
+    def draw_text(self, s, elapsed, alpha):
+        # title: large, glowing, bobbing
+        title_y = int(140 + math.sin(elapsed * 1.5) * 8)
+        title_x = WIDTH//2 - self.title.get_width()//2
+        self.title_glow.set_alpha(alpha)
+        s.blit(self.title_glow, (title_x, title_y - self.title.get_height()//2))
+        self.title.set_alpha(min(255, alpha + 30))
+        s.blit(self.title, (title_x, title_y))
+
+        # underline effect
+        underline_width = int(self.title.get_width() * (0.3 + 0.3 * math.sin(elapsed * 2)))
+        pygame.draw.line(s, self.color_scheme[1],
                         (WIDTH//2 - underline_width//2, title_y + 60),
                         (WIDTH//2 + underline_width//2, title_y + 60), 3)
-        
-        # TEXT LINES: Dramatic reveal with wave effect
-        for i, line in enumerate(lines):
-            # Stagger animation - each line fades in and up
-            line_delay = (i * 0.4)
+
+        # text lines: staggered fade in and slide up, then a gentle wave
+        for i, (surf, x) in enumerate(self.lines):
+            line_delay = i * 0.4
             if elapsed > line_delay:
                 line_progress = min(1.0, (elapsed - line_delay) / 0.6)
                 line_alpha = int(alpha * line_progress)
-                # Slide up effect
                 line_y_offset = int((1 - line_progress) * 30)
             else:
                 line_alpha = 0
                 line_y_offset = 30
-            
             line_y = int(310 + i * 70 + math.sin(elapsed * 1.2 + i * 0.8) * 4 + line_y_offset)
-            
-            # Multiple glow layers for text
-            for glow_offset in range(3, 0, -1):
-                glow_text = FONT.render(line, True, color_scheme[1])
-                glow_text_alpha = pygame.Surface(glow_text.get_size(), pygame.SRCALPHA)
-                glow_text_alpha.fill((0, 0, 0, 0))
-                glow_text_alpha.blit(glow_text, (0, 0))
-                glow_text_alpha.set_alpha(int(line_alpha * 0.2))
-                glow_x = WIDTH//2 - glow_text.get_width()//2 + glow_offset
-                glow_y = line_y + glow_offset
-                SCREEN.blit(glow_text_alpha, (glow_x, glow_y))
-            
-            # Main text in white
-            line_surf = FONT.render(line, True, WHITE)
-            line_alpha_surf = pygame.Surface(line_surf.get_size(), pygame.SRCALPHA)
-            line_alpha_surf.blit(line_surf, (0, 0))
-            line_alpha_surf.set_alpha(line_alpha)
-            SCREEN.blit(line_alpha_surf, (WIDTH//2 - line_surf.get_width()//2, line_y))
-        
-        # SKIP PROMPT: Breathing effect
-        skip_alpha = int(180 * (0.5 + 0.5 * math.sin(elapsed * 2.5)) * (alpha / 255.0))
-        skip_text = FONT.render("Press SPACE or ENTER to continue", True, (150, 200, 255))
-        skip_alpha_surf = pygame.Surface(skip_text.get_size(), pygame.SRCALPHA)
-        skip_alpha_surf.blit(skip_text, (0, 0))
-        skip_alpha_surf.set_alpha(skip_alpha)
-        SCREEN.blit(skip_alpha_surf, (WIDTH//2 - skip_text.get_width()//2, HEIGHT - 70))
-        
-        pygame.display.flip()
-        CLOCK.tick(FPS)
-        
-        for e in pygame.event.get():
-            if e.type==pygame.QUIT:
-                pygame.quit(); sys.exit()
-            if e.type==pygame.KEYDOWN:
-                if e.key==pygame.K_SPACE or e.key==pygame.K_RETURN:
-                    return
+            surf.set_alpha(line_alpha)
+            s.blit(surf, (x, line_y))
 
+        # skip prompt: breathing effect
+        self.skip.set_alpha(int(180 * (0.5 + 0.5 * math.sin(elapsed * 2.5)) * (alpha / 255.0)))
+        s.blit(self.skip, (WIDTH//2 - self.skip.get_width()//2, HEIGHT - 70))
 
-def choose_class():
-    """Display a simple class selection screen and return the chosen class name."""
-    opts = ["Werrier", "Ranger", "Mage"]
-    sel = 0
-    while True:
-        SCREEN.fill(BLACK)
+class CutsceneScreen(ModalScreen):
+    """A CutsceneArt played in real time; closes when it ends or on SPACE/ENTER."""
+    animated = True
+
+    def __init__(self, art):
+        self.art = art
+        self.start_time = time.time()
+        self.elapsed = 0.0
+
+    def draw(self, s):
+        self.art.draw(s, self.elapsed)
+
+    def handle(self, e):
+        if e.type==pygame.KEYDOWN and e.key in (pygame.K_SPACE, pygame.K_RETURN):
+            return True
+
+    def update(self):
+        self.elapsed = time.time() - self.start_time
+        if self.elapsed > self.art.total_time:
+            return True
+
+def cutscene(title, lines, duration=None, color_scheme=None):
+    """Display an animated cinematic cutscene with dramatic effects."""
+    # Color scheme: (primary, accent1, accent2)
+    if color_scheme is None:
+        color_scheme = ((255, 255, 100), (100, 200, 255), (200, 100, 255))  # Gold/Cyan/Purple
+    with STARTUP.step('cutscene art'):
+        art = CutsceneArt(title, lines, color_scheme, duration if duration else 4.0)
+    CutsceneScreen(art).run()
+
+# the story's cutscenes: name -> (title, lines, duration, color scheme);
+# lines may refer to {player_class}
+CUTSCENES = {
+    'opening': ("THE REALM OF 67", ("A peaceful kingdom lay in ruins...",
+                                    "The ancient princess of 67 has been kidnapped",
+                                    "by the fearsome BANDIT KING."), 4.0, None),
+    'quest': ("YOUR QUEST", ("You are a {player_class}.",
+                             "Gather the mystical 67 Water",
+                             "to defeat the bandits and save the realm."), 4.0, None),
+    'portal': ("A STRANGE PORTAL", ("You've discovered something extraordinary...",
+                                    "A shimmering gateway appears before you."), 3.0,
+               ((200, 100, 255), (100, 255, 200), (255, 200, 100))),
+    'boss': ("THE BANDIT KING", ("At last, you face the tyrant!",
+                                 "The shadows part to reveal the legendary outlaw...",
+                                 "Victory or death awaits."), 3.5, None),
+    'victory': ("VICTORY!", ("The Bandit King falls...",
+                             "The darkness lifts from the realm of 67."), 3.0, None),
+}
+
+def play_cutscene(name, **fields):
+    title, lines, duration, color_scheme = CUTSCENES[name]
+    cutscene(title, [line.format(**fields) for line in lines], duration, color_scheme)
+
+class ClassSelectScreen(ModalScreen):
+    """Pick a class with UP/DOWN and ENTER; run() returns its name."""
+    def __init__(self, opts=("Werrier", "Ranger", "Mage")):
+        self.opts = opts
+        self.sel = 0
+
+    def shown(self):
+        STARTUP.milestone('class select')
+
+    def draw(self, s):
+        s.fill(BLACK)
         draw_text_center("Choose your class:", 120, 40, WHITE)
-        for i,o in enumerate(opts):
-            color = YELLOW if i==sel else WHITE
+        for i,o in enumerate(self.opts):
+            color = YELLOW if i==self.sel else WHITE
             draw_text_center(f"{i+1}. {o}", 200 + i*50, 32, color)
         draw_text_center("Use UP/DOWN and ENTER to choose", HEIGHT-100, 20, GRAY)
-        pygame.display.flip()
-        for e in pygame.event.get():
-            if e.type==pygame.QUIT:
-                pygame.quit(); sys.exit()
-            if e.type==pygame.KEYDOWN:
-                if e.key==pygame.K_DOWN:
-                    sel = (sel + 1) % len(opts)
-                if e.key==pygame.K_UP:
-                    sel = (sel - 1) % len(opts)
-                if e.key==pygame.K_RETURN:
-                    return opts[sel]
-
-def duel(player,enemies,plats,swings):
-    particles = pygame.sprite.Group()
+
+    def handle(self, e):
+        if e.type==pygame.KEYDOWN:
+            if e.key==pygame.K_DOWN:
+                self.sel = (self.sel + 1) % len(self.opts)
+            if e.key==pygame.K_UP:
+                self.sel = (self.sel - 1) % len(self.opts)
+            if e.key==pygame.K_RETURN:
+                return self.opts[self.sel]
+
+def choose_class():
+    """Display a simple class selection screen and return the chosen class name."""
+    return ClassSelectScreen().run()
+
+class ShopScreen(ModalScreen):
+    """The village shop: number keys buy the listed items, ESC leaves.
+
+    Purchases are confirmed with toasts; the screen animates while any are up.
+    """
+    def __init__(self, world):
+        self.world = world
+
+    @property
+    def animated(self):
+        return len(TOASTS) > 0
+
+    def draw(self, s):
+        s.fill(BLACK)
+        draw_text_center("Village Shop - Buy Potions", 80, 40, WHITE)
+        for i, item in enumerate(ITEMS.values()):
+            draw_text_center(f"{i+1}) {item.name} Potion - {item.blurb}  ({item.cost} Water)", 200 + i*50, 24, item.color)
+        draw_text_center("ESC to leave", HEIGHT - 80, 20, GRAY)
+        draw_text_center(f"Your Water: {self.world.player.water}", HEIGHT - 40, 20, WHITE)
+        TOASTS.draw(s)
+
+    def handle(self, e):
+        if e.type!=pygame.KEYDOWN:
+            return None
+        if e.key==pygame.K_ESCAPE:
+            return True
+        for i, item in enumerate(ITEMS.values()):
+            if e.key not in (pygame.K_1 + i, pygame.K_KP1 + i):
+                continue
+            if self.world.perform('buy', item.key):
+                TOASTS.show(f"Bought {item.name} Potion!", item.color)
+            else:
+                TOASTS.show("Not enough Water.", RED)
+        return None
+
+def resolve_combat(player, enemies, swings, particles, grid=None):
+    """Apply swing and bolt hits between the player and the duel enemies.
+
+    With a SpatialHash of the enemies, each swing only tests enemies in its cells.
+    """
+    # damage calc (respect swing active window and avoid multiple hits per swing)
+    for sw in swings:
+        # projectiles won't have damage_active, melee swings will
+        if hasattr(sw, 'damage_active') and not sw.damage_active():
+            continue
+        for en in (grid.query(sw.rect) if grid is not None else enemies):
+            if sw.owner != en and sw.rect.colliderect(en.rect) and en not in getattr(sw, 'did_hit', set()):
+                # damage amount scales a bit with owner class
+                # Base damage reduced slightly; projectile bonus nerfed
+                dmg = 16
+                if getattr(sw.owner, 'class_name', '').lower().startswith('war'):
+                    dmg += 6
+                if getattr(sw, 'is_projectile', False):
+                    dmg += 4
+                en.take_damage(dmg, particles)
+                if hasattr(sw, 'did_hit'):
+                    sw.did_hit.add(en)
+                # projectiles expire on hit
+                if getattr(sw, 'is_projectile', False):
+                    sw.kill()
+                # knockback
+                knockback_dir = 1 if en.rect.centerx > sw.owner.rect.centerx else -1
+                en.knockback_x = knockback_dir * 8
+        if sw.owner != player and sw.rect.colliderect(player.rect) and player not in getattr(sw, 'did_hit', set()):
+            # if player is hit by enemy swing and not currently invulnerable
+            if getattr(player, 'invuln', 0) == 0:
+                player.health -= 12
+                game_state.screen_shake = 3
+                game_state.screen_shake_intensity = 1
+            if hasattr(sw, 'did_hit'):
+                sw.did_hit.add(player)
+
+def step_duel(player, enemies, plats, swings, particles, keys, grid=None):
+    """Advance a duel by one tick. Returns True on a win, False on a loss, None otherwise.
+
+    grid, if given, is a SpatialHash of enemies kept up to date here.
+    """
+    profiling = PROFILER.enabled
+    snapshot_positions([player, *enemies])
+    player.update(keys,plats,swings,particles)
+    if profiling: PROFILER.mark('player')
+    for en in enemies:
+        en.ai(player,plats,swings,particles)
+        # In duel mode, keep enemies inside the visible arena so they can't run off-screen
+        en.rect.x = max(0, min(en.rect.x, WIDTH - en.rect.width))
+        if grid is not None:
+            grid.move(en, en.rect)
+    # also clamp player to arena bounds
+    player.rect.x = max(0, min(player.rect.x, WIDTH - player.rect.width))
+    if profiling: PROFILER.mark('ai')
+    swings.update()
+    particles.update()
+    if profiling: PROFILER.mark('effects')
+    resolve_combat(player, enemies, swings, particles, grid)
+    # cleanup
+    for en in [en for en in enemies if en.health<=0]:
+        enemies.remove(en)
+        if grid is not None:
+            grid.remove(en)
+    if profiling: PROFILER.mark('combat')
+    if player.health<=0: return False
+    if not enemies: return True
+    return None
+
+def swing_screen_rect(sw, alpha):
+    """Swing rect shifted along with its owner's interpolated position."""
+    owner_rect = lerp_rect(sw.owner, alpha)
+    return sw.rect.move(owner_rect.x - sw.owner.rect.x, owner_rect.y - sw.owner.rect.y)
+
+def draw_duel(arena, alpha):
+    """Draw a Duel arena `alpha` of a tick past the last simulated one."""
+    # no camera offset in duel mode - it's a separate arena
+    shake_x, shake_y = apply_screen_shake()
+    SCREEN.fill(SKY)
+    PROFILER.mark('draw bg')
+    for p in arena.plats:
+        SCREEN.blit(p.image, (p.rect.x + shake_x, p.rect.y + shake_y))
+    PROFILER.mark('draw terrain')
+    arena.particles.draw(SCREEN)
+    PROFILER.mark('draw particles')
+    for sw in arena.swings:
+        SCREEN.blit(sw.image, swing_screen_rect(sw, alpha))
+    PROFILER.mark('draw swings')
+    arena.player.draw_at_pos(SCREEN, lerp_rect(arena.player, alpha))
+    PROFILER.mark('draw player')
+    for en in arena.enemies: en.draw_at_pos(SCREEN, lerp_rect(en, alpha))
+    PROFILER.mark('draw enemies')
+
+def duel(world, arena):
+    """Play a Duel arena interactively on the world's clock. Returns True on a win."""
+    enemies, swings, particles = arena.enemies, arena.swings, arena.particles
+    timestep = FixedTimestep()
     while True:
-        CLOCK.tick(FPS)
+        ticks = timestep.advance(CLOCK.tick(FPS) / 1000.0)
+        PROFILER.begin_frame()
         keys=pygame.key.get_pressed()
         for e in pygame.event.get():
             if e.type==pygame.QUIT: pygame.quit();sys.exit()
             if e.type==pygame.KEYDOWN:
+                handle_debug_key(e.key)
                 if e.key==pygame.K_p:
-                    if player.use_potion():
-                        draw_text_center("You used a Potion!", HEIGHT//2, 24, GREEN)
-                        pygame.display.flip(); pygame.time.delay(600)
+                    if world.perform('use_potion', 'Health'):
+                        TOASTS.show("You used a Potion!", GREEN)
                     else:
-                        draw_text_center("No potions.", HEIGHT//2, 24, RED)
-                        pygame.display.flip(); pygame.time.delay(600)
-        player.update(keys,plats,swings,particles)
-        for en in enemies:
-            en.ai(player,plats,swings,particles)
-            # In duel mode, keep enemies inside the visible arena so they can't run off-screen
-            en.rect.x = max(0, min(en.rect.x, WIDTH - en.rect.width))
-        # also clamp player to arena bounds
-        player.rect.x = max(0, min(player.rect.x, WIDTH - player.rect.width))
-        swings.update()
-        particles.update()
-        # damage calc (respect swing active window and avoid multiple hits per swing)
-        for sw in swings:
-            # projectiles won't have damage_active, melee swings will
-            if hasattr(sw, 'damage_active') and not sw.damage_active():
-                continue
-            for en in enemies:
-                if sw.owner != en and sw.rect.colliderect(en.rect) and en not in getattr(sw, 'did_hit', set()):
-                    # damage amount scales a bit with owner class
-                    # Base damage reduced slightly; projectile bonus nerfed
-                    dmg = 16
-                    if getattr(sw.owner, 'class_name', '').lower().startswith('war'):
-                        dmg += 6
-                    if getattr(sw, 'is_projectile', False):
-                        dmg += 4
-                    en.take_damage(dmg, particles)
-                    if hasattr(sw, 'did_hit'):
-                        sw.did_hit.add(en)
-                    # projectiles expire on hit
-                    if getattr(sw, 'is_projectile', False):
-                        sw.kill()
-                    # knockback
-                    knockback_dir = 1 if en.rect.centerx > sw.owner.rect.centerx else -1
-                    en.knockback_x = knockback_dir * 8
-            if sw.owner != player and sw.rect.colliderect(player.rect) and player not in getattr(sw, 'did_hit', set()):
-                # if player is hit by enemy swing and not currently invulnerable
-                if getattr(player, 'invuln', 0) == 0:
-                    player.health -= 12
-                    game_state.screen_shake = 3
-                    game_state.screen_shake_intensity = 1
-                if hasattr(sw, 'did_hit'):
-                    sw.did_hit.add(player)
-        # cleanup
-        for en in enemies.copy():
-            if en.health<=0: enemies.remove(en)
-        if player.health<=0: return False
-        if not enemies: return True
-        # draw (no camera offset in duel mode - it's a separate arena)
-        shake_x, shake_y = apply_screen_shake()
-        SCREEN.fill(SKY)
-        for p in plats: 
-            SCREEN.blit(p.image, (p.rect.x + shake_x, p.rect.y + shake_y))
-        for part in particles:
-            part.draw(SCREEN)
-        swings.draw(SCREEN)
-        player.draw(SCREEN)
-        for en in enemies: en.draw(SCREEN)
+                        TOASTS.show("No potions.", RED)
+        PROFILER.mark('input')
+        for _ in range(ticks):
+            result = world.duel_step(arena, keys)
+            if result is not None: return result
+        draw_duel(arena, timestep.alpha())
+        TOASTS.draw(SCREEN)
+        PROFILER.mark('toasts')
+        if game_state.debug_mode:
+            PROFILER.draw(SCREEN)
+            PROFILER.mark('profiler')
         pygame.display.flip()
+        PROFILER.mark('flip')
+        PROFILER.end_frame(len(enemies), len(swings), len(particles))
+
+# ---------- headless simulation ----------
+class ScriptedKeys:
+    """Stand-in for pygame.key.get_pressed(): indexable by key constant."""
+    def __init__(self, held=()):
+        self.held = frozenset(held)
+
+    def __getitem__(self, key):
+        return key in self.held
+
+NO_KEYS = ScriptedKeys()
+
+class World:
+    """Exploration state that can be stepped without a window or event pump.
+
+    The interactive loop in main() and headless runs (CI, benchmarks) both
+    advance the game through step() / Duel.step(), so they share one set of rules.
+    """
+    def __init__(self, player_class='Werrior', num_bandits=10, level_width=None, seed=None):
+        RNG.seed(seed)
+        self.seed = RNG.master
+        self.log = None  # InputLog recording every tick and action, if any
+        self.level_width = level_width or LEVEL_WIDTH
+        game_state.level_width = self.level_width
+        game_state.camera_x = game_state.camera_prev_x = 0.0
+        # ground and enemies are streamed in per chunk around the camera
+        self.plats = PlatformGrid()
+        self.player = Player(120, HEIGHT-200, player_class)
+        # Map exploration: place enemies on the map and allow the player to roam
+        self.map_enemies = pygame.sprite.Group()
+        self.map_swings = pygame.sprite.Group()
+        self.particles = ParticleSystem()
+        # broadphase index of map enemies, re-synced as they move
+        self.enemy_grid = SpatialHash()
+        self.chunks = ChunkManager(self, self.level_width)
+        # place bandits spread out across the whole level for traversal
+        spawn_min_x = WIDTH + 200
+        spawn_max_x = self.level_width - 300
+        for i in range(num_bandits):
+            # evenly space with some random jitter
+            t = i / max(1, num_bandits - 1)
+            bx = int(spawn_min_x + t * (spawn_max_x - spawn_min_x) + RNG.spawn.randint(-120, 120))
+            bx = max(spawn_min_x, min(bx, spawn_max_x))
+            self.chunks.add_spawn(Enemy, bx, HEIGHT - 88, f"Bandit {i+1}")
+
+        # place the boss near the far right of the level
+        self.chunks.add_spawn(Boss, self.level_width - 300, HEIGHT - 140, "Bandit King")
+        self.boss_defeated = False
+
+        # Secret portal for alternate ending (appears when player has enough water)
+        # Portal location: near the end of level but before boss
+        self.portal_rect = pygame.Rect(self.level_width - 500, HEIGHT - 200, 60, 120)
+        # shop area (village at left)
+        self.shop_rect = pygame.Rect(40, HEIGHT - 200, 140, 160)
+        self.chunks.add_prop('shop', self.shop_rect)
+        self.chunks.add_prop('portal', self.portal_rect)
+        self.chunks.update(game_state.camera_x, self.player.rect)
+        self.frame = 0
+        self.outcome = None
+        self.ai_tiers = {AI_FULL: 0, AI_REDUCED: 0, AI_SLEEPING: 0}
+
+    def step(self, keys):
+        """Advance exploration by one tick. Returns the engaged enemy, if any."""
+        if self.log is not None:
+            self.log.record(keys)
+        player = self.player
+        profiling = PROFILER.enabled
+        self.snapshot()
+        # stream chunks first so the ground under the player always exists
+        self.chunks.update(game_state.camera_x, player.rect)
+        if profiling: PROFILER.mark('streaming')
+        # update world
+        player.update(keys, self.plats, self.map_swings, self.particles)
+        if profiling: PROFILER.mark('player')
+        self.update_enemies()
+        if profiling: PROFILER.mark('ai')
+        self.map_swings.update()
+        self.particles.update()
+        if profiling: PROFILER.mark('effects')
+
+        # update camera position to follow player
+        target_camera_x = player.rect.centerx - WIDTH // 2
+        game_state.camera_x += (target_camera_x - game_state.camera_x) * 0.12
+        game_state.camera_x = max(0, min(game_state.camera_x, self.level_width - WIDTH))
+        self.frame += 1
+
+        # approach detection: start duel when close enough
+        reach = pygame.Rect(player.rect.centerx - 100, player.rect.centery - 60, 200, 120)
+        engaged = None
+        for me in self.enemy_grid.query(reach):
+            if abs(player.rect.centerx - me.rect.centerx) < 100 and abs(player.rect.centery - me.rect.centery) < 60:
+                engaged = me
+                break
+        if profiling: PROFILER.mark('combat')
+        return engaged
+
+    def update_enemies(self):
+        """Run enemy AI by level of detail: every tick near the view, every few ticks
+        (integrating the skipped ones) further out, not at all when far away."""
+        player = self.player
+        counts = {AI_FULL: 0, AI_REDUCED: 0, AI_SLEEPING: 0}
+        tick = self.frame + 1
+        for me in self.map_enemies:
+            tier = ai_tier(me, player, game_state.camera_x)
+            counts[tier] += 1
+            if tier == AI_SLEEPING:
+                # frozen: nothing to catch up on when it wakes
+                me.ai_last_tick = tick
+                continue
+            if tier == AI_FULL:
+                me.ai(player, self.plats, self.map_swings, self.particles)
+            elif (tick + me.ai_phase) % AI_REDUCED_INTERVAL == 0:
+                me.catch_up(player, self.plats, tick - (me.ai_last_tick or tick - 1))
+            else:
+                continue
+            me.ai_last_tick = tick
+            self.enemy_grid.move(me, me.rect)
+        self.ai_tiers = counts
 
-# ---------- main quest ----------
-# Create a wide platform for the extended map
-LEVEL_WIDTH = WIDTH * 4  # Make the level 4 screens wide
-plats=[Platform(0, HEIGHT-40, LEVEL_WIDTH, 40)]  # Extend the ground platform
-
-# player selects class before starting
-player_class = choose_class()
-
-# Opening cutscene
-cutscene("THE REALM OF 67", [
-    "A peaceful kingdom lay in ruins...",
-    "The ancient princess of 67 has been kidnapped",
-    "by the fearsome BANDIT KING."
-], duration=4.0)
-
-cutscene("YOUR QUEST", [
-    f"You are a {player_class}.",
-    "Gather the mystical 67 Water",
-    "to defeat the bandits and save the realm."
-], duration=4.0)
-
-player = Player(120, HEIGHT-200, player_class)
-
-story([f"You stand at the entrance to the realm.", "Prepare yourself for battle!", "Press ENTER to begin..."])
-
-# Map exploration: place enemies on the map and allow the player to roam
-map_enemies = pygame.sprite.Group()
-map_swings = pygame.sprite.Group()
-particles = pygame.sprite.Group()
-# place bandits spread out across the whole level for traversal
-num_bandits = 10
-spawn_min_x = WIDTH + 200
-spawn_max_x = LEVEL_WIDTH - 300
-for i in range(num_bandits):
-    # evenly space with some random jitter
-    t = i / max(1, num_bandits - 1)
-    bx = int(spawn_min_x + t * (spawn_max_x - spawn_min_x) + random.randint(-120, 120))
-    bx = max(spawn_min_x, min(bx, spawn_max_x))
-    e = Enemy(bx, HEIGHT - 88)
-    e.tag = f"Bandit {i+1}"
-    map_enemies.add(e)
-
-# place the boss near the far right of the level
-boss = Boss(LEVEL_WIDTH - 300, HEIGHT - 140)
-boss.tag = "Bandit King"
-map_enemies.add(boss)
-
-# Secret portal for alternate ending (appears when player has enough water)
-# Portal location: near the end of level but before boss
-portal_rect = pygame.Rect(LEVEL_WIDTH - 500, HEIGHT - 200, 60, 120)
-portal_water_requirement = 50  # Need 50 water to use portal
-
-# shop area (village at left)
-shop_rect = pygame.Rect(40, HEIGHT - 200, 140, 160)
-POTION_COST = 20
-
-# helper to draw HUD
-def draw_hud():
-    # water and potions
-    health_potions = sum(1 for it in player.inventory if it.lower()=='health')
-    strength_potions = sum(1 for it in player.inventory if it.lower()=='strength')
-    knockback_potions = sum(1 for it in player.inventory if it.lower()=='knockback')
-    txt = FONT.render(f"Water: {player.water}    H:{health_potions} S:{strength_potions} K:{knockback_potions}", True, WHITE)
-    SCREEN.blit(txt, (10,10))
-    # class and health
-    cl = FONT.render(f"Class: {player.class_name}    HP: {player.health}/{player.max_health}", True, WHITE)
-    SCREEN.blit(cl, (10, 36))
-    
-    # control hints
-    controls_hint = FONT.render("Controls: SPACE=Jump  E=Shop  P=Potion  ARROWS=Move", True, (180,180,180))
-    SCREEN.blit(controls_hint, (10, HEIGHT - 26))
-    
-    # proximity hint for shop
-    if abs(player.rect.centerx - shop_rect.centerx) < 200:
-        shop_hint = FONT.render("Press E to enter shop", True, YELLOW)
-        SCREEN.blit(shop_hint, (shop_rect.centerx - 100, shop_rect.top - 50))
-    
-    # proximity hint for portal
-    if abs(player.rect.centerx - portal_rect.centerx) < 250:
-        if player.water >= portal_water_requirement:
-            portal_hint = FONT.render(f"Press E for Secret Ending (Need {portal_water_requirement} Water)", True, (200, 100, 255))
-            SCREEN.blit(portal_hint, (portal_rect.centerx - 150, portal_rect.top - 50))
-
-# main exploration loop
-global camera_x
-while True:
-    CLOCK.tick(FPS)
-    keys = pygame.key.get_pressed()
-    for e in pygame.event.get():
-        if e.type == pygame.QUIT:
-            pygame.quit(); sys.exit()
-        if e.type == pygame.KEYDOWN:
-            if e.key == pygame.K_d:
-                # Toggle debug mode
-                game_state.debug_mode = not game_state.debug_mode
-            if e.key == pygame.K_p:
-                # use potion - prioritize health if HP is low, otherwise try health first
-                if player.health < player.max_health * 0.5:
-                    # HP is low, use health potion
-                    if player.use_potion("Health"):
-                        draw_text_center("Used Health Potion! +60 HP", HEIGHT//2, 28, GREEN)
-                        pygame.display.flip(); pygame.time.delay(700)
-                    else:
-                        draw_text_center("No Health potions.", HEIGHT//2, 28, RED)
-                        pygame.display.flip(); pygame.time.delay(600)
-                else:
-                    # try any potion
-                    if player.use_potion("Health") or player.use_potion("Strength") or player.use_potion("Knockback"):
-                        draw_text_center("Used a Potion!", HEIGHT//2, 28, GREEN)
-                        pygame.display.flip(); pygame.time.delay(700)
-                    else:
-                        draw_text_center("No potions.", HEIGHT//2, 28, RED)
-                        pygame.display.flip(); pygame.time.delay(600)
-            if e.key == pygame.K_e and player.rect.colliderect(shop_rect):
-                # open shop menu
-                buying = True
-                STRENGTH_COST = 60
-                KNOCKBACK_COST = 50
-                while buying:
-                    SCREEN.fill(BLACK)
-                    draw_text_center("Village Shop - Buy Potions", 80, 40, WHITE)
-                    draw_text_center("1) Health Potion       - Restore 60 HP  (" + str(POTION_COST) + " Water)", 200, 24, GREEN)
-                    draw_text_center("2) Strength Potion    - +25 Damage 1s  (" + str(STRENGTH_COST) + " Water)", 250, 24, YELLOW)
-                    draw_text_center("3) Knockback Potion   - 1.8x Knockback (" + str(KNOCKBACK_COST) + " Water)", 300, 24, CYAN)
-                    draw_text_center("ESC to leave", HEIGHT - 80, 20, GRAY)
-                    draw_text_center(f"Your Water: {player.water}", HEIGHT - 40, 20, WHITE)
-                    pygame.display.flip()
-                    for ev in pygame.event.get():
-                        if ev.type==pygame.QUIT: pygame.quit(); sys.exit()
-                        if ev.type==pygame.KEYDOWN:
-                            if ev.key==pygame.K_ESCAPE:
-                                buying=False
-                                break
-                            if ev.key==pygame.K_1 or ev.key==pygame.K_KP1:
-                                if player.water >= POTION_COST:
-                                    player.water -= POTION_COST
-                                    player.add_item('Health')
-                                    draw_text_center("Bought Health Potion!", HEIGHT//2, 24, GREEN)
-                                    pygame.display.flip(); pygame.time.delay(700)
-                                else:
-                                    draw_text_center("Not enough Water.", HEIGHT//2, 24, RED)
-                                    pygame.display.flip(); pygame.time.delay(700)
-                            if ev.key==pygame.K_2 or ev.key==pygame.K_KP2:
-                                if player.water >= STRENGTH_COST:
-                                    player.water -= STRENGTH_COST
-                                    player.add_item('Strength')
-                                    draw_text_center("Bought Strength Potion!", HEIGHT//2, 24, YELLOW)
-                                    pygame.display.flip(); pygame.time.delay(700)
-                                else:
-                                    draw_text_center("Not enough Water.", HEIGHT//2, 24, RED)
-                                    pygame.display.flip(); pygame.time.delay(700)
-                            if ev.key==pygame.K_3 or ev.key==pygame.K_KP3:
-                                if player.water >= KNOCKBACK_COST:
-                                    player.water -= KNOCKBACK_COST
-                                    player.add_item('Knockback')
-                                    draw_text_center("Bought Knockback Potion!", HEIGHT//2, 24, CYAN)
-                                    pygame.display.flip(); pygame.time.delay(700)
-                                else:
-                                    draw_text_center("Not enough Water.", HEIGHT//2, 24, RED)
-                                    pygame.display.flip(); pygame.time.delay(700)
-    # update world
-    player.update(keys, plats, map_swings, particles)
-    for me in map_enemies:
-        me.ai(player, plats, map_swings, particles)
-    map_swings.update()
-    particles.update()
+    def snapshot(self):
+        """Record pre-tick positions of the player, enemies and camera for interpolation."""
+        snapshot_positions([self.player, *self.map_enemies])
+        game_state.camera_prev_x = game_state.camera_x
 
-    # Check for portal collision - alternate ending
-    if player.rect.colliderect(portal_rect) and player.water >= portal_water_requirement:
-        cutscene("A STRANGE PORTAL", [
-            "You've discovered something extraordinary...",
-            "A shimmering gateway appears before you."
-        ], duration=3.0, color_scheme=((200, 100, 255), (100, 255, 200), (255, 200, 100)))
-        
-        story([
-            "You step through the mystical portal...",
-            "",
-            "The realm of 67 begins to shift and change.",
-            "Your accumulated 67 Water creates a bridge between worlds.",
-            "",
-            f"You escape with {player.water} Water to an alternate dimension.",
-            "The portal closes behind you forever.",
-            "",
-            "ALTERNATE ENDING – You became a traveler between worlds!"
-        ])
-        pygame.quit(); sys.exit()
-
-    # approach detection: start duel when close enough
-    engaged = None
-    for me in map_enemies:
-        if abs(player.rect.centerx - me.rect.centerx) < 100 and abs(player.rect.centery - me.rect.centery) < 60:
-            engaged = me
-            break
-    if engaged is not None:
-        # Check if it's the boss
-        is_boss_fight = isinstance(engaged, Boss)
-        
-        if is_boss_fight:
-            # Boss encounter cutscene
-            cutscene("THE BANDIT KING", [
-                "At last, you face the tyrant!",
-                "The shadows part to reveal the legendary outlaw...",
-                "Victory or death awaits."
-            ], duration=3.5)
-        
-        # transition to duel with only that enemy
-        story([f"You approach {getattr(engaged,'tag', 'an enemy')}!"])
+    def camera_x(self, alpha):
+        return game_state.camera_prev_x + (game_state.camera_x - game_state.camera_prev_x) * alpha
+
+    def loaded_props(self):
+        return self.chunks.loaded_props()
+
+    def hud_values(self):
+        return HUD.values(self)
+
+    def portal_open(self):
+        return self.player.rect.colliderect(self.portal_rect) and self.player.water >= PORTAL_WATER_REQUIREMENT
+
+    def boss_alive(self):
+        # the boss is usually streamed out, so track its defeat instead of searching for it
+        return not self.boss_defeated
+
+    def start_duel(self, enemy):
+        """Reset positions for the duel arena and return a Duel against enemy."""
         # Reset positions for duel: center player on screen, place enemy to the right
-        player.rect.x = WIDTH // 4
-        player.rect.y = HEIGHT - 200
-        engaged.rect.x = WIDTH - 300
-        engaged.rect.y = HEIGHT - 88
-        temp_group = pygame.sprite.Group()
-        temp_group.add(engaged)
-        swings = pygame.sprite.Group()
-        win = duel(player, temp_group, plats, swings)
-        if not win:
-            story(["You were defeated...", "The realm of 67 falls into ruin.", "BAD ENDING"])
-            pygame.quit(); sys.exit()
+        self.player.rect.x = WIDTH // 4
+        self.player.rect.y = HEIGHT - 200
+        enemy.rect.x = WIDTH - 300
+        enemy.rect.y = HEIGHT - 88
+        return Duel(self.player, enemy)
+
+    def duel_step(self, arena, keys):
+        """Advance a duel by one tick on the world's clock (see Duel.step for the result)."""
+        if self.log is not None:
+            self.log.record(keys)
+        result = arena.step(keys)
+        self.frame += 1
+        return result
+
+    def perform(self, action, arg=None):
+        """Run a between-ticks player action: 'use_potion' (item name),
+        'use_any_potion' or 'buy' (item key). Returns whether it succeeded."""
+        if self.log is not None:
+            self.log.act(action, arg)
+        if action == 'use_potion':
+            return self.player.use_potion(arg)
+        if action == 'use_any_potion':
+            return self.player.use_any_potion()
+        if action == 'buy':
+            return self.buy(arg)
+        raise ValueError(f"unknown action {action!r}")
+
+    def buy(self, key):
+        """Trade water for one of item `key`. Returns False if the player can't afford it."""
+        item = ITEMS[key]
+        if self.player.water < item.cost:
+            return False
+        self.player.water -= item.cost
+        self.player.add_item(item.name)
+        return True
+
+    def reward(self, enemy):
+        """Grant water and loot for a defeated enemy. Returns the water gained."""
+        player = self.player
+        gained = 10 + RNG.loot.randint(0, 12)
+        player.water += gained
+        # potion drop chance - random type
+        if RNG.loot.random() < 0.35:
+            player.add_item(RNG.loot.choice([item.name for item in ITEMS.values()]))
+        player.health = min(player.max_health, player.health + 30)
+        # remove from map enemies
+        if enemy in self.map_enemies:
+            self.map_enemies.remove(enemy)
+        self.enemy_grid.remove(enemy)
+        if isinstance(enemy, Boss):
+            self.boss_defeated = True
+        return gained
+
+    def run(self, frames, script=None):
+        """Step up to `frames` frames headlessly, including any duels.
+
+        script(frame) returns the keys held on that frame; with no script the
+        player stands still. Stops early once self.outcome is decided.
+        Returns the number of frames simulated.
+        """
+        duel_state = None
+        for n in range(frames):
+            keys = ScriptedKeys(script(self.frame)) if script else NO_KEYS
+            if duel_state is not None:
+                result = self.duel_step(duel_state, keys)
+                if result is False:
+                    self.outcome = 'defeat'
+                    return n + 1
+                if result:
+                    self.reward(duel_state.enemy)
+                    duel_state = None
+                    if not self.boss_alive():
+                        self.outcome = 'victory'
+                        return n + 1
+                continue
+            engaged = self.step(keys)
+            if self.portal_open():
+                self.outcome = 'portal'
+                return n + 1
+            if engaged is not None:
+                duel_state = self.start_duel(engaged)
+        return frames
+
+class Duel:
+    """A duel arena: the player against one engaged enemy on a screen-wide floor."""
+    def __init__(self, player, enemy):
+        self.player = player
+        self.enemy = enemy
+        self.enemies = pygame.sprite.Group(enemy)
+        self.plats = [Platform(0, HEIGHT-40, WIDTH, 40)]
+        self.swings = pygame.sprite.Group()
+        self.particles = ParticleSystem()
+        self.grid = SpatialHash()
+        self.grid.insert(enemy, enemy.rect)
+
+    def step(self, keys):
+        return step_duel(self.player, self.enemies, self.plats, self.swings, self.particles, keys, self.grid)
+
+class Versus:
+    """Two players duelling in the arena, each stepped with its own key state.
+
+    The simulation reads nothing but its own objects and the keys passed in,
+    so two peers fed the same inputs stay in lockstep; save()/load() let a
+    rollback session rewind it. Particles are carried along but are cosmetic.
+    """
+    def __init__(self, class1='Werrior', class2='Werrior'):
+        game_state.level_width = WIDTH
+        self.players = (Player(WIDTH // 4, HEIGHT - 200, class1),
+                        Player(WIDTH - WIDTH // 4, HEIGHT - 200, class2))
+        self.players[1].facing = -1
+        self.plats = [Platform(0, HEIGHT-40, WIDTH, 40)]
+        self.swings = pygame.sprite.Group()
+        self.particles = ParticleSystem()
+        self.frame = 0
+
+    def step(self, keys1, keys2):
+        """Advance one tick. Returns result()."""
+        snapshot_positions(self.players)
+        for player, keys in zip(self.players, (keys1, keys2)):
+            player.update(keys, self.plats, self.swings, self.particles)
+            player.rect.x = max(0, min(player.rect.x, WIDTH - player.rect.width))
+        self.swings.update()
+        self.particles.update()
+        # each player takes the hits from swings and bolts that aren't theirs
+        for player in self.players:
+            resolve_combat(player, (), self.swings, self.particles)
+        self.frame += 1
+        return self.result()
+
+    def result(self):
+        """Index of the winner, -1 for a double knockout, or None while both stand."""
+        standing = [p.health > 0 for p in self.players]
+        if all(standing):
+            return None
+        return standing.index(True) if any(standing) else -1
+
+    def save(self):
+        refs = {p: i for i, p in enumerate(self.players)}
+        return (self.frame, tuple(player_values(p) for p in self.players),
+                tuple(swing_values(sw, refs) for sw in self.swings), self.particles.save())
+
+    def load(self, state):
+        self.frame, players, swings, particles = state
+        for player, values in zip(self.players, players):
+            set_player_values(player, values)
+        self.swings.empty()
+        for values in swings:
+            self.swings.add(make_swing(values, self.players))
+        self.particles.load(particles)
+
+    def checksum(self):
+        """Hash of the gameplay state (not particles), for comparing peers."""
+        _, players, swings, _ = self.save()
+        return hash((self.frame, players, tuple(sorted(swings))))
+
+# ---------- snapshots ----------
+# Binary little-endian snapshots of exploration state: everything World.step
+# reads, so a restored world continues exactly as the captured one would have.
+# Duels run to completion inside duel() and are not captured; particles are
+# cosmetic and left as they are.
+SNAPSHOT_MAGIC = b'67SV'
+SNAPSHOT_VERSION = 4
+SNAPSHOT_STREAMS = ('ai', 'loot')  # the RNG streams World.step draws from
+QUICKSAVE_PATH = 'quicksave.sav'
+REWIND_SECONDS = 5
+REWIND_INTERVAL = 2  # ticks between rewind snapshots
+
+PLAYER_INT_FIELDS = ('health', 'max_health', 'water', 'speed', 'jump', 'facing', 'att_cd',
+                     'dash_cd', 'dash_timer', 'invuln', 'walk_phase', 'jumps', 'max_jumps',
+                     'jump_held_last', 'cast_timer', 'on_ground_last', 'land_time',
+                     'strength_timer', 'knockback_timer', 'attack_bonus', 'base_attack_bonus',
+                     'dash_strength', 'dash_invuln')
+PLAYER_FLOAT_FIELDS = ('vel_y', 'vel_x', 'dash_vel', 'knockback_boost')
+ENEMY_KINDS = (Enemy, Boss)
+
+_SNAP_HEADER = struct.Struct('<4sBIi?dii')  # magic, version, frame, level width, boss defeated, camera, shake
+_SNAP_PLAYER = struct.Struct('<ii' + 'i' * len(PLAYER_INT_FIELDS) + 'd' * len(PLAYER_FLOAT_FIELDS))
+_SNAP_ENEMY = struct.Struct('<Biiiiiiiiiidd')  # kind, x, y, health, max health, dir, facing, cool, flash, ai phase, ai last tick, vel_y, knockback_x
+_SNAP_SPAWN = struct.Struct('<Biiiiiiiiidd')  # kind, x, y, health, max health, dir, facing, cool, flash, ai phase, vel_y, knockback_x
+_SNAP_SWING = struct.Struct('<BHiiiiB')  # type, owner, x, y, timer/life, facing/speed, hits
+_SNAP_RNG = struct.Struct('<i624I?d')  # Mersenne Twister position, state words, cached gauss
+_U8 = struct.Struct('<B')
+_U16 = struct.Struct('<H')
+_I32 = struct.Struct('<i')
+_NONE = -1  # stands in for None in integer fields
+
+def player_values(player):
+    """Position, counters, timers and class stats of a player as a flat tuple."""
+    return (player.rect.x, player.rect.y,
+            *[int(getattr(player, f)) for f in PLAYER_INT_FIELDS],
+            *[getattr(player, f) for f in PLAYER_FLOAT_FIELDS])
+
+def set_player_values(player, values):
+    player.rect.topleft = values[:2]
+    n_int = len(PLAYER_INT_FIELDS)
+    for f, v in zip(PLAYER_INT_FIELDS, values[2:2 + n_int]):
+        setattr(player, f, v)
+    player.jump_held_last = bool(player.jump_held_last)
+    player.on_ground_last = bool(player.on_ground_last)
+    for f, v in zip(PLAYER_FLOAT_FIELDS, values[2 + n_int:]):
+        setattr(player, f, v)
+
+def swing_values(sw, refs):
+    """A swing or bolt as (type, owner, x, y, timer/life, facing/speed, hits), with
+    the owner and hit targets as indices from `refs` (object -> index)."""
+    hits = tuple(sorted(refs[h] for h in sw.did_hit if h in refs))
+    if isinstance(sw, MagicBolt):
+        return (1, refs[sw.owner], sw.rect.x, sw.rect.y, sw.life, sw.speed, hits)
+    return (0, refs[sw.owner], sw.rect.x, sw.rect.y, sw.timer, sw.facing, hits)
+
+def make_swing(values, objs):
+    """Rebuild a swing_values() tuple; `objs` maps the indices back to objects."""
+    kind, owner, x, y, timer, facing, hits = values
+    if kind == 1:
+        sw = MagicBolt(objs[owner])
+        sw.life, sw.speed = timer, facing
+    else:
+        sw = SwordSwing(objs[owner])
+        sw.timer, sw.facing = timer, facing
+        sw.image = swing_frame(facing, timer)
+        sw.rect = sw.image.get_rect()
+    sw.rect.topleft = (x, y)
+    sw.did_hit = {objs[h] for h in hits}
+    return sw
+
+def _pack_str(parts, text):
+    raw = (text or '').encode('utf-8')
+    parts.append(_U8.pack(len(raw)))
+    parts.append(raw)
+
+def _unpack_str(data, off):
+    n = data[off]
+    return bytes(data[off + 1:off + 1 + n]).decode('utf-8'), off + 1 + n
+
+def capture(world):
+    """Serialize the world's exploration state to bytes."""
+    player = world.player
+    chunks = world.chunks
+    parts = [_SNAP_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, world.frame, world.level_width,
+                               world.boss_defeated, game_state.camera_x,
+                               game_state.screen_shake, game_state.screen_shake_intensity)]
+    # player: class, position, counters and timers, then inventory stacks
+    _pack_str(parts, player.class_name)
+    parts.append(_SNAP_PLAYER.pack(*player_values(player)))
+    parts.append(_U16.pack(len(player.inventory.stacks)))
+    for key, n in player.inventory.stacks.items():
+        _pack_str(parts, key)
+        parts.append(_I32.pack(n))
+    # live enemies, in group order (which is also AI and RNG order)
+    enemies = list(world.map_enemies)
+    parts.append(_U16.pack(len(enemies)))
+    for me in enemies:
+        _pack_str(parts, getattr(me, 'tag', None))
+        parts.append(_SNAP_ENEMY.pack(ENEMY_KINDS.index(type(me)), me.rect.x, me.rect.y, me.health,
+                                      me.max_health, me.dir, me.facing, me.cool, me.hit_flash_timer,
+                                      me.ai_phase, _NONE if me.ai_last_tick is None else me.ai_last_tick,
+                                      me.vel_y, me.knockback_x))
+    # streamed-out enemies and which chunks are loaded
+    parts.append(_U16.pack(len(chunks.dormant)))
+    for i, spawns in chunks.dormant.items():
+        parts.append(_U16.pack(i))
+        parts.append(_U16.pack(len(spawns)))
+        for sp in spawns:
+            _pack_str(parts, sp.tag)
+            parts.append(_SNAP_SPAWN.pack(ENEMY_KINDS.index(sp.kind), sp.x, sp.y,
+                                          _NONE if sp.health is None else sp.health,
+                                          _NONE if sp.max_health is None else sp.max_health,
+                                          sp.dir, sp.facing, sp.cool, sp.hit_flash_timer,
+                                          _NONE if sp.ai_phase is None else sp.ai_phase,
+                                          sp.vel_y, sp.knockback_x))
+    lo, hi = chunks.active or (_NONE, _NONE)
+    parts.append(struct.pack('<iiH', lo, hi, len(chunks.loaded)))
+    parts.append(struct.pack(f'<{len(chunks.loaded)}H', *chunks.loaded))
+    # swings and bolts; owners and hit sets refer to the player (0) or enemies (1 + index)
+    refs = {player: 0}
+    refs.update((me, i + 1) for i, me in enumerate(enemies))
+    swings = [sw for sw in world.map_swings if sw.owner in refs]
+    parts.append(_U16.pack(len(swings)))
+    for sw in swings:
+        *values, hits = swing_values(sw, refs)
+        parts.append(_SNAP_SWING.pack(*values, len(hits)))
+        parts.append(struct.pack(f'<{len(hits)}H', *hits))
+    # RNG streams, so drops and AI rolls replay identically
+    for name in SNAPSHOT_STREAMS:
+        _, mt, gauss = getattr(RNG, name).getstate()
+        parts.append(_SNAP_RNG.pack(mt[-1], *mt[:-1], gauss is not None, gauss or 0.0))
+    return b''.join(parts)
+
+def restore(world, data):
+    """Put the world back into a state captured by capture().
+
+    Objects are updated in place where they still exist (the player always,
+    enemies matched by tag), so references held elsewhere stay valid.
+    """
+    data = memoryview(data)
+    magic, version, frame, level_width, boss_defeated, cam, shake, shake_i = _SNAP_HEADER.unpack_from(data, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError("not a snapshot from this version of the game")
+    if level_width != world.level_width:
+        raise ValueError(f"snapshot is for a level {level_width}px wide, this one is {world.level_width}px")
+    off = _SNAP_HEADER.size
+    world.frame = frame
+    world.boss_defeated = boss_defeated
+    world.outcome = None
+    game_state.camera_x = cam
+    game_state.screen_shake, game_state.screen_shake_intensity = shake, shake_i
+
+    player = world.player
+    player.class_name, off = _unpack_str(data, off)
+    set_player_values(player, _SNAP_PLAYER.unpack_from(data, off))
+    off += _SNAP_PLAYER.size
+    inventory = player.inventory = Inventory()
+    (n,) = _U16.unpack_from(data, off)
+    off += 2
+    for _ in range(n):
+        key, off = _unpack_str(data, off)
+        inventory.add(key, _I32.unpack_from(data, off)[0])
+        off += 4
+
+    # enemies: reuse sprites by tag, rebuild the group and grid in captured order
+    by_tag = {getattr(me, 'tag', None): me for me in world.map_enemies}
+    for me in world.map_enemies:
+        world.enemy_grid.remove(me)
+    world.map_enemies.empty()
+    enemies = []
+    (n,) = _U16.unpack_from(data, off)
+    off += 2
+    for _ in range(n):
+        tag, off = _unpack_str(data, off)
+        (kind, x, y, health, max_health, dir, facing, cool, flash,
+         phase, last_tick, vel_y, knockback_x) = _SNAP_ENEMY.unpack_from(data, off)
+        off += _SNAP_ENEMY.size
+        kind = ENEMY_KINDS[kind]
+        me = by_tag.pop(tag or None, None)
+        if type(me) is not kind:
+            me = kind(x, y)
+            if tag:
+                me.tag = tag
+        me.rect.topleft = (x, y)
+        me.health, me.max_health, me.dir, me.facing, me.cool = health, max_health, dir, facing, cool
+        me.hit_flash_timer, me.ai_phase = flash, phase
+        me.ai_last_tick = None if last_tick == _NONE else last_tick
+        me.vel_y, me.knockback_x = vel_y, knockback_x
+        world.map_enemies.add(me)
+        world.enemy_grid.insert(me, me.rect)
+        enemies.append(me)
+
+    chunks = world.chunks
+    chunks.dormant = {}
+    (n,) = _U16.unpack_from(data, off)
+    off += 2
+    for _ in range(n):
+        i, count = struct.unpack_from('<HH', data, off)
+        off += 4
+        spawns = chunks.dormant[i] = []
+        for _ in range(count):
+            tag, off = _unpack_str(data, off)
+            (kind, x, y, health, max_health, dir, facing, cool, flash,
+             phase, vel_y, knockback_x) = _SNAP_SPAWN.unpack_from(data, off)
+            off += _SNAP_SPAWN.size
+            spawns.append(EnemySpawn(ENEMY_KINDS[kind], x, y, None if health == _NONE else health, tag or None, dir,
+                                     cool, vel_y, knockback_x, None if max_health == _NONE else max_health,
+                                     facing, flash, None if phase == _NONE else phase))
+    lo, hi, n = struct.unpack_from('<iiH', data, off)
+    off += 10
+    loaded = struct.unpack_from(f'<{n}H', data, off)
+    off += 2 * n
+    # terrain is identical whenever it is loaded, so only the difference is streamed
+    for i in [i for i in chunks.loaded if i not in loaded]:
+        chunks.unload(i)
+    for i in loaded:
+        if i not in chunks.loaded:
+            chunks.load(i)
+    chunks.active = None if lo == _NONE else (lo, hi)
+
+    refs = [player] + enemies
+    world.map_swings.empty()
+    (n,) = _U16.unpack_from(data, off)
+    off += 2
+    for _ in range(n):
+        *values, n_hits = _SNAP_SWING.unpack_from(data, off)
+        off += _SNAP_SWING.size
+        hits = struct.unpack_from(f'<{n_hits}H', data, off)
+        off += 2 * n_hits
+        world.map_swings.add(make_swing((*values, hits), refs))
+
+    for name in SNAPSHOT_STREAMS:
+        values = _SNAP_RNG.unpack_from(data, off)
+        off += _SNAP_RNG.size
+        getattr(RNG, name).setstate((3, values[1:625] + values[:1], values[626] if values[625] else None))
+    # interpolation starts over from the restored positions, so previous ones are not stored
+    world.snapshot()
+
+def quick_save(world, path=QUICKSAVE_PATH):
+    data = capture(world)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)  # never leave a half-written save behind
+    return len(data)
+
+def quick_load(world, path=QUICKSAVE_PATH):
+    """Restore the quick-save at path. Returns False if there is none."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return False
+    restore(world, data)
+    return True
+
+def snapshot_stats(world, repeat=200):
+    """Measure snapshots of the world as it is: (bytes, capture µs, restore µs)."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        data = capture(world)
+    captured = time.perf_counter()
+    for _ in range(repeat):
+        restore(world, data)
+    restored = time.perf_counter()
+    return len(data), (captured - start) / repeat * 1e6, (restored - captured) / repeat * 1e6
+
+class RewindBuffer:
+    """Ring buffer of the last `seconds` of snapshots, one every `interval` ticks."""
+    def __init__(self, seconds=REWIND_SECONDS, interval=REWIND_INTERVAL, tick_rate=TICK_RATE):
+        self.interval = interval
+        self.slots = [None] * max(1, seconds * tick_rate // interval)
+        self.head = 0   # next slot to write
+        self.count = 0
+        self.bytes = 0  # total size of the snapshots held
+
+    def __len__(self):
+        return self.count
+
+    def record(self, world):
+        """Capture the world if a snapshot is due on this tick."""
+        if world.frame % self.interval:
+            return
+        data = capture(world)
+        old = self.slots[self.head]
+        if old is not None:
+            self.bytes -= len(old)
+        self.slots[self.head] = data
+        self.bytes += len(data)
+        self.head = (self.head + 1) % len(self.slots)
+        self.count = min(self.count + 1, len(self.slots))
+
+    def rewind(self, world):
+        """Restore the newest snapshot and drop it. Returns False once the buffer is empty."""
+        if not self.count:
+            return False
+        self.head = (self.head - 1) % len(self.slots)
+        data = self.slots[self.head]
+        self.slots[self.head] = None
+        self.bytes -= len(data)
+        self.count -= 1
+        restore(world, data)
+        return True
+
+    def clear(self):
+        self.slots = [None] * len(self.slots)
+        self.head = self.count = self.bytes = 0
+
+# ---------- input recording ----------
+# A session is reproducible from its seed (or a starting snapshot), the keys
+# held on every tick and the potion/shop actions taken between ticks.
+INPUT_LOG_MAGIC = b'67IN'
+INPUT_LOG_VERSION = 1
+INPUT_KEYS = (pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_x, pygame.K_z)  # every key the simulation reads
+
+def key_state(keys):
+    """Pack the INPUT_KEYS held in a get_pressed()-style object into a bitmask."""
+    mask = 0
+    for bit, key in enumerate(INPUT_KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+def held_keys(mask):
+    return tuple(key for bit, key in enumerate(INPUT_KEYS) if mask >> bit & 1)
+
+def _pack_varint(parts, n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+    parts.append(bytes(out))
+
+def _unpack_varint(data, off):
+    n = shift = 0
+    while True:
+        b = data[off]
+        off += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, off
+        shift += 7
+
+class InputLog:
+    """Per-tick key states and between-tick actions of one session.
+
+    Key states are delta-encoded: only ticks where the held keys change are
+    stored, as (tick, bits that flipped), so holding a direction for a minute
+    costs nothing. `start` is a capture() snapshot when recording began
+    mid-session (after a rewind or load), otherwise the world is rebuilt from
+    the seed.
+    """
+    def __init__(self, player_class, level_width, seed, start=None):
+        self.player_class = player_class
+        self.level_width = level_width
+        self.seed = seed
+        self.start = start
+        self.changes = []  # (tick, flipped bits)
+        self.actions = []  # (tick, action, arg)
+        self.ticks = 0
+        self.state = 0
+
+    def __len__(self):
+        return self.ticks
+
+    @classmethod
+    def begin(cls, world):
+        """Start recording world from its current state."""
+        log = cls(world.player.class_name, world.level_width, world.seed,
+                  None if world.frame == 0 else capture(world))
+        world.log = log
+        return log
+
+    def restart(self, world):
+        """Drop what was recorded and continue from the world as it is now."""
+        self.__init__(self.player_class, self.level_width, self.seed, capture(world))
+
+    def record(self, keys):
+        mask = key_state(keys)
+        if mask != self.state:
+            self.changes.append((self.ticks, mask ^ self.state))
+            self.state = mask
+        self.ticks += 1
+
+    def act(self, action, arg=None):
+        self.actions.append((self.ticks, action, arg or ''))
+
+    def to_bytes(self):
+        parts = [INPUT_LOG_MAGIC, struct.pack('<BQiI', INPUT_LOG_VERSION, self.seed, self.level_width, self.ticks)]
+        _pack_str(parts, self.player_class)
+        start = self.start or b''
+        parts.append(struct.pack('<I', len(start)))
+        parts.append(start)
+        _pack_varint(parts, len(self.changes))
+        last = 0
+        for tick, bits in self.changes:
+            _pack_varint(parts, tick - last)
+            parts.append(_U8.pack(bits))
+            last = tick
+        _pack_varint(parts, len(self.actions))
+        last = 0
+        for tick, action, arg in self.actions:
+            _pack_varint(parts, tick - last)
+            _pack_str(parts, action)
+            _pack_str(parts, arg)
+            last = tick
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = memoryview(data)
+        if bytes(data[:4]) != INPUT_LOG_MAGIC:
+            raise ValueError("not an input log")
+        version, seed, level_width, ticks = struct.unpack_from('<BQiI', data, 4)
+        if version != INPUT_LOG_VERSION:
+            raise ValueError(f"input log version {version} is not supported")
+        off = 4 + struct.calcsize('<BQiI')
+        player_class, off = _unpack_str(data, off)
+        (n,) = struct.unpack_from('<I', data, off)
+        off += 4
+        log = cls(player_class, level_width, seed, bytes(data[off:off + n]) or None)
+        off += n
+        log.ticks = ticks
+        count, off = _unpack_varint(data, off)
+        tick = 0
+        for _ in range(count):
+            gap, off = _unpack_varint(data, off)
+            tick += gap
+            log.changes.append((tick, data[off]))
+            log.state ^= data[off]
+            off += 1
+        count, off = _unpack_varint(data, off)
+        tick = 0
+        for _ in range(count):
+            gap, off = _unpack_varint(data, off)
+            tick += gap
+            action, off = _unpack_str(data, off)
+            arg, off = _unpack_str(data, off)
+            log.actions.append((tick, action, arg))
+        return log
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+class ReplayScript:
+    """World.run script that plays an InputLog back, performing its actions as their ticks come up."""
+    def __init__(self, log, world):
+        self.log = log
+        self.world = world
+        self.first = world.frame
+        self.state = 0
+        self.next_change = 0
+        self.next_action = 0
+
+    def __call__(self, frame):
+        tick = frame - self.first
+        changes, actions = self.log.changes, self.log.actions
+        while self.next_change < len(changes) and changes[self.next_change][0] <= tick:
+            self.state ^= changes[self.next_change][1]
+            self.next_change += 1
+        while self.next_action < len(actions) and actions[self.next_action][0] <= tick:
+            _, action, arg = actions[self.next_action]
+            self.world.perform(action, arg or None)
+            self.next_action += 1
+        return held_keys(self.state)
+
+def replay_world(log):
+    """Rebuild the world as it was when `log` started recording."""
+    world = World(log.player_class, level_width=log.level_width, seed=log.seed)
+    if log.start:
+        restore(world, log.start)
+    return world
+
+def replay(log, frames=None):
+    """Run a log back on a rebuilt world. Returns the world."""
+    world = replay_world(log)
+    world.run(len(log) if frames is None else frames, ReplayScript(log, world))
+    return world
+
+def run_headless(frames, player_class='Werrior', script=None, seed=None, log=None):
+    """Simulate `frames` frames without rendering and print ticks per second.
+
+    With an InputLog, the recorded session is replayed instead (for at most
+    `frames` ticks if given).
+    """
+    if log is not None:
+        world = replay_world(log)
+        frames, script = frames or len(log), ReplayScript(log, world)
+    else:
+        world = World(player_class, seed=seed)
+    start = time.perf_counter()
+    done = world.run(frames, script)
+    elapsed = time.perf_counter() - start
+    print(f"{done} ticks in {elapsed:.3f}s ({done / max(elapsed, 1e-9):.0f} ticks/s), outcome: {world.outcome}")
+    print("enemy AI tiers on the last tick: " + ", ".join(f"{k}={v}" for k, v in world.ai_tiers.items()))
+    size, cap, res = snapshot_stats(world)
+    print(f"snapshot: {size} bytes, capture {cap:.1f}µs, restore {res:.1f}µs")
+    return world
+
+# ---------- parallax background ----------
+LAYER_COLORKEY = (255, 0, 255)  # transparent pixels of opaque layers
+
+class ParallaxLayer:
+    """A background plane painted once and scrolled at `factor` times the camera.
+
+    paint(surface, top) draws the layer in screen coordinates shifted up by
+    `top`; the layer only stores the horizontal band [top, top + height). The
+    surface repeats every `width` pixels so it covers levels of any length.
+    A negative factor scrolls the layer along with the camera (the clouds drift).
+    With a `fill` color the layer is opaque (painted over that color); with a
+    fill and no painter it is just a screen fill.
+    """
+    def __init__(self, factor, paint=None, top=0, height=HEIGHT, width=WIDTH * 2, fill=None):
+        self.factor = factor
+        self.fill = fill
+        self.paint = paint
+        self.top = top
+        self.height = height
+        self.width = width
+        self.surface = None
+
+    def build(self):
+        with STARTUP.step('background'):
+            self.surface = self.paint_surface()
+
+    def paint_surface(self):
+        surf = pygame.Surface((self.width, self.height))
+        if self.fill is not None:
+            surf.fill(self.fill)
         else:
-            # reward for defeating
-            if engaged.health <= 0:
-                gained = 10 + random.randint(0, 12)
-                player.water += gained
-                # potion drop chance - random type
-                if random.random() < 0.35:
-                    potion_types = ['Health', 'Strength', 'Knockback']
-                    player.add_item(random.choice(potion_types))
-                player.health = min(player.max_health, player.health + 30)
-                # remove from map enemies
-                if engaged in map_enemies:
-                    map_enemies.remove(engaged)
-                # show small reward message
-                draw_text_center(f"Victory! +{gained} 67 water", HEIGHT//2, 28, YELLOW)
-                pygame.display.flip(); pygame.time.delay(900)
-
-    # check victory: if boss removed
-    boss_alive = any(isinstance(m, Boss) for m in map_enemies)
-    if not boss_alive:
-        # Victory cutscene
-        cutscene("VICTORY!", [
-            "The Bandit King falls...",
-            "The darkness lifts from the realm of 67."
-        ], duration=3.0)
-        
-        story([
-            "You defeated the Bandit King!",
-            "The princess is saved.",
-            "The realm of 67 prospers.",
-            "GOOD ENDING – You are the richest in the realm with infinite 67 Water!"
-        ])
-        pygame.quit(); sys.exit()
-
-    # update camera position to follow player
-    target_camera_x = player.rect.centerx - WIDTH // 2
-    game_state.camera_x += (target_camera_x - game_state.camera_x) * 0.12
-    game_state.camera_x = max(0, min(game_state.camera_x, LEVEL_WIDTH - WIDTH))
-
-    # apply screen shake
-    shake_x, shake_y = apply_screen_shake()
-    
-    # draw world
-    # Sky gradient
-    SCREEN.fill(SKY)
-    
+            surf.fill(LAYER_COLORKEY)
+            surf.set_colorkey(LAYER_COLORKEY, pygame.RLEACCEL)
+        self.paint(surf, self.top)
+        if pygame.display.get_surface() is not None:
+            surf = surf.convert()
+        return surf
+
+    def draw(self, s, camera_x):
+        if self.paint is None:
+            s.fill(self.fill)
+            return
+        if self.surface is None:
+            self.build()
+        x = -int(camera_x * self.factor) % self.width
+        if x > 0:
+            x -= self.width
+        while x < s.get_width():
+            s.blit(self.surface, (x, self.top))
+            x += self.width
+
+def paint_mountains(surf, top):
     # Draw parallax background mountains (far layer)
     mountain_color1 = (60, 100, 140)
     mountain_color2 = (80, 120, 160)
-    parallax_offset = int(game_state.camera_x * 0.2)
     # Left mountain
-    mountain1_points = [(0 - parallax_offset, HEIGHT - 150), (300 - parallax_offset, 200), (600 - parallax_offset, HEIGHT - 150)]
-    pygame.draw.polygon(SCREEN, mountain_color1, mountain1_points)
+    pygame.draw.polygon(surf, mountain_color1, [(0, HEIGHT - 150 - top), (300, 200 - top), (600, HEIGHT - 150 - top)])
     # Right mountain
-    mountain2_points = [(WIDTH//2 - parallax_offset, HEIGHT - 100), (WIDTH - parallax_offset, 150), (WIDTH + 300 - parallax_offset, HEIGHT - 100)]
-    pygame.draw.polygon(SCREEN, mountain_color2, mountain2_points)
-    
+    pygame.draw.polygon(surf, mountain_color2, [(WIDTH//2, HEIGHT - 100 - top), (WIDTH, 150 - top), (WIDTH + 300, HEIGHT - 100 - top)])
+
+def paint_clouds(surf, top):
     # Draw decorative clouds
     cloud_color = (200, 220, 255)
     for i in range(3):
-        cloud_x = (game_state.camera_x * 0.05 + i * 400) % (LEVEL_WIDTH + 200)
+        cloud_x = i * 400
         cloud_y = 80 + i * 80
         for j in range(4):
-            pygame.draw.circle(SCREEN, cloud_color, (int(cloud_x + j*30), int(cloud_y)), 20)
-    
-    # draw platforms with camera offset
+            pygame.draw.circle(surf, cloud_color, (cloud_x + j*30, cloud_y - top), 20)
+
+# back to front; append layers here to add depth planes
+BACKGROUND_LAYERS = [
+    ParallaxLayer(0.0, fill=SKY),
+    ParallaxLayer(0.2, paint_mountains, top=150, height=HEIGHT - 249),
+    ParallaxLayer(-0.05, paint_clouds, top=60, height=202),
+]
+
+# ---------- HUD ----------
+class Hud:
+    """The HUD as one cached overlay surface.
+
+    A widget is a `state(world)` function returning the values it shows
+    (None hides it) plus a `draw(surf, state)` painter; the default painter
+    takes a tuple of (text, color, pos) lines. The overlay is repainted only
+    when some widget's state changes, otherwise the HUD is one RLE blit.
+    """
+    def __init__(self, widgets=()):
+        self.widgets = []
+        self.surface = None
+        self.state = None
+        self.rebuilds = 0
+        for state in widgets:
+            self.add(state)
+
+    def add(self, state, draw=None):
+        self.widgets.append((state, draw or draw_hud_lines))
+        self.state = None
+
+    def values(self, world):
+        """What every widget shows for `world`; the overlay is repainted when this changes."""
+        return tuple(st(world) for st, _ in self.widgets)
+
+    def draw(self, s, state):
+        if state != self.state:
+            self.rebuild(state)
+        s.blit(self.surface, (0, 0))
+
+    def rebuild(self, state):
+        if self.surface is None:
+            with STARTUP.step('hud'):
+                self.surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+        self.surface.fill((0, 0, 0, 0))
+        for (_, draw), st in zip(self.widgets, state):
+            if st is not None:
+                draw(self.surface, st)
+        # mostly transparent, so run-length encoding skips nearly all of it
+        self.surface.set_alpha(255, pygame.RLEACCEL)
+        self.state = state
+        self.rebuilds += 1
+
+def draw_hud_lines(surf, lines):
+    for text, color, pos in lines:
+        surf.blit(render_text(text, FONT_SIZE, color), pos)
+
+def hud_status(world):
+    # water and potions, class and health
+    player = world.player
+    counts = " ".join(f"{item.name[0]}:{player.inventory.count(key)}" for key, item in ITEMS.items())
+    return ((f"Water: {player.water}    {counts}", WHITE, (10, 10)),
+            (f"Class: {player.class_name}    HP: {player.health}/{player.max_health}", WHITE, (10, 36)))
+
+def hud_controls(world):
+    return (("Controls: SPACE=Jump  E=Shop  P=Potion  ARROWS=Move", (180,180,180), (10, HEIGHT - 26)),)
+
+def hud_shop_hint(world):
+    # proximity hint for shop
+    shop_rect = world.shop_rect
+    if abs(world.player.rect.centerx - shop_rect.centerx) < 200:
+        return (("Press E to enter shop", YELLOW, (shop_rect.centerx - 100, shop_rect.top - 50)),)
+    return None
+
+def hud_portal_hint(world):
+    # proximity hint for portal
+    portal_rect = world.portal_rect
+    if abs(world.player.rect.centerx - portal_rect.centerx) < 250 and world.player.water >= PORTAL_WATER_REQUIREMENT:
+        return ((f"Press E for Secret Ending (Need {PORTAL_WATER_REQUIREMENT} Water)", (200, 100, 255),
+                 (portal_rect.centerx - 150, portal_rect.top - 50)),)
+    return None
+
+HUD = Hud([hud_status, hud_controls, hud_shop_hint, hud_portal_hint])
+
+def draw_hud(world):
+    HUD.draw(SCREEN, world.hud_values())
+
+# ---------- frame profiler ----------
+# Every frame of the exploration loop and duel() is split into phases by
+# PROFILER.mark(phase) calls; each mark bills the time since the previous one
+# to that phase. F3 toggles game_state.debug_mode, which shows the overlay;
+# F4 writes the recorded frames to PROFILE_CSV_PATH. Only the thread that
+# created the profiler is measured; marks from the threaded simulation's
+# worker (SimThread) are ignored. The profiler is off until main() turns it
+# on, so headless runs (duelenv, bench, --headless) don't pay for marks;
+# the simulation steps check `enabled` before marking at all.
+PROFILE_PHASES = ('input', 'streaming', 'player', 'ai', 'effects', 'combat', 'rewind',
+                  'draw bg', 'draw terrain', 'draw props', 'draw particles', 'draw swings',
+                  'draw enemies', 'draw player', 'hud', 'hitboxes', 'toasts', 'profiler', 'flip')
+PROFILE_COUNTS = ('enemies', 'swings', 'particles')
+PROFILE_FRAMES = 240       # frames kept in the ring buffer
+PROFILE_REFRESH = 15       # frames between overlay repaints
+PROFILE_CSV_PATH = 'profile.csv'
+
+class FrameProfiler:
+    """Ring buffer of per-phase frame times (seconds) and entity counts."""
+    def __init__(self, size=PROFILE_FRAMES):
+        self.times = np.zeros((size, len(PROFILE_PHASES)))
+        self.counts = np.zeros((size, len(PROFILE_COUNTS)), np.int32)
+        self.frames = 0  # frames recorded so far
+        self.current = dict.fromkeys(PROFILE_PHASES, 0.0)
+        self.last = time.perf_counter()
+        self.surface = None
+        self.thread = threading.get_ident()
+        self.enabled = False
+
+    def begin_frame(self):
+        for phase in self.current:
+            self.current[phase] = 0.0
+        self.last = time.perf_counter()
+
+    def mark(self, phase):
+        """Bill the time since the previous mark to `phase`."""
+        if not self.enabled or threading.get_ident() != self.thread:
+            return
+        t = time.perf_counter()
+        self.current[phase] += t - self.last
+        self.last = t
+
+    def end_frame(self, *counts):
+        i = self.frames % len(self.times)
+        self.times[i] = tuple(self.current.values())
+        self.counts[i] = counts
+        self.frames += 1
+
+    def recent(self):
+        """(times, counts) of the recorded frames, oldest first."""
+        size = len(self.times)
+        if self.frames <= size:
+            return self.times[:self.frames], self.counts[:self.frames]
+        i = self.frames % size
+        return (np.concatenate([self.times[i:], self.times[:i]]),
+                np.concatenate([self.counts[i:], self.counts[:i]]))
+
+    def export_csv(self, path=PROFILE_CSV_PATH):
+        """Write the buffered frames as CSV (times in ms). Returns the number of rows."""
+        times, counts = self.recent()
+        first = self.frames - len(times)
+        with open(path, 'w') as f:
+            f.write(','.join(('frame', 'total_ms', *PROFILE_PHASES, *PROFILE_COUNTS)) + '\n')
+            for n, (row, cnt) in enumerate(zip(times * 1000.0, counts)):
+                f.write(f"{first + n},{row.sum():.3f}," + ','.join(f"{t:.3f}" for t in row)
+                        + ',' + ','.join(str(c) for c in cnt) + '\n')
+        return len(times)
+
+    def draw(self, s):
+        if self.surface is None or self.frames % PROFILE_REFRESH == 0:
+            self.rebuild()
+        s.blit(self.surface, (WIDTH - self.surface.get_width() - 10, 70))
+
+    def rebuild(self):
+        """Repaint the overlay: frame-time graph, per-phase means and the latest counts."""
+        times, counts = self.recent()
+        line = 16
+        w, graph_h = 360, 80
+        h = 30 + graph_h + line * (len(PROFILE_PHASES) + 2)
+        if self.surface is None:
+            # an opaque panel in the display format blits several times faster than a translucent one
+            self.surface = pygame.Surface((w, h)).convert()
+        surf = self.surface
+        surf.fill((16, 16, 24))
+        # the numbers change every repaint; keep them out of the shared text cache
+        small = font(16)
+        budget = 1000.0 / FPS
+        totals = times.sum(axis=1) * 1000.0
+        mean = totals.mean() if len(totals) else 0.0
+        worst = totals.max() if len(totals) else 0.0
+        surf.blit(small.render(f"frame {mean:.2f} ms avg, {worst:.2f} max   {CLOCK.get_fps():.0f} fps",
+                               True, WHITE), (8, 6))
+        # frame times over the buffer; the yellow line is the frame budget, the top twice that
+        top = 26
+        scale = graph_h / (2 * budget)
+        pygame.draw.line(surf, YELLOW, (8, top + graph_h // 2), (w - 8, top + graph_h // 2))
+        if len(totals) > 1:
+            step = (w - 16) / (PROFILE_FRAMES - 1)
+            points = [(8 + n * step, top + graph_h - min(t * scale, graph_h)) for n, t in enumerate(totals)]
+            pygame.draw.lines(surf, GREEN, False, points)
+        y = top + graph_h + 6
+        means = times.mean(axis=0) * 1000.0 if len(times) else np.zeros(len(PROFILE_PHASES))
+        for phase, ms in zip(PROFILE_PHASES, means):
+            pygame.draw.rect(surf, BLUE, (120, y + 3, min(ms * 40, w - 190), line - 6))
+            surf.blit(small.render(phase, True, (200, 200, 200)), (8, y))
+            surf.blit(small.render(f"{ms:.3f}", True, WHITE), (w - 62, y))
+            y += line
+        if len(counts):
+            text = "   ".join(f"{name} {n}" for name, n in zip(PROFILE_COUNTS, counts[-1]))
+            surf.blit(small.render(text, True, WHITE), (8, y + 4))
+
+def handle_debug_key(key):
+    """F3 toggles the debug overlay; F4 exports the profiled frames to CSV."""
+    if key == pygame.K_F3:
+        game_state.debug_mode = not game_state.debug_mode
+    elif key == pygame.K_F4:
+        rows = PROFILER.export_csv()
+        TOASTS.show(f"Wrote {rows} frames to {PROFILE_CSV_PATH}")
+
+PROFILER = FrameProfiler()
+
+# ---------- drawing ----------
+def draw_world(world, alpha, shake=None):
+    """Draw the exploration view `alpha` of a tick past the last simulated one.
+    `world` is a World or a RenderFrame published from one by a SimThread;
+    `shake`, if given, is the screen-shake offset to draw with."""
+    player = world.player
+    plats, map_enemies, map_swings, particles = world.plats, world.map_enemies, world.map_swings, world.particles
+    # interpolate camera and entities between the last two ticks
+    camera_x = world.camera_x(alpha)
+
+    # apply screen shake
+    shake_x, shake_y = apply_screen_shake() if shake is None else shake
+
+    # draw world: sky, mountains and clouds are pre-rendered parallax layers
+    for layer in BACKGROUND_LAYERS:
+        layer.draw(SCREEN, camera_x)
+    PROFILER.mark('draw bg')
+
+    # draw baked terrain, culled to the tiles that overlap the view
     for p in plats:
+        if p.rect.right < camera_x or p.rect.left > camera_x + WIDTH:
+            continue
         screen_rect = p.rect.copy()
-        screen_rect.x -= game_state.camera_x
-        screen_rect.x += shake_x
-        screen_rect.y += shake_y
-        
-        # Draw platform with texture
-        SCREEN.blit(p.image, screen_rect)
-        
-        # Add grass/detail on top of ground platforms
-        if screen_rect.top >= HEIGHT - 100:  # Ground level
-            for x in range(0, int(screen_rect.width), 30):
-                grass_points = [
-                    (int(screen_rect.left + x), int(screen_rect.top)),
-                    (int(screen_rect.left + x + 8), int(screen_rect.top - 5)),
-                    (int(screen_rect.left + x + 15), int(screen_rect.top))
-                ]
-                pygame.draw.polygon(SCREEN, (40, 120, 40), grass_points)
-    
-    # draw shop with camera offset
-    shop_screen_rect = shop_rect.copy()
-    shop_screen_rect.x -= game_state.camera_x
-    shop_screen_rect.x += shake_x
-    shop_screen_rect.y += shake_y
-    pygame.draw.rect(SCREEN, (120,100,80), shop_screen_rect)
-    if abs(shop_screen_rect.centerx - WIDTH//2) < WIDTH:  # Only draw text if shop is on screen
-        draw_text_center("Village", shop_screen_rect.top + 12, 20, WHITE)
-    
-    # draw secret portal with camera offset
-    portal_screen_rect = portal_rect.copy()
-    portal_screen_rect.x -= game_state.camera_x
-    portal_screen_rect.x += shake_x
-    portal_screen_rect.y += shake_y
-    if abs(portal_screen_rect.centerx - WIDTH//2) < WIDTH:  # Only draw if on screen
-        # Draw glowing portal effect
-        portal_glow = pygame.Surface((portal_screen_rect.width + 20, portal_screen_rect.height + 20), pygame.SRCALPHA)
-        frame_time = pygame.time.get_ticks() / 1000.0
-        glow_color_r = int(200 + math.sin(frame_time * 3) * 50)
-        glow_color_g = int(100 + math.sin(frame_time * 2.5) * 50)
-        glow_color_b = int(200 + math.sin(frame_time * 3.5) * 50)
-        pygame.draw.circle(portal_glow, (glow_color_r, glow_color_g, glow_color_b, 100), (portal_glow.get_width()//2, portal_glow.get_height()//2), 40)
-        SCREEN.blit(portal_glow, (portal_screen_rect.x - 10, portal_screen_rect.y - 10))
-        
-        # Draw portal rect with gradient effect
-        pygame.draw.rect(SCREEN, (150, 50, 200), portal_screen_rect, 3)
-        pygame.draw.rect(SCREEN, (200, 100, 255), (portal_screen_rect.x + 5, portal_screen_rect.y + 5, portal_screen_rect.width - 10, portal_screen_rect.height - 10), 2)
-        draw_text_center("Portal", portal_screen_rect.centery - 5, 16, (200, 100, 255))
-    
+        screen_rect.x -= camera_x
+        for tx, tile, pad in p.terrain_tiles():
+            x = screen_rect.x + tx
+            if x + tile.get_width() < 0 or x > WIDTH:
+                continue
+            SCREEN.blit(tile, (x + shake_x, p.rect.y - pad + shake_y))
+    PROFILER.mark('draw terrain')
+
+    # draw props (shop, portal) of the streamed-in chunks with camera offset
+    for kind, rect in world.loaded_props():
+        if kind == 'shop':
+            shop_screen_rect = rect.copy()
+            shop_screen_rect.x -= camera_x
+            shop_screen_rect.x += shake_x
+            shop_screen_rect.y += shake_y
+            pygame.draw.rect(SCREEN, (120,100,80), shop_screen_rect)
+            if abs(shop_screen_rect.centerx - WIDTH//2) < WIDTH:  # Only draw text if shop is on screen
+                draw_text_center("Village", shop_screen_rect.top + 12, 20, WHITE)
+        elif kind == 'portal':
+            portal_screen_rect = rect.copy()
+            portal_screen_rect.x -= camera_x
+            portal_screen_rect.x += shake_x
+            portal_screen_rect.y += shake_y
+            if abs(portal_screen_rect.centerx - WIDTH//2) < WIDTH:  # Only draw if on screen
+                # Draw glowing portal effect
+                portal_glow = pygame.Surface((portal_screen_rect.width + 20, portal_screen_rect.height + 20), pygame.SRCALPHA)
+                frame_time = pygame.time.get_ticks() / 1000.0
+                glow_color_r = int(200 + math.sin(frame_time * 3) * 50)
+                glow_color_g = int(100 + math.sin(frame_time * 2.5) * 50)
+                glow_color_b = int(200 + math.sin(frame_time * 3.5) * 50)
+                pygame.draw.circle(portal_glow, (glow_color_r, glow_color_g, glow_color_b, 100), (portal_glow.get_width()//2, portal_glow.get_height()//2), 40)
+                SCREEN.blit(portal_glow, (portal_screen_rect.x - 10, portal_screen_rect.y - 10))
+
+                # Draw portal rect with gradient effect
+                pygame.draw.rect(SCREEN, (150, 50, 200), portal_screen_rect, 3)
+                pygame.draw.rect(SCREEN, (200, 100, 255), (portal_screen_rect.x + 5, portal_screen_rect.y + 5, portal_screen_rect.width - 10, portal_screen_rect.height - 10), 2)
+                draw_text_center("Portal", portal_screen_rect.centery - 5, 16, (200, 100, 255))
+
+    PROFILER.mark('draw props')
     # draw particles, enemies and effects with camera offset
-    for part in particles:
-        part.rect.x += shake_x
-        part.rect.y += shake_y
-    particles.draw(SCREEN)
-    
+    particles.draw(SCREEN, (shake_x - int(camera_x), shake_y))
+    PROFILER.mark('draw particles')
+
     for sw in map_swings:
-        sw_rect = sw.rect.copy()
-        sw_rect.x -= game_state.camera_x
+        sw_rect = swing_screen_rect(sw, alpha)
+        sw_rect.x -= camera_x
         sw_rect.x += shake_x
         sw_rect.y += shake_y
         SCREEN.blit(sw.image, sw_rect)
-    
+    PROFILER.mark('draw swings')
+
     for me in map_enemies:
-        screen_rect = me.rect.copy()
-        screen_rect.x -= game_state.camera_x
+        screen_rect = lerp_rect(me, alpha)
+        screen_rect.x -= camera_x
         screen_rect.x += shake_x
         screen_rect.y += shake_y
         me.draw_at_pos(SCREEN, screen_rect)
-    
+    PROFILER.mark('draw enemies')
+
     # draw player with camera offset
-    screen_rect = player.rect.copy()
-    screen_rect.x -= game_state.camera_x
+    screen_rect = lerp_rect(player, alpha)
+    screen_rect.x -= camera_x
     screen_rect.x += shake_x
     screen_rect.y += shake_y
     player.draw_at_pos(SCREEN, screen_rect)
-    
-    draw_hud()
-    
+    PROFILER.mark('draw player')
+
+    draw_hud(world)
+    PROFILER.mark('hud')
+
     # Show hitboxes when sword is active
     if len(map_swings) > 0 or any(e.hit_flash_timer > 0 for e in map_enemies):
-        debug_font = pygame.font.Font(None, 20)
-        
         # Draw sword hitboxes (when active)
         for sw in map_swings:
-            sw_rect = sw.rect.copy()
-            sw_rect.x -= game_state.camera_x
+            sw_rect = swing_screen_rect(sw, alpha)
+            sw_rect.x -= camera_x
             sw_rect.x += shake_x
             sw_rect.y += shake_y
             pygame.draw.rect(SCREEN, YELLOW, sw_rect, 2)
-        
+
         # Draw enemy hitboxes that are being hit
         for me in map_enemies:
             if me.hit_flash_timer > 0:
-                screen_rect = me.rect.copy()
-                screen_rect.x -= game_state.camera_x
+                screen_rect = lerp_rect(me, alpha)
+                screen_rect.x -= camera_x
                 screen_rect.x += shake_x
                 screen_rect.y += shake_y
                 # Draw in bright red when hit
@@ -1362,6 +3235,514 @@ while True:
                 # Pulsing effect - thicker border when freshly hit
                 if me.hit_flash_timer > 4:
                     pygame.draw.rect(SCREEN, RED, screen_rect, 5)
-    
-    pygame.display.flip()
+    PROFILER.mark('hitboxes')
+
+# ---------- threaded simulation ----------
+# With --threaded-sim the exploration ticks run on a SimThread while the main
+# thread only draws. After each batch of ticks the simulation publishes a
+# RenderFrame: read-only views of everything draw_world() reads, so the
+# renderer never touches a live sprite. Frames pass through a two-slot
+# FrameExchange and the renderer draws the newest. Whatever changes the world
+# from the main thread (potions, the shop, saves, duels) runs with the
+# simulation paused. ThreadStats measures how much the two threads overlap and
+# how old each frame is when it is drawn.
+SIM_KEYS = INPUT_KEYS + (pygame.K_r,)  # every key the simulation thread reads
+THREAD_STATS_SIZE = TICK_RATE * 10     # intervals and latencies kept for the report
+
+class View:
+    """Read-only copy of the attributes a sprite's drawing code reads.
+
+    Subclasses list those attributes in __slots__ and borrow the sprite
+    class's drawing methods, so one piece of code draws a sprite or its view.
+    """
+    __slots__ = ()
+
+    def __init__(self, sprite, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name] if name in values else getattr(sprite, name, None))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+class PlayerView(View):
+    __slots__ = ('rect', 'prev_pos', 'scale', 'class_name', 'facing', 'walk_phase',
+                 'health', 'max_health', 'dash_timer', 'dash_vel')
+    draw_at_pos = Player.draw_at_pos
+    pose_surface = Player.pose_surface
+    render_pose = Player.render_pose
+
+class EnemyView(View):
+    __slots__ = ('rect', 'prev_pos', 'image', 'health', 'max_health', 'hit_flash_timer')
+    draw_at_pos = Enemy.draw_at_pos
+
+class SwingView(View):
+    __slots__ = ('rect', 'image', 'owner')
+
+class ParticleView(View):
+    __slots__ = ('count', 'pos', 'life', 'max_life', 'color')
+    draw = ParticleSystem.draw
+    __len__ = ParticleSystem.__len__
+
+    def __init__(self, particles):
+        arrays = {}
+        for name in ('pos', 'life', 'max_life', 'color'):
+            arr = getattr(particles, name)[:particles.count].copy()
+            arr.flags.writeable = False
+            arrays[name] = arr
+        super().__init__(particles, **arrays)
+
+class RenderFrame:
+    """What draw_world() reads, as of one simulation tick; never changed once built."""
+    __slots__ = ('published', 'camera', 'camera_prev', 'player', 'map_enemies', 'map_swings',
+                 'particles', 'plats', 'props', 'hud')
+
+    def __init__(self, world):
+        self.camera, self.camera_prev = game_state.camera_x, game_state.camera_prev_x
+        self.player = PlayerView(world.player, rect=world.player.rect.copy())
+        views = {world.player: self.player}
+        for me in world.map_enemies:
+            views[me] = EnemyView(me, rect=me.rect.copy())
+        self.map_enemies = tuple(views.values())[1:]
+        swings = []
+        for sw in world.map_swings:
+            owner = views.get(sw.owner) or EnemyView(sw.owner, rect=sw.owner.rect.copy())
+            swings.append(SwingView(sw, rect=sw.rect.copy(), owner=owner))
+        self.map_swings = tuple(swings)
+        self.particles = ParticleView(world.particles)
+        self.plats = tuple(world.plats)
+        self.props = tuple(world.loaded_props())
+        self.hud = world.hud_values()
+        self.published = time.perf_counter()
+
+    def camera_x(self, alpha):
+        return self.camera_prev + (self.camera - self.camera_prev) * alpha
+
+    def loaded_props(self):
+        return self.props
+
+    def hud_values(self):
+        return self.hud
+
+class FrameExchange:
+    """Double buffer between the simulation and the renderer: publish() fills
+    the back slot and swaps it to the front, latest() returns the front."""
+    def __init__(self, frame):
+        self.lock = threading.Lock()
+        self.slots = [frame, frame]
+        self.front = 0
+        self.published = 1
+
+    def publish(self, frame):
+        with self.lock:
+            back = 1 - self.front
+            self.slots[back] = frame
+            self.front = back
+            self.published += 1
+
+    def latest(self):
+        with self.lock:
+            return self.slots[self.front]
+
+def busy_overlap(a, b):
+    """Total time during which both sorted lists of (start, end) intervals are busy."""
+    total = 0.0
+    i = j = 0
+    while i < len(a) and j < len(b):
+        lo, hi = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if hi > lo:
+            total += hi - lo
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return total
+
+class ThreadStats:
+    """Busy intervals of the simulation and render threads and the age of each drawn frame.
+
+    Each interval also records the CPU time its thread used: under the GIL, or
+    on one core, both threads can be "busy" while only one of them runs.
+    """
+    def __init__(self, size=THREAD_STATS_SIZE):
+        self.sim = deque(maxlen=size)      # (start, end, cpu) of each batch of ticks
+        self.render = deque(maxlen=size)   # (start, end, cpu) of each frame drawn and flipped
+        self.latency = deque(maxlen=size)  # seconds from publishing a frame to drawing it
+        self.drawn = 0    # distinct frames drawn
+        self.repeats = 0  # frames drawn again because no newer one was ready
+        self.last_frame = None
+
+    @staticmethod
+    def now():
+        """Start of an interval, to pass to simulated() or rendered() from the same thread."""
+        return time.perf_counter(), time.thread_time()
+
+    @staticmethod
+    def interval(start):
+        return start[0], time.perf_counter(), time.thread_time() - start[1]
+
+    def simulated(self, start):
+        self.sim.append(self.interval(start))
+
+    def rendered(self, frame, start):
+        self.render.append(self.interval(start))
+        self.latency.append(start[0] - frame.published)
+        if frame is self.last_frame:
+            self.repeats += 1
+        else:
+            self.drawn += 1
+            self.last_frame = frame
+
+    def report(self, published):
+        """Overlap and latency over the intervals both threads still have on record."""
+        sim, render = list(self.sim), list(self.render)
+        if not sim or not render:
+            return "threaded simulation: nothing measured yet"
+        start, end = max(sim[0][0], render[0][0]), min(sim[-1][1], render[-1][1])
+        wall = end - start
+        if wall <= 0:
+            return "threaded simulation: nothing measured yet"
+        sim, render = ([(max(a, start), min(b, end), cpu) for a, b, cpu in spans if b > start and a < end]
+                       for spans in (sim, render))
+        sim_busy = sum(b - a for a, b, _ in sim)
+        render_busy = sum(b - a for a, b, _ in render)
+        both = busy_overlap(sim, render)
+        cpu = sum(c for *_, c in sim) + sum(c for *_, c in render)
+        latency = np.array(self.latency) * 1000.0
+        gil = "on" if getattr(sys, '_is_gil_enabled', lambda: True)() else "off"
+        return "\n".join([
+            f"threaded simulation, last {wall:.1f}s (GIL {gil}, CPUs: {os.cpu_count()}):",
+            f"  simulation busy {sim_busy / wall:.0%}, render busy {render_busy / wall:.0%}, "
+            f"both at once {both / wall:.0%} ({both / max(min(sim_busy, render_busy), 1e-9):.0%} of the less busy)",
+            f"  CPU used by the two {cpu:.2f}s in {wall:.2f}s: {cpu / wall:.2f} cores' worth",
+            f"  publish-to-draw latency p50 {np.percentile(latency, 50):.2f} ms, "
+            f"p95 {np.percentile(latency, 95):.2f} ms, max {latency.max():.2f} ms",
+            f"  frames: {published} published, {self.drawn} drawn, "
+            f"{max(0, published - self.drawn)} never drawn, {self.repeats} drawn again"])
+
+class SimThread(threading.Thread):
+    """Runs the exploration ticks of `world` on a worker thread and publishes a
+    RenderFrame to `frames` after each batch.
+
+    Paced, it keeps TICK_RATE on its own clock; unpaced (benchmarks) it ticks as
+    fast as it can. Unless `halt` is False it stops by itself when the player
+    engages an enemy or reaches the open portal, until resume(). The main
+    thread sets `keys` and makes any other change to the world inside paused().
+    """
+    def __init__(self, world, rewind, pace=True, halt=True):
+        super().__init__(name='simulation', daemon=True)
+        self.world = world
+        self.rewind = rewind
+        self.pace = pace
+        self.halt = halt
+        self.keys = NO_KEYS
+        self.lock = threading.Lock()  # held while ticking and while paused
+        self.timestep = FixedTimestep()
+        self.last = time.perf_counter()
+        self.halted = False
+        self.engaged = None
+        self.stopping = False
+        self.ticks = 0
+        self.frames = FrameExchange(RenderFrame(world))
+        self.stats = ThreadStats()
+
+    def run(self):
+        clock = time.perf_counter
+        dt = self.timestep.dt
+        while not self.stopping:
+            with self.lock:
+                ticks = 0
+                if not (self.halted or self.stopping):
+                    now = clock()
+                    ticks = self.timestep.advance(now - self.last) if self.pace else 1
+                    self.last = now
+                if ticks:
+                    self.step(ticks)
+            if self.halted:
+                time.sleep(dt)
+            elif self.pace:
+                # until the next tick is due
+                time.sleep(max(0.0, dt - self.timestep.accumulator))
+
+    def step(self, ticks):
+        start = self.stats.now()
+        world = self.world
+        engaged = explore_ticks(world, self.rewind, self.keys, ticks)
+        if self.halt and (engaged is not None or world.portal_open()):
+            self.engaged, self.halted = engaged, True
+        self.ticks += ticks
+        self.frames.publish(RenderFrame(world))
+        self.stats.simulated(start)
+
+    @contextmanager
+    def paused(self):
+        """Hold the simulation between ticks; the time spent paused is not simulated."""
+        with self.lock:
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.last += time.perf_counter() - start
+
+    def resume(self):
+        """Carry on after a halt, without simulating the time spent halted."""
+        with self.lock:
+            self.engaged = None
+            self.halted = False
+            self.timestep.reset()
+            self.last = time.perf_counter()
+            self.frames.publish(RenderFrame(self.world))
+
+    def stop(self):
+        self.stopping = True
+        self.join()
+
+    def draw(self):
+        """Draw the newest published frame, interpolated by its age. Returns the frame."""
+        frame = self.frames.latest()
+        # ticks set the shake in game_state and frames count it down: only between ticks
+        with self.lock:
+            shake = apply_screen_shake()
+        alpha = min(1.0, (time.perf_counter() - frame.published) * TICK_RATE) if self.pace else 1.0
+        draw_world(frame, alpha, shake)
+        return frame
+
+    def report(self):
+        return self.stats.report(self.frames.published)
+
+# ---------- main quest ----------
+LEVEL_WIDTH = WIDTH * 4  # Make the level 4 screens wide
+PORTAL_WATER_REQUIREMENT = 50  # Need 50 water to use portal
+
+def explore_ticks(world, rewind, keys, ticks):
+    """Run up to `ticks` exploration ticks with `keys` held, stopping early when the
+    player engages an enemy or reaches the open portal. Returns the engaged enemy, if any."""
+    engaged = None
+    profiling = PROFILER.enabled
+    for _ in range(ticks):
+        if keys[pygame.K_r]:
+            # hold R to run time backwards through the rewind buffer
+            if rewind.rewind(world) and world.log is not None:
+                world.log.restart(world)
+            if profiling: PROFILER.mark('rewind')
+            continue
+        engaged = world.step(keys)
+        if engaged is not None or world.portal_open():
+            break
+        rewind.record(world)
+        if profiling: PROFILER.mark('rewind')
+    return engaged
+
+def main(seed=None, record=None, startup_report=False, threaded=False):
+    """Play the game. With `record`, the session's InputLog is written to that path on exit;
+    with `startup_report`, the startup timings are printed once the first gameplay frame is up;
+    with `threaded`, exploration is simulated on a SimThread and its report printed on exit."""
+    open_window()
+    PROFILER.enabled = True
+
+    # time spent on these screens is mostly the player reading; it is billed
+    # to 'menus' so the subsystems inside show up on their own
+    with STARTUP.step('menus'):
+        # player selects class before starting
+        player_class = choose_class()
+
+        # Opening cutscene
+        play_cutscene('opening')
+        play_cutscene('quest', player_class=player_class)
+
+    with STARTUP.step('level'):
+        world = World(player_class, seed=seed)
+    if record:
+        import atexit
+        atexit.register(InputLog.begin(world).save, record)
+    player = world.player
+    map_enemies = world.map_enemies
+    map_swings = world.map_swings
+    particles = world.particles
+    shop_rect = world.shop_rect
+
+    with STARTUP.step('menus'):
+        story([f"You stand at the entrance to the realm.", "Prepare yourself for battle!", "Press ENTER to begin..."])
+
+    # main exploration loop: fixed simulation ticks, rendering at whatever rate we sustain
+    timestep = FixedTimestep()
+    rewind = RewindBuffer()
+    sim = None
+    if threaded:
+        # the simulation keeps its own clock; this loop only draws what it publishes
+        sim = SimThread(world, rewind)
+        import atexit
+        atexit.register(lambda: print(sim.report()))
+        sim.start()
+    # anything below that changes the world waits for the simulation thread
+    paused = sim.paused if sim is not None else nullcontext
+    while True:
+        ticks = timestep.advance(CLOCK.tick(FPS) / 1000.0)
+        PROFILER.begin_frame()
+        keys = pygame.key.get_pressed()
+        events = pygame.event.get()
+        if any(e.type == pygame.QUIT for e in events):
+            if sim is not None:
+                # let it finish the tick it is on before pygame goes away
+                sim.stop()
+            pygame.quit(); sys.exit()
+        with paused():
+            for e in events:
+                if e.type != pygame.KEYDOWN:
+                    continue
+                handle_debug_key(e.key)
+                if e.key == pygame.K_F5:
+                    quick_save(world)
+                    TOASTS.show("Quick-saved")
+                if e.key == pygame.K_F9:
+                    if quick_load(world):
+                        rewind.clear()
+                        if world.log is not None:
+                            world.log.restart(world)
+                        TOASTS.show("Quick-loaded")
+                    else:
+                        TOASTS.show("No quick-save yet.", RED)
+                if e.key == pygame.K_p:
+                    # use potion - prioritize health if HP is low, otherwise try health first
+                    if player.health < player.max_health * 0.5:
+                        # HP is low, use health potion
+                        if world.perform('use_potion', 'Health'):
+                            TOASTS.show("Used Health Potion! +60 HP", GREEN)
+                        else:
+                            TOASTS.show("No Health potions.", RED)
+                    else:
+                        # try any potion
+                        if world.perform('use_any_potion'):
+                            TOASTS.show("Used a Potion!", GREEN)
+                        else:
+                            TOASTS.show("No potions.", RED)
+                if e.key == pygame.K_e and player.rect.colliderect(shop_rect):
+                    # open shop menu
+                    ShopScreen(world).run()
+        PROFILER.mark('input')
+        if sim is None:
+            # update world (also moves the camera and reports an engaged enemy)
+            engaged = explore_ticks(world, rewind, keys, ticks)
+            settled = True
+        else:
+            sim.keys = ScriptedKeys(key for key in SIM_KEYS if keys[key])
+            # the world is only safe to look at once the simulation has halted;
+            # read both under the lock so a halt can't land between them
+            with sim.lock:
+                engaged, settled = sim.engaged, sim.halted
+
+        # Check for portal collision - alternate ending
+        if settled and world.portal_open():
+            play_cutscene('portal')
+
+            story([
+                "You step through the mystical portal...",
+                "",
+                "The realm of 67 begins to shift and change.",
+                "Your accumulated 67 Water creates a bridge between worlds.",
+                "",
+                f"You escape with {player.water} Water to an alternate dimension.",
+                "The portal closes behind you forever.",
+                "",
+                "ALTERNATE ENDING – You became a traveler between worlds!"
+            ])
+            pygame.quit(); sys.exit()
 
+        if engaged is not None:
+            # Check if it's the boss
+            is_boss_fight = isinstance(engaged, Boss)
+
+            if is_boss_fight:
+                # Boss encounter cutscene
+                play_cutscene('boss')
+
+            # transition to duel with only that enemy
+            story([f"You approach {getattr(engaged,'tag', 'an enemy')}!"])
+            arena = world.start_duel(engaged)
+            win = duel(world, arena)
+            if not win:
+                story(["You were defeated...", "The realm of 67 falls into ruin.", "BAD ENDING"])
+                pygame.quit(); sys.exit()
+            else:
+                # reward for defeating
+                if engaged.health <= 0:
+                    gained = world.reward(engaged)
+                    # show small reward message
+                    TOASTS.show(f"Victory! +{gained} 67 water", YELLOW, 2.0)
+            # the duel teleported everyone; don't interpolate across it or replay its time,
+            # and don't rewind back into the engagement
+            world.snapshot()
+            timestep.reset()
+            rewind.clear()
+            # the duel recorded its own frames; don't bill them to this one
+            PROFILER.begin_frame()
+
+        # check victory: if boss removed
+        if not world.boss_alive():
+            # Victory cutscene
+            play_cutscene('victory')
+
+            story([
+                "You defeated the Bandit King!",
+                "The princess is saved.",
+                "The realm of 67 prospers.",
+                "GOOD ENDING – You are the richest in the realm with infinite 67 Water!"
+            ])
+            pygame.quit(); sys.exit()
+        if sim is not None and settled:
+            # halted for a duel that is now over, or at a portal a quick-load took us away from
+            sim.resume()
+
+        render_start = ThreadStats.now()
+        if sim is None:
+            draw_world(world, timestep.alpha())
+        else:
+            frame = sim.draw()
+        TOASTS.draw(SCREEN)
+        PROFILER.mark('toasts')
+
+        if game_state.debug_mode:
+            PROFILER.draw(SCREEN)
+            PROFILER.mark('profiler')
+        pygame.display.flip()
+        PROFILER.mark('flip')
+        drawn = map_enemies, map_swings, particles
+        if sim is not None:
+            sim.stats.rendered(frame, render_start)
+            # count what was drawn, not the live groups the simulation is changing
+            drawn = frame.map_enemies, frame.map_swings, frame.particles
+        PROFILER.end_frame(*map(len, drawn))
+        if STARTUP.milestone('first gameplay frame') and startup_report:
+            print(STARTUP.report())
+
+
+STARTUP.lap('module setup')
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="67 Water RPG")
+    parser.add_argument("--headless", type=int, metavar="FRAMES",
+                        help="simulate FRAMES frames without a window and report ticks per second")
+    parser.add_argument("--class", dest="player_class", default="Werrior",
+                        help="player class for headless runs")
+    def seed_arg(text):
+        seed = int(text)
+        if not 0 <= seed < SEED_LIMIT:
+            raise argparse.ArgumentTypeError(f"must be in 0..{SEED_LIMIT - 1}")
+        return seed
+    parser.add_argument("--seed", type=seed_arg, help="seed the random streams for a reproducible run")
+    parser.add_argument("--record", metavar="FILE", help="write the session's input log to FILE on exit")
+    parser.add_argument("--replay", metavar="FILE", help="replay an input log headlessly and report ticks per second")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print how long each subsystem took to bring up the first gameplay frame")
+    parser.add_argument("--threaded-sim", action="store_true",
+                        help="simulate exploration on a worker thread and report the thread overlap on exit")
+    args = parser.parse_args()
+    if args.replay:
+        run_headless(args.headless, log=InputLog.load(args.replay))
+    elif args.headless:
+        # walk right and swing so the run reaches the bandits and fights them
+        run_headless(args.headless, args.player_class, seed=args.seed,
+                     script=lambda frame: (pygame.K_d, pygame.K_z) if frame % 2 else (pygame.K_d,))
+    else:
+        main(seed=args.seed, record=args.record, startup_report=args.startup_report,
+             threaded=args.threaded_sim)
@@ -0,0 +1,357 @@
+"""Two-player versus duels over UDP with rollback netcode.
+
+    python netplay.py --host 7667 --class Mage          # wait for a peer on port 7667
+    python netplay.py --join 192.168.1.20:7667          # connect to a host
+    python netplay.py --loopback --latency 6 --loss 0.05  # two peers in one process, no window
+
+Each side applies its own input at once and predicts the peer's (same keys
+as last received). When the real input arrives and differs, the Versus
+simulation is rolled back to that frame and re-run to the present. Every
+packet repeats all inputs the peer hasn't acknowledged, so lost packets only
+delay confirmation.
+"""
+import argparse, random, socket, struct, sys, time
+
+import pygame
+
+import main as game
+from main import (WIDTH, HEIGHT, FPS, TICK_RATE, SKY, WHITE, YELLOW, Versus, FixedTimestep,
+                  ScriptedKeys, INPUT_KEYS, key_state, held_keys, apply_screen_shake,
+                  TOASTS, lerp_rect, swing_screen_rect)
+
+DEFAULT_PORT = 7667
+ROLLBACK_WINDOW = 8   # frames a peer may run ahead of the last input it has from the other
+FRAME_BUDGET = 1.0 / TICK_RATE
+HELLO_INTERVAL = 0.1  # seconds between handshake packets
+RESULT_SECONDS = 2.5  # how long the result stays up before play() returns
+
+PACKET_HELLO = 0
+PACKET_INPUT = 1
+_HELLO = struct.Struct('<B16s')       # type, class name
+_INPUT_HEAD = struct.Struct('<BIIB')  # type, first frame, frames received from the peer, count
+
+class UdpTransport:
+    """Non-blocking UDP socket talking to one peer; the peer may be learned from its first packet."""
+    def __init__(self, port=0, peer=None, bind='0.0.0.0'):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((bind, port))
+        self.sock.setblocking(False)
+        self.peer = peer
+        self.sent = 0
+        self.received = 0
+
+    @property
+    def address(self):
+        return self.sock.getsockname()
+
+    def send(self, data):
+        if self.peer is not None:
+            self.sock.sendto(data, self.peer)
+            self.sent += 1
+
+    def receive(self):
+        packets = []
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except (BlockingIOError, ConnectionResetError):
+                return packets
+            if self.peer is None:
+                self.peer = addr
+            if addr == self.peer:
+                packets.append(data)
+                self.received += 1
+
+    def close(self):
+        self.sock.close()
+
+class LaggyTransport:
+    """Local stand-in for a real network: holds outgoing packets for `latency`
+    ± `jitter` ticks and drops a `loss` fraction of them. Call pump() once per tick."""
+    def __init__(self, transport, latency=0, jitter=0, loss=0.0, seed=0):
+        self.transport = transport
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.queue = []  # (due tick, data)
+        self.now = 0
+
+    def send(self, data):
+        if self.rng.random() < self.loss:
+            return
+        delay = max(0, self.latency + self.rng.randint(-self.jitter, self.jitter))
+        self.queue.append((self.now + delay, data))
+
+    def pump(self):
+        self.now += 1
+        due = [data for t, data in self.queue if t <= self.now]
+        self.queue = [(t, data) for t, data in self.queue if t > self.now]
+        for data in due:
+            self.transport.send(data)
+
+    def receive(self):
+        return self.transport.receive()
+
+def handshake(transport, class_name, timeout=30.0):
+    """Swap class names with the peer. Returns the peer's class, or None on timeout."""
+    hello = _HELLO.pack(PACKET_HELLO, class_name.encode('utf-8')[:16])
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        transport.send(hello)
+        for data in transport.receive():
+            if data[0] == PACKET_HELLO:
+                # answer a few times in case our earlier hellos went nowhere
+                for _ in range(3):
+                    transport.send(hello)
+                return _HELLO.unpack(data)[1].rstrip(b'\0').decode('utf-8')
+        time.sleep(HELLO_INTERVAL)
+    return None
+
+class RollbackSession:
+    """Drives a Versus for the player at index `local` against a remote peer.
+
+    Frames below `received` have the peer's real input and are final; frames
+    from there up to `frame` ran on predicted input and keep a saved state so
+    they can be re-simulated when the prediction turns out wrong.
+    """
+    def __init__(self, sim, local, transport, window=ROLLBACK_WINDOW):
+        self.sim = sim
+        self.local = local
+        self.transport = transport
+        self.window = window
+        self.frame = 0          # next frame to simulate
+        self.received = 0       # peer inputs known for every frame below this
+        self.peer_received = 0  # our inputs the peer has for every frame below this
+        self.local_inputs = {}  # frame -> key mask
+        self.remote_inputs = {}
+        self.predicted = {}     # frame -> remote mask the simulation used
+        self.last_remote = 0    # peer's input at frame received - 1
+        self.states = {}        # frame -> sim.save() from just before it
+        # counters
+        self.rollbacks = 0
+        self.resim_frames = 0
+        self.max_depth = 0
+        self.resim_time = 0.0
+        self.max_resim_time = 0.0
+        self.stalls = 0
+
+    def tick(self, keys):
+        """Run one local tick with `keys` held. Returns False if stalled waiting for the peer."""
+        earliest = self.poll()
+        if earliest is not None:
+            self.rollback(earliest)
+        if self.frame - self.received >= self.window:
+            # too far ahead of the peer's inputs; wait instead of predicting further
+            self.stalls += 1
+            self.send()
+            return False
+        self.local_inputs[self.frame] = key_state(keys)
+        self.send()
+        self.advance()
+        self.prune()
+        return True
+
+    def poll(self):
+        """Take in the peer's packets. Returns the earliest mispredicted frame, if any."""
+        earliest = None
+        for data in self.transport.receive():
+            if data[0] != PACKET_INPUT:
+                continue
+            _, first, ack, count = _INPUT_HEAD.unpack_from(data)
+            self.peer_received = max(self.peer_received, ack)
+            for i, mask in enumerate(data[_INPUT_HEAD.size:_INPUT_HEAD.size + count]):
+                f = first + i
+                if f < self.received or f in self.remote_inputs:
+                    continue
+                self.remote_inputs[f] = mask
+                if f < self.frame and self.predicted[f] != mask and (earliest is None or f < earliest):
+                    earliest = f
+        while self.received in self.remote_inputs:
+            self.last_remote = self.remote_inputs[self.received]
+            self.received += 1
+        return earliest
+
+    def send(self):
+        # every input the peer hasn't confirmed, oldest first
+        first = self.peer_received
+        masks = bytes(self.local_inputs[f] for f in range(first, min(self.frame + 1, first + 255))
+                      if f in self.local_inputs)
+        self.transport.send(_INPUT_HEAD.pack(PACKET_INPUT, first, self.received, len(masks)) + masks)
+
+    def predict(self, frame):
+        # known, or else assume the peer still holds what they held last
+        return self.remote_inputs.get(frame, self.last_remote)
+
+    def advance(self):
+        f = self.frame
+        self.states[f] = self.sim.save()
+        remote = self.predicted[f] = self.predict(f)
+        local = ScriptedKeys(held_keys(self.local_inputs[f]))
+        remote = ScriptedKeys(held_keys(remote))
+        if self.local == 0:
+            self.sim.step(local, remote)
+        else:
+            self.sim.step(remote, local)
+        self.frame = f + 1
+
+    def rollback(self, frame):
+        """Restore the state before `frame` and re-simulate up to the present."""
+        start = time.perf_counter()
+        target = self.frame
+        self.sim.load(self.states[frame])
+        self.frame = frame
+        while self.frame < target:
+            self.advance()
+        elapsed = time.perf_counter() - start
+        depth = target - frame
+        self.rollbacks += 1
+        self.resim_frames += depth
+        self.max_depth = max(self.max_depth, depth)
+        self.resim_time += elapsed
+        self.max_resim_time = max(self.max_resim_time, elapsed)
+
+    def prune(self):
+        # no rollback can reach below `received`
+        for f in [f for f in self.states if f < self.received]:
+            del self.states[f]
+            del self.predicted[f]
+            self.remote_inputs.pop(f, None)
+        # local inputs are still needed to resend and to re-simulate
+        keep = min(self.received, self.peer_received)
+        for f in [f for f in self.local_inputs if f < keep]:
+            del self.local_inputs[f]
+
+    def outcome(self):
+        """The duel's result once it no longer depends on predicted input, else None."""
+        if self.received >= self.frame:
+            return self.sim.result()
+        return None
+
+    def stats(self):
+        mean = self.resim_time / self.rollbacks if self.rollbacks else 0.0
+        return (f"rollbacks: {self.rollbacks}, frames re-simulated: {self.resim_frames}, "
+                f"max depth: {self.max_depth}, stalls: {self.stalls}, "
+                f"re-simulation mean {mean * 1000:.3f}ms max {self.max_resim_time * 1000:.3f}ms "
+                f"(frame budget {FRAME_BUDGET * 1000:.2f}ms)")
+
+def draw_versus(sim, alpha, local):
+    shake_x, shake_y = apply_screen_shake()
+    screen = game.SCREEN
+    screen.fill(SKY)
+    for p in sim.plats:
+        screen.blit(p.image, (p.rect.x + shake_x, p.rect.y + shake_y))
+    sim.particles.draw(screen)
+    for sw in sim.swings:
+        screen.blit(sw.image, swing_screen_rect(sw, alpha))
+    for i, player in enumerate(sim.players):
+        rect = lerp_rect(player, alpha)
+        player.draw_at_pos(screen, rect)
+        label = "YOU" if i == local else "RIVAL"
+        screen.blit(game.render_text(f"{label}  HP {max(0, player.health)}", 24, YELLOW if i == local else WHITE),
+                    (rect.x, rect.y - 24))
+
+def play(session):
+    """Interactive versus loop: fixed ticks through the session, interpolated drawing.
+
+    Once the result is confirmed it is shown as a toast while the session keeps
+    ticking, so the peer still gets the inputs it needs to confirm it too."""
+    timestep = FixedTimestep()
+    result = None
+    while True:
+        ticks = timestep.advance(game.CLOCK.tick(FPS) / 1000.0)
+        for e in pygame.event.get():
+            if e.type == pygame.QUIT:
+                return None
+        keys = pygame.key.get_pressed()
+        for _ in range(ticks):
+            session.tick(keys)
+        if result is None:
+            result = session.outcome()
+            if result is not None:
+                text = "DRAW" if result == -1 else ("YOU WIN" if result == session.local else "YOU LOSE")
+                TOASTS.show(text, YELLOW, RESULT_SECONDS, size=80)
+        elif not TOASTS:
+            return result
+        draw_versus(session.sim, timestep.alpha(), session.local)
+        TOASTS.draw(game.SCREEN)
+        pygame.display.flip()
+
+def run_loopback(frames=3000, latency=6, jitter=3, loss=0.05, seed=1):
+    """Two sessions over real UDP sockets on 127.0.0.1 with simulated lag and loss,
+    driven by random held keys. Returns True if both ends agree on the final state."""
+    rng = random.Random(seed)
+    sockets = [UdpTransport(bind='127.0.0.1'), UdpTransport(bind='127.0.0.1')]
+    sockets[0].peer, sockets[1].peer = sockets[1].address, sockets[0].address
+    links = [LaggyTransport(t, latency, jitter, loss, seed + i) for i, t in enumerate(sockets)]
+    classes = ('Werrior', 'Mage')
+    sessions = [RollbackSession(Versus(*classes), i, links[i]) for i in range(2)]
+    for s in sessions:
+        # long enough to watch rollbacks, so nobody gets knocked out
+        for p in s.sim.players:
+            p.health = p.max_health = 10**6
+    held = [0, 0]
+    steps = 0
+    while min(s.frame for s in sessions) < frames:
+        for i, s in enumerate(sessions):
+            if rng.random() < 0.08:
+                held[i] = rng.getrandbits(len(INPUT_KEYS))
+            if s.frame < frames:
+                s.tick(ScriptedKeys(held_keys(held[i])))
+            links[i].pump()
+        steps += 1
+        if steps > frames * 20:
+            print("loopback stalled")
+            return False
+    # let the last packets land so both sides confirm every frame
+    for _ in range(latency + jitter + 200):
+        for i, s in enumerate(sessions):
+            s.send()
+            earliest = s.poll()
+            if earliest is not None:
+                s.rollback(earliest)
+            links[i].pump()
+    for i, s in enumerate(sessions):
+        print(f"peer {i + 1}: frame {s.frame}, confirmed {s.received}, {s.stats()}")
+    agree = sessions[0].sim.checksum() == sessions[1].sim.checksum()
+    print(f"packets sent: {sockets[0].sent} / {sockets[1].sent}; final states {'match' if agree else 'DIFFER'}")
+    for t in sockets:
+        t.close()
+    return agree
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="67 Water RPG versus mode")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--host", type=int, nargs='?', const=DEFAULT_PORT, metavar="PORT",
+                      help="wait for a peer on PORT")
+    mode.add_argument("--join", metavar="HOST:PORT", help="connect to a hosting peer")
+    mode.add_argument("--loopback", action="store_true",
+                      help="run two peers in this process over 127.0.0.1 and report rollback counters")
+    parser.add_argument("--class", dest="player_class", default="Werrior")
+    parser.add_argument("--frames", type=int, default=3000, help="loopback length in ticks")
+    parser.add_argument("--latency", type=int, default=6, help="loopback one-way delay in ticks")
+    parser.add_argument("--jitter", type=int, default=3, help="loopback delay variation in ticks")
+    parser.add_argument("--loss", type=float, default=0.05, help="loopback packet loss fraction")
+    args = parser.parse_args()
+
+    if args.loopback:
+        sys.exit(0 if run_loopback(args.frames, args.latency, args.jitter, args.loss) else 1)
+
+    if args.join:
+        host, _, port = args.join.rpartition(':')
+        transport = UdpTransport(peer=(socket.gethostbyname(host), int(port)))
+        local = 1
+    else:
+        transport = UdpTransport(port=args.host)
+        local = 0
+    print("waiting for the other player...")
+    peer_class = handshake(transport, args.player_class)
+    if peer_class is None:
+        sys.exit("no peer answered")
+    classes = (args.player_class, peer_class) if local == 0 else (peer_class, args.player_class)
+    game.open_window("67 Water RPG – Versus")
+    session = RollbackSession(Versus(*classes), local, transport)
+    play(session)
+    print(session.stats())
+    transport.close()
+    pygame.quit()
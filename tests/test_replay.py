@@ -0,0 +1,93 @@
+"""Recording a session with InputLog and replaying it."""
+import random
+
+import pygame
+import pytest
+
+import main
+
+
+def record(player_class, seed, ticks=3000, restart_at=None):
+    """Play a random but seeded session the way main() does, recording it.
+
+    It ends where World.run() (and so replay()) would: on a loss, once the
+    boss is beaten or at the open portal. With restart_at, recording restarts
+    on the first exploration tick from then on (duels are not captured, so
+    main() only restarts outside them). Returns the world and its log.
+    """
+    world = main.World(player_class, seed=seed)
+    log = main.InputLog.begin(world)
+    # sturdy enough to fight its way through the whole run; restart() records the top-up
+    world.player.health = world.player.max_health = 100000
+    world.player.water = 500
+    log.restart(world)
+    rnd = random.Random(seed)
+    held = (pygame.K_d, pygame.K_z)
+    arena = None
+    for tick in range(ticks):
+        if rnd.random() < 0.02:
+            held = tuple(k for k in main.INPUT_KEYS if rnd.random() < 0.4) + (pygame.K_d, pygame.K_z)
+        if rnd.random() < 0.005:
+            world.perform('use_any_potion')
+        if rnd.random() < 0.003:
+            world.perform('buy', 'health')
+        if arena is not None:
+            # close in on the enemy and keep attacking
+            toward = pygame.K_d if arena.enemy.rect.centerx > world.player.rect.centerx else pygame.K_a
+            result = world.duel_step(arena, main.ScriptedKeys(held[:-2] + (toward, pygame.K_z)))
+            if result is False:
+                break
+            if result:
+                world.reward(arena.enemy)
+                arena = None
+                if not world.boss_alive():
+                    break
+            continue
+        if restart_at is not None and tick >= restart_at:
+            log.restart(world)
+            restart_at = None
+        engaged = world.step(main.ScriptedKeys(held))
+        if world.portal_open():
+            break
+        if engaged is not None:
+            arena = world.start_duel(engaged)
+    return world, log
+
+
+@pytest.mark.parametrize('player_class', ['Werrior', 'Ranger', 'Mage'])
+def test_replay_reaches_the_recorded_state(player_class):
+    world, log = record(player_class, seed=42)
+    replayed = main.replay(main.InputLog.from_bytes(log.to_bytes()))
+    assert replayed.frame == world.frame
+    assert main.capture(replayed) == main.capture(world)
+
+
+def test_replay_rebuilds_from_the_seed_alone():
+    world = main.World('Ranger', seed=11)
+    log = main.InputLog.begin(world)
+    world.run(2000, lambda frame: (pygame.K_d, pygame.K_z) if frame % 2 else (pygame.K_d,))
+    assert log.start is None
+    replayed = main.replay(main.InputLog.from_bytes(log.to_bytes()))
+    assert main.capture(replayed) == main.capture(world)
+
+
+def test_replay_from_mid_session_start():
+    world, log = record('Mage', seed=7, restart_at=1000)
+    assert log.start is not None and len(log) <= world.frame - 1000
+    replayed = main.replay(main.InputLog.from_bytes(log.to_bytes()))
+    assert main.capture(replayed) == main.capture(world)
+
+
+def test_log_round_trips_through_bytes():
+    _, log = record('Werrior', seed=3, ticks=600)
+    again = main.InputLog.from_bytes(log.to_bytes())
+    assert (again.seed, again.player_class, again.level_width, len(again)) == \
+        (log.seed, log.player_class, log.level_width, len(log))
+    assert again.changes == log.changes
+    assert again.actions == log.actions
+
+
+@pytest.mark.parametrize('seed', [-1, main.SEED_LIMIT])
+def test_seed_outside_log_range_is_rejected(seed):
+    with pytest.raises(ValueError):
+        main.World('Werrior', seed=seed)
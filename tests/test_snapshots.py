@@ -0,0 +1,53 @@
+"""capture()/restore() round trips."""
+import pygame
+import pytest
+
+import main
+
+
+def script(frame):
+    """Walk right, attacking and jumping now and then, with an occasional dash back."""
+    if frame % 3 == 0:
+        return (pygame.K_d, pygame.K_z, pygame.K_w)
+    return (pygame.K_d,) if frame % 5 else (pygame.K_a, pygame.K_x)
+
+
+def explored(player_class, seed=5, frames=700):
+    world = main.World(player_class, seed=seed)
+    world.run(frames, script)
+    world.player.add_item('Health', 3)
+    return world
+
+
+@pytest.mark.parametrize('player_class', ['Werrior', 'Ranger', 'Mage'])
+def test_restore_then_capture_is_byte_identical(player_class):
+    world = explored(player_class)
+    snap = main.capture(world)
+    fresh = main.World(player_class)
+    main.restore(fresh, snap)
+    assert main.capture(fresh) == snap
+
+
+@pytest.mark.parametrize('player_class', ['Werrior', 'Mage'])
+def test_restored_world_plays_on_identically(player_class):
+    world = explored(player_class)
+    snap = main.capture(world)
+    world.run(1500, script)
+    ahead = main.capture(world)
+
+    main.restore(world, snap)
+    world.run(1500, script)
+    assert main.capture(world) == ahead
+
+    fresh = main.World(player_class)
+    main.restore(fresh, snap)
+    fresh.run(1500, script)
+    assert main.capture(fresh) == ahead
+
+
+def test_restore_rejects_other_versions():
+    world = explored('Werrior', frames=10)
+    snap = bytearray(main.capture(world))
+    snap[4] ^= 0xff
+    with pytest.raises(ValueError):
+        main.restore(world, bytes(snap))
@@ -0,0 +1,85 @@
+"""SpatialHash queries against a brute-force scan."""
+import random
+
+import pygame
+import pytest
+
+import main
+
+
+class Box:
+    def __init__(self, rect):
+        self.rect = pygame.Rect(rect)
+
+
+def random_rect(rnd):
+    # mostly small rects, some spanning several cells, some empty; negative coordinates too
+    w = rnd.choice([0, rnd.randint(1, 64), rnd.randint(64, 600)])
+    h = rnd.choice([0, rnd.randint(1, 64), rnd.randint(64, 400)])
+    return pygame.Rect(rnd.randint(-1500, 6000), rnd.randint(-800, 1600), w, h)
+
+
+def span(rect, size):
+    """Range of cells a rect occupies; an empty rect occupies the cell of its corner."""
+    right = rect.right - 1 if rect.w else rect.x
+    bottom = rect.bottom - 1 if rect.h else rect.y
+    return rect.x // size, rect.y // size, right // size, bottom // size
+
+
+def brute_force(boxes, rect, size):
+    """Boxes sharing a cell with rect, in the order they were first inserted."""
+    x0, y0, x1, y1 = span(rect, size)
+    found = []
+    for box in boxes:
+        bx0, by0, bx1, by1 = span(box.rect, size)
+        if bx0 <= x1 and x0 <= bx1 and by0 <= y1 and y0 <= by1:
+            found.append(box)
+    return found
+
+
+@pytest.mark.parametrize('cell_size', [main.SPATIAL_CELL, 32])
+def test_query_matches_brute_force(cell_size):
+    rnd = random.Random(cell_size)
+    grid = main.SpatialHash(cell_size)
+    boxes = []  # in insertion order, as query() promises
+    for _ in range(1000):
+        roll = rnd.random()
+        if roll < 0.4 or not boxes:
+            box = Box(random_rect(rnd))
+            grid.insert(box, box.rect)
+            boxes.append(box)
+        elif roll < 0.8:
+            # mostly short hops, as entities move per tick, and the odd teleport
+            box = rnd.choice(boxes)
+            if rnd.random() < 0.9:
+                box.rect.move_ip(rnd.randint(-40, 40), rnd.randint(-40, 40))
+            else:
+                box.rect = random_rect(rnd)
+            grid.move(box, box.rect)
+        elif roll < 0.9:
+            box = boxes.pop(rnd.randrange(len(boxes)))
+            grid.remove(box)
+        else:
+            # re-inserting an indexed object is a move and keeps its place in the order
+            box = rnd.choice(boxes)
+            box.rect = random_rect(rnd)
+            grid.insert(box, box.rect)
+        area = random_rect(rnd)
+        found = grid.query(area)
+        assert found == brute_force(boxes, area, cell_size)
+        assert {box for box in boxes if box.rect.colliderect(area)} <= set(found)
+    assert len(grid) == len(boxes)
+    assert all(box in grid for box in boxes)
+
+
+def test_removed_objects_leave_no_empty_buckets():
+    grid = main.SpatialHash(32)
+    boxes = [Box((i * 50, i * 20, 100, 70)) for i in range(50)]
+    for box in boxes:
+        grid.insert(box, box.rect)
+    for box in boxes:
+        grid.remove(box)
+        grid.remove(box)  # removing twice is harmless
+    assert len(grid) == 0
+    assert grid.cells == {}
+    assert grid.query(pygame.Rect(0, 0, 5000, 5000)) == []